@@ -1,8 +1,6 @@
 import streamlit as st
 import sys
 import os
-import time
-from decimal import Decimal, ROUND_DOWN
 from binance.exceptions import BinanceAPIException 
 
 # --- Path Fix to import from src/ ---
@@ -16,11 +14,18 @@ if ADV not in sys.path:
 
 # --- Import Bot Functions + utils ---
 try:
-    from utils import get_client  
+    from utils import get_client, get_symbol_filters
+    from dashboard_service import get_dashboard_service
+    from order_book import get_order_book
     from market_orders import place_market_order
     from limit_orders import place_limit_order
     from oco import place_oco_conditional_orders
-    from twap import execute_twap_strategy 
+    from oco_manager import get_oco_manager
+    from flatten import flatten
+    from twap import execute_twap_strategy, get_scheduler
+    from async_orders import parse_order_spec, place_orders_concurrently
+    from metrics import METRICS, serve_metrics
+    from journal import get_journal
 except ImportError as e:
     st.error(f"Failed to load backend functions. Ensure all files are in the 'src' directory and requirements are installed: {e}")
     sys.exit()
@@ -31,9 +36,8 @@ st.set_page_config(layout="wide", page_title="Binance Futures Bot — Streamlit
 # ----------------------
 # Helper functions
 # ----------------------
-@st.cache_resource
 def cached_client():
-    """Return a cached Binance client (testnet configured in utils.get_client)."""
+    """Return the shared Binance client from the process-wide registry in utils."""
     try:
         return get_client()
     except Exception as e:
@@ -41,108 +45,26 @@ def cached_client():
         st.stop()
 
 
-def get_price(symbol):
-    client = cached_client()
+def dashboard_service():
+    """Shared snapshot of prices, balances, orders and positions; every session reads the same one."""
     try:
-        ticker = client.futures_symbol_ticker(symbol=symbol)
-        return float(ticker["price"])
+        return get_dashboard_service(cached_client())
     except Exception as e:
-        st.error(f"Failed to fetch price: {e}")
-        return None
+        st.error(f"🔴 Fatal Error: Cannot start the account data stream. Error: {e}")
+        st.stop()
 
-def get_exchange_info_symbol(symbol):
-    """Fetch symbol info from exchangeInfo and return PRICE_FILTER tickSize and LOT_SIZE stepSize."""
-    client = cached_client()
-    try:
-        info = client.futures_exchange_info()
-        for s in info["symbols"]:
-            if s["symbol"] == symbol:
-                price_filter = next((f for f in s["filters"] if f["filterType"] == "PRICE_FILTER"), None)
-                lot_filter = next((f for f in s["filters"] if f["filterType"] == "LOT_SIZE"), None)
-                return {
-                    "tickSize": float(price_filter["tickSize"]) if price_filter else None,
-                    "minPrice": float(price_filter["minPrice"]) if price_filter else None,
-                    "stepSize": float(lot_filter["stepSize"]) if lot_filter else None,
-                    "minQty": float(lot_filter["minQty"]) if lot_filter else None
-                }
-        return None
-    except Exception as e:
-        st.warning(f"Failed to load exchange info for {symbol}: {e}")
-        return None
 
-def adjust_price_to_tick(price, tick_size):
-    """Round price down to nearest tick_size (string safe with Decimal)."""
-    if tick_size is None:
-        return price
-    p = Decimal(str(price))
-    t = Decimal(str(tick_size))
-    # floor to nearest tick: p - (p % t)
-    factor = (p / t).quantize(0, rounding=ROUND_DOWN)
-    valid = (factor * t).quantize(Decimal("0.00000001"))
-    return float(valid)
-
-def adjust_qty_to_step(qty, step_size):
-    if step_size is None:
-        return qty
-    q = Decimal(str(qty))
-    s = Decimal(str(step_size))
-    factor = (q / s).quantize(0, rounding=ROUND_DOWN)
-    valid = (factor * s).quantize(Decimal("0.00000001"))
-    return float(valid)
-
-def get_account_balances():
-    client = cached_client()
-    try:
-        resp = client.futures_account_balance()
-        return {r["asset"]: r["balance"] for r in resp}
-    except Exception as e:
-        st.warning(f"Could not fetch balances: {e}")
-        return {}
+def get_price(symbol):
+    """Latest streamed price; the service falls back to a throttled REST ticker while the stream warms up."""
+    return dashboard_service().price(symbol)
 
-def get_open_orders(symbol=None):
-    client = cached_client()
+def symbol_filters(symbol):
+    """Return the precompiled exchange filters for symbol from the shared exchange-info cache."""
     try:
-        if symbol:
-            return client.futures_get_open_orders(symbol=symbol)
-        return client.futures_get_open_orders()
-    except BinanceAPIException as e:
-        if "No open orders" not in str(e):
-             st.warning(f"API Error fetching orders: {e}")
-        return []
+        return get_symbol_filters(symbol, cached_client())
     except Exception as e:
-        st.warning(f"Could not fetch open orders: {e}")
-        return []
-
-# 🟢 MODIFIED FUNCTION: Returns both position list and total PNL
-def get_positions():
-    """Fetches non-zero open futures positions, simplifies data, and calculates total PNL."""
-    client = cached_client()
-    try:
-        resp = client.futures_position_information()
-        total_pnl = 0.0
-        active_positions = []
-        
-        for p in resp:
-            pnl_val = float(p.get('unRealizedProfit', '0.0'))
-            pos_amt = float(p.get('positionAmt', '0.0'))
-            
-            if pos_amt != 0.0:
-                total_pnl += pnl_val
-                display_positions = {
-                    'Symbol': p['symbol'],
-                    'Side': 'LONG' if pos_amt > 0 else 'SHORT',
-                    'Size': f"{pos_amt:.6f}",
-                    'Entry Price': f"{float(p['entryPrice']):.2f}",
-                    'Liq. Price': f"{float(p['liquidationPrice']):.2f}",
-                    'Unrealized PNL': f"{pnl_val:.2f}"
-                }
-                active_positions.append(display_positions)
-                
-        # 🟢 RETURN: The list of positions and the total PNL
-        return active_positions, total_pnl 
-    except Exception as e:
-        st.warning(f"Could not fetch positions: {e}")
-        return [], 0.0 
+        st.warning(f"Failed to load exchange info for {symbol}: {e}")
+        return None
 
 # ----------------------
 # UI: Top bar with live price and controls
@@ -151,67 +73,68 @@ st.title("🤖 Binance Futures Testnet Bot")
 # Allocate space for Market, Account, Open Orders, and Positions
 col1, col2, col3, col4 = st.columns([2, 2, 1.5, 2.5]) 
 
-with col1:
-    st.subheader("Market Snapshot")
-    symbol_global = st.text_input("Symbol", value="BTCUSDT", key="symbol_global")
-    price_placeholder = st.empty()
-    last_price = get_price(symbol_global.upper())
-    price_placeholder.metric(label=f"{symbol_global.upper()} Price", value=f"{last_price:.2f}" if last_price else "N/A")
+# Panels redraw on their own timers from the service's snapshot; none of them calls the API
+@st.fragment(run_every=1)
+def price_panel(symbol):
+    prices = dashboard_service().section('prices') or {}
+    last_price = prices.get(symbol)
+    st.metric(label=f"{symbol} Price", value=f"{last_price:.2f}" if last_price else "N/A")
 
-with col2:
-    st.subheader("Account")
+@st.fragment(run_every=2)
+def balance_panel():
     if st.button("Refresh Balances"):
-        st.cache_resource.clear() 
-        st.rerun() 
-        
-    balances = get_account_balances()
+        # Full REST resync of the stream-backed account state, throttled across sessions
+        if not dashboard_service().resync():
+            st.caption("Resynced moments ago; showing the live stream state.")
+    balances = dashboard_service().section('balances')
     if balances:
         usdt = balances.get("USDT", "0")
         st.write(f"USDT Balance: **{float(usdt):.2f}**")
     else:
         st.write("No balance info (or failed to fetch).")
 
-with col3:
-    st.subheader("Open Orders")
-    if st.button("Refresh Orders"): 
-        st.rerun() 
-    orders = get_open_orders(symbol_global.upper())
+@st.fragment(run_every=1)
+def open_orders_panel(symbol):
+    orders = [o for o in dashboard_service().section('open_orders') or [] if o['symbol'] == symbol]
     st.write(f"Open orders: **{len(orders)}**")
     if orders:
         st.dataframe(orders, hide_index=True, width='stretch')
 
-# 🟢 LIVE POSITIONS COLUMN (Modified to show PNL)
-with col4:
-    st.subheader("Live Positions & PNL")
-    if st.button("Refresh Positions"):
-        st.rerun()
-
-    # 🟢 CAPTURE PNL
-    active_positions, total_pnl = get_positions()
-
-    # Determine PNL coloring using the required 'normal' value
-    # We set a placeholder 'Value' (e.g., total equity) and use total_pnl as the 'delta'
-    st.metric(
-        label="Total Unrealized PNL", 
-        # Display the actual PNL as the delta value
-        value=f"${total_pnl:.2f}",
-        delta=total_pnl, # Pass the float value to trigger color change based on sign
-        delta_color='normal' # 'normal' = green for positive, red for negative
-    )
-    
+@st.fragment(run_every=1)
+def positions_panel():
+    active_positions, total_pnl = dashboard_service().section('positions') or ([], 0.0)
+    # Display the actual PNL as the delta value; 'normal' = green for positive, red for negative
+    st.metric(label="Total Unrealized PNL", value=f"${total_pnl:.2f}", delta=total_pnl, delta_color='normal')
     st.write(f"Active Positions: **{len(active_positions)}**")
-    
     if active_positions:
         st.dataframe(active_positions, hide_index=True, width='stretch')
     else:
         st.info("No active open positions.")
 
+with col1:
+    st.subheader("Market Snapshot")
+    symbol_global = st.text_input("Symbol", value="BTCUSDT", key="symbol_global")
+    dashboard_service().watch(symbol_global.upper())
+    price_panel(symbol_global.upper())
+
+with col2:
+    st.subheader("Account")
+    balance_panel()
+
+with col3:
+    st.subheader("Open Orders")
+    open_orders_panel(symbol_global.upper())
+
+with col4:
+    st.subheader("Live Positions & PNL")
+    positions_panel()
+
 st.markdown("---")
 
 # ----------------------
 # Tabs for order flows (Added Exit Position Tab)
 # ----------------------
-tab1, tab2, tab3, tab4, tab5 = st.tabs(["Market", "Limit", "OCO (Conditional)", "TWAP", "Exit Position"])
+tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["Market", "Limit", "OCO (Conditional)", "TWAP", "Exit Position", "Multi-Order"])
 
 # ----------------------
 # MARKET TAB
@@ -226,14 +149,14 @@ with tab1:
         submit_market = st.form_submit_button("Place Market Order")
         
         if submit_market:
-            info = get_exchange_info_symbol(m_symbol.upper())
-            valid_qty = adjust_qty_to_step(m_qty, info["stepSize"] if info else None)
+            filters = symbol_filters(m_symbol.upper())
+            valid_qty = filters.normalize(m_qty, order_type="MARKET")[0] if filters else m_qty
             
             if preview:
                 st.info(f"Submitting: side={m_side}, adjusted quantity={valid_qty}")
             
             try:
-                res = place_market_order(m_symbol.upper(), m_side.upper(), float(valid_qty))
+                res = place_market_order(m_symbol.upper(), m_side.upper(), float(valid_qty), client=cached_client())
                 st.success("Market order placed and filled successfully.")
                 st.json(res)
             except Exception as e:
@@ -253,19 +176,29 @@ with tab2:
         submit_limit = st.form_submit_button("Place Limit Order")
         
         if submit_limit:
-            info = get_exchange_info_symbol(l_symbol.upper())
             adj_price, adj_qty = l_price, l_qty
             
-            if preview_limit and info:
-                adj_price = adjust_price_to_tick(l_price, info["tickSize"])
-                adj_qty = adjust_qty_to_step(l_qty, info["stepSize"])
-                st.info(f"Adjusted Price -> {adj_price} (tickSize={info['tickSize']}), Adjusted Qty -> {adj_qty}")
+            filters = symbol_filters(l_symbol.upper()) if preview_limit else None
+            if filters:
+                adj_qty, adj_price = filters.normalize(l_qty, l_price, "LIMIT")
+                st.info(f"Adjusted Price -> {adj_price} (tickSize={filters.tick / filters.price_scale}), Adjusted Qty -> {adj_qty}")
             
-            cur_price = get_price(l_symbol.upper())
-            if (l_side.upper() == "SELL" and adj_price < cur_price) or \
-               (l_side.upper() == "BUY" and adj_price > cur_price):
+            # Price-side check against the local book's touch; last price only while the book loads
+            book = get_order_book(l_symbol.upper(), cached_client())
+            if book is not None:
+                crosses = book.would_cross(l_side.upper(), adj_price)
+                touch = book.best_ask() if l_side.upper() == "BUY" else book.best_bid()
+                cur_price = touch[0] if touch else None
+            else:
+                cur_price = get_price(l_symbol.upper())
+                crosses = cur_price is not None and (
+                    (l_side.upper() == "SELL" and adj_price <= cur_price) or
+                    (l_side.upper() == "BUY" and adj_price >= cur_price)
+                )
+            
+            if not crosses:
                 try:
-                    resp = place_limit_order(l_symbol.upper(), l_side.upper(), float(adj_qty), float(adj_price))
+                    resp = place_limit_order(l_symbol.upper(), l_side.upper(), float(adj_qty), float(adj_price), client=cached_client())
                     st.success("Limit order placed successfully.")
                     st.json(resp)
                 except Exception as e:
@@ -278,7 +211,7 @@ with tab2:
 # ----------------------
 with tab3:
     st.header("OCO (Take-Profit & Stop-Loss)")
-    st.info("This places two conditional orders that attempt to close an existing position (reduceOnly).")
+    st.info("This places two conditional orders that attempt to close an existing position (reduceOnly). When one leg fills, the other is cancelled automatically.")
     with st.form("oco_form"):
         o_symbol = st.text_input("Symbol", value=symbol_global.upper(), key="o_symbol")
         o_side = st.radio("Closing Side (SELL if you are LONG)", ("SELL", "BUY"), key="o_side")
@@ -288,21 +221,26 @@ with tab3:
         submit_oco = st.form_submit_button("Place OCO (TP & SL)")
         
         if submit_oco:
-            info = get_exchange_info_symbol(o_symbol.upper())
+            filters = symbol_filters(o_symbol.upper())
             o_tp_adj, o_sl_adj, o_qty_adj = o_tp, o_sl, o_qty
             
-            if info:
-                o_tp_adj = adjust_price_to_tick(o_tp, info["tickSize"])
-                o_sl_adj = adjust_price_to_tick(o_sl, info["tickSize"])
-                o_qty_adj = adjust_qty_to_step(o_qty, info["stepSize"])
+            if filters:
+                o_qty_adj, o_tp_adj = filters.normalize(o_qty, o_tp, "TAKE_PROFIT_MARKET")
+                o_sl_adj = filters.normalize(o_qty, o_sl, "STOP_MARKET")[1]
                 st.info(f"Adjusted: TP={o_tp_adj}, SL={o_sl_adj}, Qty={o_qty_adj}")
             
             try:
-                resp = place_oco_conditional_orders(o_symbol.upper(), o_side.upper(), float(o_qty_adj), float(o_tp_adj), float(o_sl_adj))
+                resp = place_oco_conditional_orders(o_symbol.upper(), o_side.upper(), float(o_qty_adj), float(o_tp_adj), float(o_sl_adj), client=cached_client(), manager=get_oco_manager(cached_client()))
                 st.success("Placed OCO-like conditional orders (TP & SL)")
                 st.json(resp)
             except Exception as e:
                 st.error(f"OCO placement failed: {e}")
+    
+    oco_manager = get_oco_manager(cached_client())
+    oco_stats = oco_manager.latency_stats()
+    st.write(f"Managed OCO pairs: **{len(oco_manager.pairs())}**")
+    if oco_stats.get('exposure_ms'):
+        st.caption(f"Trigger-to-cancel latency (ms): p50={oco_stats['exposure_ms']['p50']:.0f}, p99={oco_stats['exposure_ms']['p99']:.0f}, max={oco_stats['exposure_ms']['max']:.0f} over {oco_stats['count']} triggers")
 
 # ----------------------
 # TWAP TAB
@@ -315,43 +253,42 @@ with tab4:
         t_total_qty = st.number_input("Total Quantity", min_value=0.000001, format="%.6f", step=0.001, key="t_total_qty")
         t_duration = st.number_input("Duration (seconds)", min_value=10, max_value=3600, step=10, key="t_duration")
         t_chunks = st.number_input("Number of chunks", min_value=2, max_value=200, step=1, key="t_chunks", value=5)
+        t_slippage = st.number_input("Max slippage per chunk (bps, 0 = off)", min_value=0.0, max_value=500.0, step=1.0, key="t_slippage", value=0.0)
         submit_twap = st.form_submit_button("Execute TWAP")
         
         if submit_twap:
-            info = get_exchange_info_symbol(t_symbol.upper())
-            
-            if info:
-                chunk_qty = (t_total_qty / float(t_chunks))
-                chunk_qty_adj = adjust_qty_to_step(chunk_qty, info["stepSize"])
-            else:
-                chunk_qty_adj = t_total_qty / float(t_chunks)
+            # Chunk sizes are rounded to the lot step by the scheduler, remainder carried forward
+            job_id = get_scheduler().submit(t_symbol.upper(), t_side.upper(), float(t_total_qty), float(t_duration), int(t_chunks), client=cached_client(), max_slippage_bps=t_slippage or None)
+            st.session_state.setdefault("twap_jobs", []).append(job_id)
+            st.info(f"TWAP #{job_id} scheduled: {t_chunks} market orders every {t_duration/float(t_chunks):.1f} seconds.")
 
-            st.info(f"TWAP will place {t_chunks} market orders of {chunk_qty_adj} qty every {t_duration/float(t_chunks):.1f} seconds.")
-            
-            progress = st.progress(0)
-            status_box = st.empty()
-            results = []
-            
-            interval = t_duration / float(t_chunks)
+    if "twap_jobs" not in st.session_state:
+        # Schedules restored from the journal after a restart show up paused
+        st.session_state["twap_jobs"] = [p['id'] for p in get_scheduler().progress() if p['state'] in ('running', 'paused')]
+
+    @st.fragment(run_every=1)
+    def twap_progress_panel():
+        """Polls the scheduler for this session's TWAP jobs; only this panel reruns."""
+        scheduler = get_scheduler()
+        for job_id in reversed(st.session_state.get("twap_jobs", [])):
+            p = scheduler.progress(job_id)
+            st.markdown(f"**TWAP #{job_id}** — {p['side']} {p['total_quantity']} {p['symbol']} — `{p['state']}`")
+            st.progress(p['chunks_done'] / p['num_chunks'], text=f"{p['chunks_done']}/{p['num_chunks']} chunks, {p['executed_qty']} executed")
+            if p['error']:
+                st.error(f"Chunk {p['chunks_done'] + 1} failed: {p['error']}")
             
-            for i in range(int(t_chunks)):
-                status_box.info(f"TWAP chunk {i+1}/{int(t_chunks)} — placing market order for {chunk_qty_adj}")
-                try:
-                    r = place_market_order(t_symbol.upper(), t_side.upper(), float(chunk_qty_adj))
-                    results.append(r)
-                    status_box.success(f"Chunk {i+1} placed. OrderID: {r.get('orderId') if isinstance(r, dict) else r}")
-                except Exception as e:
-                    status_box.error(f"Chunk {i+1} failed: {e}")
-                    break
-                
-                progress.progress(int((i+1)/int(t_chunks)*100))
-                
-                if i < int(t_chunks)-1:
-                    time.sleep(interval)
-                    
-            st.write("TWAP results:")
-            st.json(results)
-            st.success("TWAP completed (attempted all chunks).")
+            if p['state'] in ('running', 'paused'):
+                c1, c2, c3 = st.columns(3)
+                if p['state'] == 'running' and c1.button("Pause", key=f"twap_pause_{job_id}"):
+                    scheduler.pause(job_id)
+                if p['state'] == 'paused' and c1.button("Resume", key=f"twap_resume_{job_id}"):
+                    scheduler.resume(job_id)
+                if c2.button("Cancel", key=f"twap_cancel_{job_id}"):
+                    scheduler.cancel(job_id)
+            elif p['order_ids']:
+                st.caption(f"Order IDs: {p['order_ids']}")
+
+    twap_progress_panel()
 
 # ----------------------
 # EXIT POSITION TAB (NEW)
@@ -360,9 +297,9 @@ with tab5:
     st.header("Exit Active Position (Market Close)")
     st.warning("This function closes a selected open position immediately via a Market Order.")
     
-    # Reload positions to ensure fresh data
-    active_positions, _ = get_positions() # Ignore PNL here, we only need the list
+    # Same snapshot the positions panel draws from
     client = cached_client()
+    active_positions = dashboard_service().section('positions')[0]
     
     if not active_positions:
         st.info("No active open positions to display or close.")
@@ -372,45 +309,109 @@ with tab5:
         position_symbols = list(position_map.keys())
         
         with st.form("exit_position_form"):
-            exit_symbol = st.selectbox("Select Position to Exit:", position_symbols, key="exit_symbol")
-            
-            # Get details for the selected symbol
-            selected_pos = position_map[exit_symbol]
+            exit_symbols = st.multiselect("Select Position(s) to Exit:", position_symbols, default=position_symbols[:1], key="exit_symbols")
             
             st.markdown(f"**Position Details:**")
-            st.json(selected_pos)
-            
-            # Determine the side needed to close the position
-            current_side = selected_pos['Side']
-            exit_side = 'SELL' if current_side == 'LONG' else 'BUY'
+            st.dataframe([position_map[s] for s in exit_symbols], hide_index=True, width='stretch')
             
-            st.info(f"To close this **{current_side}** position, a **{exit_side} Market Order** will be placed.")
+            st.info("Each selected **LONG** position is closed with a **SELL** Market Order, each **SHORT** with a **BUY**, and the TP/SL orders resting on it are cancelled. Everything goes out at once.")
             
-            submit_exit = st.form_submit_button(f"Execute {exit_side} Market Close")
-            
-            if submit_exit:
-                # The quantity to close is the absolute size of the position
-                exit_quantity = abs(float(selected_pos['Size']))
+            submit_exit = st.form_submit_button("Execute Market Close")
+        
+        flatten_all = st.button("🚨 Flatten All Positions", type="primary", key="flatten_all")
+        
+        if (submit_exit and exit_symbols) or flatten_all:
+            try:
+                # Closes and cancels are computed from the streamed account state
+                results = flatten(None if flatten_all else exit_symbols, client=client)
+            except Exception as e:
+                st.error(f"Position close failed: {e}")
+            else:
+                for symbol, result in results.items():
+                    if result['order']:
+                        st.success(f"Position close order executed successfully: {symbol} (cancelled {len(result['cancelled'])} TP/SL orders)")
+                        st.json(result['order'])
+                    else:
+                        st.error(f"Position close failed for {symbol}: {result['error']}")
+                    for error in result['cancel_errors']:
+                        st.warning(f"TP/SL cancel for {symbol}: {error}")
                 
-                try:
-                    # Note: We use the direct client call here to ensure reduceOnly=True is set explicitly, 
-                    # as place_market_order does not expose this parameter.
-                    resp = client.futures_create_order(
-                        symbol=exit_symbol,
-                        side=exit_side,
-                        type='MARKET',
-                        quantity=exit_quantity,
-                        reduceOnly=True 
-                    )
-                    
-                    st.success(f"Position close order executed successfully: {exit_symbol}")
-                    st.json(resp)
-                    # Clear cache and rerun to reflect the closed position immediately
-                    st.cache_resource.clear() 
+                if all(r['order'] for r in results.values()):
+                    # Rerun to reflect the closed positions immediately
                     st.rerun()
-                    
-                except Exception as e:
-                    st.error(f"Position close failed for {exit_symbol}: {e}")
+
+# ----------------------
+# MULTI-ORDER TAB
+# ----------------------
+with tab6:
+    st.header("Concurrent Orders")
+    st.info("Places independent orders at the same time. One order per line: `market:SYMBOL:SIDE:QTY`, `limit:SYMBOL:SIDE:QTY:PRICE` or `oco:SYMBOL:SIDE:QTY:TP:SL`.")
+    with st.form("multi_order_form"):
+        mo_specs = st.text_area("Orders", value="", height=150, key="mo_specs")
+        submit_multi = st.form_submit_button("Place All Orders")
+        
+        if submit_multi:
+            lines = [line for line in mo_specs.splitlines() if line.strip()]
+            try:
+                requests = [parse_order_spec(line) for line in lines]
+            except ValueError as e:
+                st.error(str(e))
+                requests = []
+            
+            if requests:
+                results = place_orders_concurrently(requests)
+                for line, res in zip(lines, results):
+                    if isinstance(res, Exception):
+                        st.error(f"{line}: {res}")
+                    else:
+                        st.success(f"{line}: placed")
+                        st.json(res)
+
+# ----------------------
+# Order journal
+# ----------------------
+st.markdown("---")
+st.subheader("Order Journal (today, UTC)")
+j1, j2 = st.columns(2)
+journal_strategy = j1.selectbox("Strategy", ("all", "market", "limit", "batch", "oco", "twap", "async"), key="journal_strategy")
+journal_symbol = j2.text_input("Symbol filter", value="", key="journal_symbol")
+journal_rows = get_journal().orders_today(
+    strategy=None if journal_strategy == "all" else journal_strategy,
+    symbol=journal_symbol.upper() or None,
+)
+if journal_rows:
+    journal_columns = ('ts', 'event', 'strategy', 'strategy_id', 'symbol', 'side', 'type', 'status', 'qty', 'price', 'stop_price', 'avg_price', 'order_id', 'error')
+    st.dataframe([{k: r[k] for k in journal_columns} for r in reversed(journal_rows[-200:])], hide_index=True, width='stretch')
+else:
+    st.info("No journaled orders today.")
+
+# ----------------------
+# Order latency & rate-limit metrics
+# ----------------------
+st.markdown("---")
+st.subheader("Order Latency")
+# Same numbers as the Prometheus endpoint; started once per process
+metrics_server = serve_metrics()
+
+@st.fragment(run_every=2)
+def metrics_panel():
+    """Per-stage p50/p99 latency and request counters; only this panel reruns."""
+    snap = METRICS.snapshot()
+    gauges = snap['gauges']
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Used weight (1m)", gauges.get('bot_used_weight_1m', 0))
+    m2.metric("Orders (10s)", gauges.get('bot_order_count_10s', 0))
+    m3.metric("Rejects", sum(v for k, v in snap['counters'].items() if k.startswith('bot_rejects_total')))
+    
+    if snap['latency']:
+        rows = sorted(snap['latency'], key=lambda r: (r.get('order_type', ''), r.get('stage', ''), r.get('endpoint', '')))
+        st.dataframe(rows, hide_index=True, width='stretch')
+    else:
+        st.info("No orders timed yet in this session.")
+    if metrics_server is not None:
+        st.caption(f"Prometheus scrape endpoint: http://<host>:{metrics_server.server_address[1]}/metrics")
+
+metrics_panel()
 
 st.markdown("---")
-st.caption("Note: This UI polls REST endpoints for price & account info. For production-grade real-time updates use authenticated WebSocket streams and background worker processes.")
+st.caption("Note: Prices stream over WebSocket (mark price & book ticker); balances, orders and positions come from the user data stream.")
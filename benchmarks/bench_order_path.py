@@ -0,0 +1,260 @@
+# benchmarks/bench_order_path.py
+"""
+Micro-benchmarks for the per-order hot path, checked against tracked baselines.
+
+Every stage runs against a canned in-process HTTP transport, so results
+measure our own overhead (validation, rule lookup, rounding, signing,
+request building, journaling) and never the network. Besides time per call, each stage
+records how many HTTP requests one call makes; a stage that suddenly makes an
+extra request (a second client, a ping, an exchangeInfo download) fails
+regardless of timing.
+
+    python benchmarks/bench_order_path.py                 # compare to baselines.json
+    python benchmarks/bench_order_path.py --update        # record new baselines
+    python benchmarks/bench_order_path.py -k signing -k market
+
+Exits 1 if any stage's fastest round is slower than its baseline by more
+than --tolerance (default 25%) or makes more requests per call than recorded.
+Timings are machine-specific: record baselines on the machine that checks them.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import statistics
+from urllib.parse import urlsplit
+from requests import Response
+from requests.adapters import BaseAdapter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.append(os.path.join(PROJECT_ROOT, 'src'))
+sys.path.append(os.path.join(PROJECT_ROOT, 'src', 'advanced'))
+
+# Keep the benchmark away from the real .env, bot.log and exchange-info snapshot
+os.environ['API_KEY'] = 'bench-key'
+os.environ['API_SECRET'] = 'bench-secret'
+os.environ['HEALTH_CHECK_INTERVAL'] = '0'
+# The canned serverTime never moves: no background resync against it
+os.environ['TIME_SYNC_INTERVAL'] = '0'
+RUN_DIR = tempfile.mkdtemp(prefix='bench-')
+os.environ['EXCHANGE_INFO_SNAPSHOT'] = os.path.join(RUN_DIR, 'exchange_info.json')
+# The normal queued JSON logging runs, into a throwaway file
+os.environ['LOG_FILE'] = os.path.join(RUN_DIR, 'bot.log')
+os.environ['JOURNAL_DB'] = os.path.join(RUN_DIR, 'journal.sqlite3')
+
+import numpy as np  # noqa: E402
+from utils import CLIENT_REGISTRY, get_client, get_symbol_filters, validate_order, adjust_price_to_tick, adjust_qty_to_step  # noqa: E402
+from exchange_info import get_symbol_rules  # noqa: E402
+from market_orders import place_market_order  # noqa: E402
+from oco import place_oco_conditional_orders  # noqa: E402
+from rate_limiter import get_request_scheduler  # noqa: E402
+
+BASELINES_FILE = os.path.join(BENCH_DIR, 'baselines.json')
+DEFAULT_TOLERANCE = 0.25
+# Target wall time of one timing round, and number of rounds per stage
+ROUND_SECONDS = 0.2
+ROUNDS = 5
+
+SYMBOL = 'BTCUSDT'
+# Orders per call of the vectorized filter stage
+BATCH_SIZE = 1000
+EXCHANGE_INFO = {
+    'timezone': 'UTC', 'serverTime': 0, 'rateLimits': [],
+    'symbols': [{
+        'symbol': SYMBOL, 'status': 'TRADING', 'pricePrecision': 1, 'quantityPrecision': 3,
+        'filters': [
+            {'filterType': 'PRICE_FILTER', 'minPrice': '0.1', 'maxPrice': '4529764', 'tickSize': '0.1'},
+            {'filterType': 'LOT_SIZE', 'minQty': '0.001', 'maxQty': '1000', 'stepSize': '0.001'},
+            {'filterType': 'MIN_NOTIONAL', 'notional': '5'},
+        ],
+    }],
+}
+ORDER = {
+    'orderId': 1, 'symbol': SYMBOL, 'status': 'NEW', 'clientOrderId': 'bench', 'price': '0', 'avgPrice': '0.00',
+    'origQty': '0.010', 'executedQty': '0', 'cumQuote': '0', 'timeInForce': 'GTC', 'type': 'MARKET',
+    'reduceOnly': False, 'side': 'BUY', 'stopPrice': '0', 'updateTime': 0,
+}
+ROUTES = {
+    ('GET', 'ping'): {},
+    # The registry's connectivity check is also the first server-time sample
+    ('GET', 'time'): {'serverTime': int(time.time() * 1000)},
+    ('GET', 'exchangeInfo'): EXCHANGE_INFO,
+    ('POST', 'order'): ORDER,
+    ('POST', 'batchOrders'): [dict(ORDER, orderId=2, type='TAKE_PROFIT_MARKET'), dict(ORDER, orderId=3, type='STOP_MARKET')],
+}
+
+
+class CannedTransport(BaseAdapter):
+    """requests adapter answering futures endpoints from ROUTES without any I/O."""
+
+    def __init__(self, routes):
+        super().__init__()
+        self.bodies = {route: json.dumps(body).encode() for route, body in routes.items()}
+        self.requests = 0
+
+    def send(self, request, **kwargs):
+        self.requests += 1
+        path = urlsplit(request.url).path.split('/', 3)[-1]
+        response = Response()
+        response.request = request
+        response.url = request.url
+        response.headers['Content-Type'] = 'application/json'
+        body = self.bodies.get((request.method, path))
+        if body is None:
+            response.status_code = 404
+            response._content = json.dumps({'code': -1000, 'msg': f'No canned route for {request.method} {path}'}).encode()
+        else:
+            response.status_code = 200
+            response._content = body
+        return response
+
+    def close(self):
+        pass
+
+
+def install_transport():
+    """Mount the canned transport on the shared client so every stage goes through it."""
+    transport = CannedTransport(ROUTES)
+    build = CLIENT_REGISTRY._build
+
+    def build_with_transport(api_key, api_secret):
+        client = build(api_key, api_secret)
+        client.session.mount('https://', transport)
+        client.session.mount('http://', transport)
+        return client
+
+    # Swap the transport in before the registry's first ping goes out
+    CLIENT_REGISTRY._build = build_with_transport
+    client = get_client()
+    # The canned responses carry no usage headers; keep the scheduler's own
+    # accounting from throttling thousands of benchmark orders
+    get_request_scheduler().set_rate_limits([
+        {'rateLimitType': kind, 'interval': 'MINUTE', 'intervalNum': 1, 'limit': 10 ** 9}
+        for kind in ('REQUEST_WEIGHT', 'ORDERS')
+    ])
+    # Warm the exchange-info cache the way a running bot would have it
+    get_symbol_rules(client, SYMBOL)
+    return client, transport
+
+
+def build_stages(client):
+    """Name -> zero-argument callable for one call of each hot-path stage."""
+    filters = get_symbol_filters(SYMBOL, client)
+    rng = np.random.default_rng(0)
+    batch_qty = np.round(rng.uniform(0.001, 1.0, BATCH_SIZE), 3)
+    batch_price = np.round(rng.uniform(50000, 70000, BATCH_SIZE), 1)
+    return {
+        'validate_order': lambda: validate_order(SYMBOL, 'BUY', 0.01, price=60000.1, client=client),
+        'filters_check': lambda: filters.check(0.01, 60000.1, 'LIMIT', mark_price=60000.0),
+        'filters_check_batch': lambda: filters.check_batch(batch_qty, batch_price, 'LIMIT', mark_price=60000.0),
+        'exchange_rules_lookup': lambda: get_symbol_rules(client, SYMBOL),
+        'adjust_price_to_tick': lambda: adjust_price_to_tick(60123.456, 0.1),
+        'adjust_qty_to_step': lambda: adjust_qty_to_step(0.012345, 0.001),
+        'request_signing': lambda: client._generate_signature({'symbol': SYMBOL, 'side': 'BUY', 'type': 'MARKET', 'quantity': 0.01, 'timestamp': 1700000000000}),
+        # No client argument: the registry lookup is part of what the UI and CLI pay
+        'place_market_order': lambda: place_market_order(SYMBOL, 'BUY', 0.01),
+        'place_oco_round_trip': lambda: place_oco_conditional_orders(SYMBOL, 'SELL', 0.01, 61000.0, 59000.0),
+    }
+
+
+def measure(func, transport):
+    """Return per-call timing stats (ns) and HTTP requests per call for func."""
+    func()  # Warm-up; also surfaces errors before timing
+    start = time.perf_counter()
+    calls = 0
+    while time.perf_counter() - start < ROUND_SECONDS / 10:
+        func()
+        calls += 1
+    number = max(1, calls * 10)  # ~ROUND_SECONDS per round
+
+    samples = []
+    requests_before = transport.requests
+    for _ in range(ROUNDS):
+        t0 = time.perf_counter_ns()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter_ns() - t0) / number)
+    made = transport.requests - requests_before
+
+    return {
+        'median_ns': round(statistics.median(samples)),
+        'min_ns': round(min(samples)),
+        'requests_per_call': round(made / (number * ROUNDS), 3),
+        'calls': number * ROUNDS,
+    }
+
+
+def compare(name, result, baseline, tolerance):
+    """Return a list of regression messages for one stage (empty if it passes)."""
+    problems = []
+    if baseline is None:
+        return problems
+    # The fastest round is the least disturbed by other load on the machine
+    limit = baseline['min_ns'] * (1 + tolerance)
+    if result['min_ns'] > limit:
+        problems.append(f"{name}: {result['min_ns'] / 1000:.1f}us > {baseline['min_ns'] / 1000:.1f}us +{tolerance:.0%}")
+    if result['requests_per_call'] > baseline['requests_per_call']:
+        problems.append(f"{name}: {result['requests_per_call']} requests/call > baseline {baseline['requests_per_call']}")
+    return problems
+
+
+def load_baselines(path=BASELINES_FILE):
+    try:
+        with open(path, 'r') as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return {'stages': {}}
+
+
+def save_baselines(results, path=BASELINES_FILE):
+    data = {
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'processor': platform.machine()},
+        'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'stages': results,
+    }
+    with open(path, 'w') as fh:
+        json.dump(data, fh, indent=2, sort_keys=True)
+        fh.write('\n')
+
+
+def run(selected=None, tolerance=DEFAULT_TOLERANCE, update=False):
+    client, transport = install_transport()
+    stages = build_stages(client)
+    baselines = load_baselines()['stages']
+    results, problems = {}, []
+
+    print(f"{'stage':<24}{'median':>12}{'min':>12}{'baseline':>12}{'req/call':>10}")
+    for name, func in stages.items():
+        if selected and not any(k in name for k in selected):
+            continue
+        result = measure(func, transport)
+        results[name] = result
+        baseline = baselines.get(name)
+        base_text = f"{baseline['min_ns'] / 1000:.1f}us" if baseline else '-'
+        print(f"{name:<24}{result['median_ns'] / 1000:>10.1f}us{result['min_ns'] / 1000:>10.1f}us{base_text:>12}{result['requests_per_call']:>10}")
+        problems.extend(compare(name, result, baseline, tolerance))
+
+    if update:
+        save_baselines({**baselines, **results})
+        print(f"✅ Baselines written to {BASELINES_FILE}")
+        return 0
+    if problems:
+        print("❌ Regressions:")
+        for problem in problems:
+            print(f"  {problem}")
+        return 1
+    print("✅ No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the order hot path against tracked baselines.")
+    parser.add_argument("-k", dest="selected", action="append", help="Only run stages whose name contains this (repeatable)")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--update", action="store_true", help="Record the results as the new baselines")
+    args = parser.parse_args()
+    sys.exit(run(args.selected, args.tolerance, args.update))
@@ -0,0 +1,339 @@
+# src/account_state.py
+import os
+import json
+import time
+import logging
+import threading
+import websocket
+from utils import TESTNET_FUTURES_WS_URL, get_client
+from metrics import METRICS
+from rate_limiter import critical_reads
+from journal import journal_order
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# listenKeys expire after 60 minutes without a keepalive
+LISTEN_KEY_KEEPALIVE = float(os.getenv("LISTEN_KEY_KEEPALIVE", "1800"))
+MAX_RECONNECT_DELAY = 30.0
+# Seconds start() waits for the stream's first snapshot
+SYNC_TIMEOUT = 10.0
+
+# Order statuses after which an order is no longer open
+TERMINAL_STATUSES = {'FILLED', 'CANCELED', 'EXPIRED', 'REJECTED', 'EXPIRED_IN_MATCH'}
+
+
+def order_from_event(o):
+    """Convert an ORDER_TRADE_UPDATE 'o' payload into the REST open-order shape."""
+    return {
+        'orderId': o['i'],
+        'clientOrderId': o['c'],
+        'symbol': o['s'],
+        'side': o['S'],
+        'type': o['o'],
+        'origType': o.get('ot', o['o']),
+        'timeInForce': o.get('f'),
+        'origQty': o['q'],
+        'price': o['p'],
+        'avgPrice': o.get('ap', '0'),
+        'stopPrice': o.get('sp', '0'),
+        'executedQty': o.get('z', '0'),
+        'status': o['X'],
+        'reduceOnly': o.get('R', False),
+        'closePosition': o.get('cp', False),
+        'positionSide': o.get('ps', 'BOTH'),
+        'updateTime': o.get('T', 0),
+        # Fields that only exist on the event, kept for listeners
+        'executionType': o.get('x'),
+        'lastFilledQty': o.get('l', '0'),
+        'lastFilledPrice': o.get('L', '0'),
+    }
+
+
+class AccountState:
+    """
+    In-memory balances, positions and open orders for one futures account.
+
+    Seeded from a REST snapshot and kept current by applying user-data-stream
+    events. Events that arrive while a snapshot is being fetched are replayed
+    onto it, so the older REST data never overwrites them. Listeners
+    registered with add_listener() receive every order update.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._balances = {}
+        self._positions = {}
+        self._open_orders = {}
+        self._listeners = []
+        self._pending = []  # One event list per snapshot being fetched
+        self.version = 0
+        self.synced_at = None
+
+    # --- Reads ---
+
+    def balances(self):
+        """Return {asset: wallet balance string}, like futures_account_balance()."""
+        with self._lock:
+            return {asset: b['balance'] for asset, b in self._balances.items()}
+
+    def positions(self):
+        """Return non-zero positions in the futures_position_information() shape."""
+        with self._lock:
+            return [dict(p) for p in self._positions.values() if float(p['positionAmt']) != 0.0]
+
+    def open_orders(self, symbol=None):
+        with self._lock:
+            return [dict(o) for o in self._open_orders.values() if symbol is None or o['symbol'] == symbol]
+
+    def add_listener(self, callback):
+        """Call callback(order) for every ORDER_TRADE_UPDATE, on the stream thread."""
+        self._listeners.append(callback)
+
+    # --- Writes ---
+
+    def start_snapshot(self):
+        """
+        Record stream events from now on, for a REST snapshot about to be
+        fetched; pass the result to load_snapshot(), or to discard_snapshot()
+        if the fetch fails.
+        """
+        events = []
+        with self._lock:
+            self._pending.append(events)
+        return events
+
+    def discard_snapshot(self, events):
+        with self._lock:
+            if events in self._pending:
+                self._pending.remove(events)
+
+    def load_snapshot(self, balances, positions, open_orders, events=None):
+        """
+        Replace the whole state with REST snapshot data, then replay the
+        events recorded since start_snapshot(); an entry the snapshot has
+        newer (by updateTime) is kept.
+        """
+        with self._lock:
+            self._balances = {b['asset']: {'balance': b['balance'], 'crossWalletBalance': b.get('crossWalletBalance'),
+                                           'updateTime': b.get('updateTime', 0)} for b in balances}
+            self._positions = {p['symbol']: dict(p) for p in positions}
+            self._open_orders = {o['orderId']: dict(o) for o in open_orders}
+            if events is not None:
+                self.discard_snapshot(events)
+                # Listeners already saw these live
+                for event in events:
+                    if event.get('e') == 'ACCOUNT_UPDATE':
+                        self._apply_account_update(event['a'], event.get('T', 0))
+                    elif event.get('e') == 'ORDER_TRADE_UPDATE':
+                        self._apply_order_update(order_from_event(event['o']))
+            self.synced_at = time.time()
+            self.version += 1
+
+    def apply(self, event):
+        """Apply one user-data-stream event."""
+        with self._lock:
+            for events in self._pending:
+                events.append(event)
+        kind = event.get('e')
+        if kind == 'ACCOUNT_UPDATE':
+            self._apply_account_update(event['a'], event.get('T', 0))
+        elif kind == 'ORDER_TRADE_UPDATE':
+            order = order_from_event(event['o'])
+            if self._apply_order_update(order):
+                for callback in self._listeners:
+                    try:
+                        callback(order)
+                    except Exception as e:
+                        logger.error(f"ACCOUNT_STATE_LISTENER_ERROR: {e}")
+
+    def _apply_account_update(self, a, update_time):
+        with self._lock:
+            for b in a.get('B', []):
+                # Replayed onto a newer snapshot: keep the snapshot
+                if self._balances.get(b['a'], {}).get('updateTime', 0) > update_time:
+                    continue
+                self._balances[b['a']] = {'balance': b['wb'], 'crossWalletBalance': b.get('cw'), 'updateTime': update_time}
+            for p in a.get('P', []):
+                pos = self._positions.setdefault(p['s'], {'symbol': p['s'], 'liquidationPrice': '0'})
+                if pos.get('updateTime', 0) > update_time:
+                    continue
+                pos.update({
+                    'positionAmt': p['pa'],
+                    'entryPrice': p['ep'],
+                    'unRealizedProfit': p['up'],
+                    'positionSide': p.get('ps', 'BOTH'),
+                    'updateTime': update_time,
+                })
+            self.version += 1
+
+    def _apply_order_update(self, order):
+        with self._lock:
+            current = self._open_orders.get(order['orderId'])
+            # Events can be replayed across a resync; never go backwards
+            if current is not None and current.get('updateTime', 0) > order['updateTime']:
+                return False
+            if order['status'] in TERMINAL_STATUSES:
+                self._open_orders.pop(order['orderId'], None)
+            else:
+                self._open_orders[order['orderId']] = order
+            self.version += 1
+            return True
+
+
+class UserDataStream:
+    """
+    listenKey-based user data stream that keeps an AccountState current.
+
+    The state is resynced from REST whenever the socket (re)connects, since
+    events missed while disconnected cannot be replayed. The listenKey is kept
+    alive on a timer and replaced when the exchange reports it expired.
+    """
+
+    def __init__(self, client, state=None, ws_url=TESTNET_FUTURES_WS_URL):
+        self.client = client
+        self.state = state or AccountState()
+        self.ws_url = ws_url
+        self.listen_key = None
+        self.connected = False
+        self._ws = None
+        self._thread = None
+        self._stopped = threading.Event()
+        self._synced = threading.Event()
+        self._connect_failed = threading.Event()
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="user-data-stream", daemon=True)
+        self._thread.start()
+        threading.Thread(target=self._keepalive, name="listen-key-keepalive", daemon=True).start()
+
+        # Don't return an empty account: wait for the on-connect snapshot, or
+        # take one directly if the socket is slow to come up or has already failed
+        deadline = time.monotonic() + SYNC_TIMEOUT
+        while not self._synced.wait(0.05) and not self._connect_failed.is_set() and time.monotonic() < deadline:
+            pass
+        if not self._synced.is_set():
+            try:
+                self.resync()
+            except Exception:
+                # No state to serve: don't leave the stream and keepalive threads behind
+                self.stop()
+                raise
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._ws is not None:
+            self._ws.close()
+        self._thread = None
+
+    def resync(self):
+        """Reload the full account state from REST."""
+        events = self.state.start_snapshot()
+        try:
+            with critical_reads():
+                balances = self.client.futures_account_balance()
+                positions = self.client.futures_position_information()
+                open_orders = self.client.futures_get_open_orders()
+        except Exception:
+            self.state.discard_snapshot(events)
+            raise
+        self.state.load_snapshot(balances, positions, open_orders, events)
+        self._synced.set()
+        logger.info(f"USER_DATA_RESYNC: Positions={len(self.state.positions())}, OpenOrders={len(open_orders)}")
+
+    def _run(self):
+        delay = 1.0
+        while not self._stopped.is_set():
+            try:
+                self.listen_key = self.client.futures_stream_get_listen_key()
+                self._ws = websocket.WebSocketApp(
+                    f"{self.ws_url}/ws/{self.listen_key}",
+                    on_open=self._on_open, on_message=self._on_message, on_error=self._on_error,
+                )
+                if self._stopped.is_set():
+                    break  # stop() ran while the listenKey was being fetched
+                started = time.monotonic()
+                self._ws.run_forever(ping_interval=60, ping_timeout=20)
+                delay = 1.0 if time.monotonic() - started > 60 else min(delay * 2, MAX_RECONNECT_DELAY)
+            except Exception as e:
+                logger.error(f"USER_DATA_ERROR: {e}")
+                self._connect_failed.set()
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+            self.connected = False
+            if not self._stopped.is_set():
+                logger.warning(f"USER_DATA_RECONNECT: Retrying in {delay:.0f}s")
+                METRICS.inc('bot_retries_total', component='user_data')
+                self._stopped.wait(delay)
+
+    def _keepalive(self):
+        while not self._stopped.wait(LISTEN_KEY_KEEPALIVE):
+            if self.listen_key:
+                try:
+                    self.client.futures_stream_keepalive(listenKey=self.listen_key)
+                except Exception as e:
+                    logger.error(f"USER_DATA_KEEPALIVE_ERROR: {e}")
+
+    def _on_open(self, ws):
+        self.connected = True
+        try:
+            # Anything that happened while we were disconnected is only in REST
+            self.resync()
+        except Exception as e:
+            logger.error(f"USER_DATA_RESYNC_ERROR: {e}")
+            ws.close()
+
+    def _on_error(self, ws, error):
+        logger.error(f"USER_DATA_ERROR: {error}")
+        if not self.connected:
+            self._connect_failed.set()
+
+    def _on_message(self, ws, message):
+        event = json.loads(message)
+        if event.get('e') == 'listenKeyExpired':
+            logger.warning("USER_DATA_LISTEN_KEY_EXPIRED: Reconnecting with a new key")
+            ws.close()
+            return
+        self.state.apply(event)
+
+
+_STREAM = None
+_STREAM_LOCK = threading.Lock()
+
+
+def _journal_update(order):
+    # Every status change and fill seen on the stream goes into the journal
+    journal_order(order, 'fill' if order.get('executionType') == 'TRADE' else 'update')
+
+
+def get_user_stream(client=None):
+    """Return the process-wide UserDataStream, starting it on first use."""
+    global _STREAM
+    with _STREAM_LOCK:
+        if _STREAM is None:
+            stream = UserDataStream(client or get_client())
+            stream.state.add_listener(_journal_update)
+            # Published only once synced, so a failed start is retried by the next caller
+            _STREAM = stream.start()
+        return _STREAM
+
+
+def peek_open_order_count(symbol):
+    """Open orders on symbol if the user stream is already running (never starts it)."""
+    stream = _STREAM
+    return len(stream.state.open_orders(symbol)) if stream is not None else None
+
+
+def peek_account_state():
+    """Live AccountState if the user stream is already running (never starts it)."""
+    stream = _STREAM
+    return stream.state if stream is not None else None
+
+
+def get_account_state(client=None):
+    """Return the live AccountState of the process-wide user data stream."""
+    return get_user_stream(client).state
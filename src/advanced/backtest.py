@@ -0,0 +1,273 @@
+# src/advanced/backtest.py
+import os
+import sys
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from numpy.lib.stride_tricks import sliding_window_view
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+sys.path.append(current_dir)
+
+from klines_store import KLINES_DIR, KlineStore, interval_ms
+from twap import next_chunk_quantity
+
+# --- Configuration ---
+# Taker fee charged on every simulated fill (market, stop-market and take-profit-market)
+TAKER_FEE = float(os.getenv("BACKTEST_TAKER_FEE", "0.0004"))
+# Fixed adverse slippage on every fill, in bps
+SLIPPAGE_BPS = float(os.getenv("BACKTEST_SLIPPAGE_BPS", "1.0"))
+# Extra slippage in bps when a fill takes the candle's whole volume (linear in participation)
+IMPACT_BPS = float(os.getenv("BACKTEST_IMPACT_BPS", "50.0"))
+# Candles scanned per step when looking for the first OCO trigger
+OCO_SCAN_BLOCK = 64
+
+
+def twap_chunk_quantities(total_quantity, num_chunks, step_size=None, min_qty=0.0):
+    """
+    Chunk sizes the live TwapScheduler would send, from the same
+    next_chunk_quantity() logic (market chunks fill in full, so executed
+    quantity is the running sum).
+    """
+    quantities = []
+    executed = 0.0
+    for i in range(num_chunks):
+        qty = next_chunk_quantity(total_quantity, num_chunks, i, executed, step_size, min_qty)
+        quantities.append(qty)
+        executed += qty
+    return np.array(quantities)
+
+
+def _starts(length, span, starts=None, stride=1):
+    # Start candles whose whole schedule fits in the data
+    if starts is None:
+        return np.arange(0, max(length - span + 1, 0), stride)
+    starts = np.asarray(starts, dtype=np.int64)
+    return starts[starts + span <= length]
+
+
+def _prefix_sums(klines):
+    # Cumulative price*volume and volume, computed once per loaded series
+    cached = getattr(klines, '_prefix_sums', None)
+    if cached is None:
+        volume = np.asarray(klines['volume'])
+        typical = (np.asarray(klines['high']) + np.asarray(klines['low']) + np.asarray(klines['close'])) / 3
+        cached = (np.concatenate(([0.0], np.cumsum(typical * volume))), np.concatenate(([0.0], np.cumsum(volume))))
+        klines._prefix_sums = cached
+    return cached
+
+
+def backtest_twap(klines, side, total_quantity, duration_seconds, num_chunks, starts=None, stride=1,
+                  step_size=None, min_qty=0.0, fee=TAKER_FEE, slippage_bps=SLIPPAGE_BPS, impact_bps=IMPACT_BPS):
+    """
+    Replay one TWAP configuration from every start candle at once.
+
+    Chunk i fills at the open of the candle its slot falls in, moved against
+    the order by slippage_bps plus impact_bps * (chunk qty / candle volume).
+    Returns a dict of per-start arrays: arrival price, window VWAP, average
+    fill, shortfall against both in bps, and fees.
+    """
+    step_ms = interval_ms(klines.interval)
+    sign = 1.0 if side.upper() == 'BUY' else -1.0
+    quantities = twap_chunk_quantities(total_quantity, num_chunks, step_size, min_qty)
+    offsets = (np.arange(num_chunks) * (duration_seconds * 1000.0 / num_chunks) // step_ms).astype(np.int64)
+    span = int(offsets[-1]) + 1
+
+    opens = np.asarray(klines['open'])
+    volume = np.asarray(klines['volume'])
+    starts = _starts(len(opens), span, starts, stride)
+    idx = starts[:, None] + offsets[None, :]
+
+    prices = opens[idx]
+    participation = quantities[None, :] / np.maximum(volume[idx], 1e-12)
+    fills = prices * (1 + sign * (slippage_bps + impact_bps * participation) / 1e4)
+    executed = quantities.sum()
+    notional = fills @ quantities
+    avg_price = notional / executed if executed else np.full(len(starts), np.nan)
+
+    # Window VWAP from prefix sums over typical price
+    cum_pv, cum_v = _prefix_sums(klines)
+    vwap = (cum_pv[starts + span] - cum_pv[starts]) / np.maximum(cum_v[starts + span] - cum_v[starts], 1e-12)
+
+    arrival = opens[starts]
+    return {
+        'start_time': np.asarray(klines['open_time'])[starts],
+        'arrival_price': arrival,
+        'vwap': vwap,
+        'avg_price': avg_price,
+        'executed_qty': np.full(len(starts), executed),
+        'shortfall_bps': sign * (avg_price - arrival) / arrival * 1e4,
+        'vs_vwap_bps': sign * (avg_price - vwap) / vwap * 1e4,
+        'fees': notional * fee,
+    }
+
+
+def backtest_oco(klines, side, take_profit_pct, stop_loss_pct, horizon, quantity=1.0, starts=None, stride=1,
+                 fee=TAKER_FEE, slippage_bps=SLIPPAGE_BPS):
+    """
+    Replay one TP/SL bracket from every start candle at once.
+
+    side is the closing side, as for place_oco_conditional_orders (SELL
+    brackets a long). The position is entered at the start candle's open and
+    the first candle whose range reaches a trigger closes it: at the trigger,
+    or at the open if the candle gapped through it. A candle reaching both is
+    counted as a stop-loss. After `horizon` candles the position is closed at
+    the last close. Fees are charged on entry and exit.
+    """
+    long = side.upper() == 'SELL'
+    direction = 1.0 if long else -1.0
+    opens = np.asarray(klines['open'])
+    highs = np.asarray(klines['high'])
+    lows = np.asarray(klines['low'])
+    closes = np.asarray(klines['close'])
+    starts = _starts(len(opens), horizon, starts, stride)
+
+    entry = opens[starts]
+    tp = entry * (1 + direction * take_profit_pct / 100)
+    sl = entry * (1 - direction * stop_loss_pct / 100)
+    exit_offset = np.full(len(starts), horizon - 1, dtype=np.int64)
+    outcome = np.zeros(len(starts), dtype=np.int8)  # 0 timeout, 1 take-profit, 2 stop-loss
+
+    for first in range(0, horizon, OCO_SCAN_BLOCK):
+        pending = np.flatnonzero(outcome == 0)
+        if not len(pending):
+            break
+        width = min(OCO_SCAN_BLOCK, horizon - first)
+        rows = starts[pending] + first
+        up = sliding_window_view(highs, width)[rows]
+        down = sliding_window_view(lows, width)[rows]
+        if long:
+            tp_hit, sl_hit = up >= tp[pending, None], down <= sl[pending, None]
+        else:
+            tp_hit, sl_hit = down <= tp[pending, None], up >= sl[pending, None]
+        hit = tp_hit | sl_hit
+        found = hit.any(axis=1)
+        offset = hit.argmax(axis=1)[found]
+        resolved = pending[found]
+        exit_offset[resolved] = first + offset
+        outcome[resolved] = np.where(sl_hit[found, offset], 2, 1)
+
+    exit_idx = starts + exit_offset
+    gap_open = opens[exit_idx]
+    exit_price = closes[exit_idx].copy()
+    is_tp, is_sl = outcome == 1, outcome == 2
+    # Triggered legs fill at the trigger, or at the open when it gapped through
+    better, worse = (np.maximum, np.minimum) if long else (np.minimum, np.maximum)
+    exit_price[is_tp] = better(tp[is_tp], gap_open[is_tp])
+    exit_price[is_sl] = worse(sl[is_sl], gap_open[is_sl])
+    exit_price *= 1 - direction * slippage_bps / 1e4
+
+    fees = fee * (entry + exit_price) * quantity
+    pnl = direction * (exit_price - entry) * quantity - fees
+    return {
+        'start_time': np.asarray(klines['open_time'])[starts],
+        'entry_price': entry,
+        'exit_price': exit_price,
+        'outcome': outcome,
+        'hold_candles': exit_offset + 1,
+        'fees': fees,
+        'pnl': pnl,
+        'pnl_bps': pnl / (entry * quantity) * 1e4,
+    }
+
+
+def summarize(result):
+    """Aggregate a backtest_twap() or backtest_oco() result into one row of statistics."""
+    runs = len(result['start_time'])
+    if 'outcome' in result:
+        pnl_bps = result['pnl_bps']
+        return {
+            'runs': runs,
+            'take_profit_rate': float(np.mean(result['outcome'] == 1)) if runs else np.nan,
+            'stop_loss_rate': float(np.mean(result['outcome'] == 2)) if runs else np.nan,
+            'timeout_rate': float(np.mean(result['outcome'] == 0)) if runs else np.nan,
+            'mean_pnl_bps': float(np.mean(pnl_bps)) if runs else np.nan,
+            'median_pnl_bps': float(np.median(pnl_bps)) if runs else np.nan,
+            'pnl_sharpe': float(np.mean(pnl_bps) / np.std(pnl_bps)) if runs and np.std(pnl_bps) else np.nan,
+            'mean_hold_candles': float(np.mean(result['hold_candles'])) if runs else np.nan,
+            'total_pnl': float(np.sum(result['pnl'])),
+        }
+    shortfall = result['shortfall_bps']
+    return {
+        'runs': runs,
+        'mean_shortfall_bps': float(np.mean(shortfall)) if runs else np.nan,
+        'median_shortfall_bps': float(np.median(shortfall)) if runs else np.nan,
+        'p95_shortfall_bps': float(np.percentile(shortfall, 95)) if runs else np.nan,
+        'mean_vs_vwap_bps': float(np.mean(result['vs_vwap_bps'])) if runs else np.nan,
+        'mean_fees': float(np.mean(result['fees'])) if runs else np.nan,
+    }
+
+
+STRATEGIES = {'twap': backtest_twap, 'oco': backtest_oco}
+
+# Per-process data of a sweep worker: the mapped klines are opened once, not once per combination
+_WORKER_KLINES = None
+
+
+def _init_worker(root, symbol, interval, start_ms, end_ms):
+    global _WORKER_KLINES
+    _WORKER_KLINES = KlineStore(root).load(symbol, interval, start_ms, end_ms)
+
+
+def _evaluate(task):
+    strategy, params = task
+    return {**params, **summarize(STRATEGIES[strategy](_WORKER_KLINES, **params))}
+
+
+def sweep(strategy, grid, symbol, interval, start_ms=None, end_ms=None, processes=None, root=KLINES_DIR, **fixed):
+    """
+    Evaluate every combination of `grid` ({param: [values]}) for a strategy
+    ('twap' or 'oco') over stored klines on a process pool. Each worker maps
+    the klines files once; fixed keyword arguments apply to every run.
+    Returns a pandas DataFrame with one summarize() row per combination.
+    """
+    import pandas as pd
+
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy '{strategy}' (one of {', '.join(STRATEGIES)}).")
+    keys = list(grid)
+    tasks = [(strategy, {**fixed, **dict(zip(keys, values))}) for values in itertools.product(*grid.values())]
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        _init_worker(root, symbol, interval, start_ms, end_ms)
+        rows = [_evaluate(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(root, symbol, interval, start_ms, end_ms)) as pool:
+            rows = list(pool.map(_evaluate, tasks, chunksize=max(1, len(tasks) // (processes * 4))))
+    return pd.DataFrame(rows)
+
+
+def _values(text, cast):
+    return [cast(v) for v in text.split(",") if v]
+
+
+if __name__ == "__main__":
+    usage = ("Usage: python src/advanced/backtest.py twap <symbol> <interval> <BUY/SELL> <qty> <duration_s[,...]> <chunks[,...]>\n"
+             "       python src/advanced/backtest.py oco <symbol> <interval> <BUY/SELL> <tp_pct[,...]> <sl_pct[,...]> <horizon[,...]>")
+    if len(sys.argv) != 8 or sys.argv[1] not in STRATEGIES:
+        print(usage)
+        sys.exit(1)
+
+    strategy, symbol, interval, side = sys.argv[1], sys.argv[2].upper(), sys.argv[3], sys.argv[4].upper()
+    try:
+        if strategy == 'twap':
+            fixed = {'side': side, 'total_quantity': float(sys.argv[5])}
+            grid = {'duration_seconds': _values(sys.argv[6], float), 'num_chunks': _values(sys.argv[7], int)}
+            sort_by, ascending = 'mean_shortfall_bps', True
+        else:
+            fixed = {'side': side}
+            grid = {'take_profit_pct': _values(sys.argv[5], float), 'stop_loss_pct': _values(sys.argv[6], float),
+                    'horizon': _values(sys.argv[7], int)}
+            sort_by, ascending = 'mean_pnl_bps', False
+    except ValueError:
+        print(usage)
+        sys.exit(1)
+
+    if not len(KlineStore().load(symbol, interval)):
+        print(f"❌ No stored {symbol} {interval} klines. Run: python src/klines_store.py {symbol} {interval}")
+        sys.exit(1)
+
+    results = sweep(strategy, grid, symbol, interval, **fixed)
+    print(f"✅ {len(results)} combinations")
+    print(results.sort_values(sort_by, ascending=ascending).head(20).to_string(index=False))
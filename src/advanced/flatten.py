@@ -0,0 +1,124 @@
+# src/advanced/flatten.py
+import os
+import sys
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the parent directory ('src') to the system path to find utils.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import get_client
+from account_state import get_account_state
+from batch_orders import MAX_BATCH_SIZE, build_close_orders, place_batch_orders
+from metrics import METRICS, timed
+from journal import journal_order
+from oco_manager import peek_oco_manager
+
+logger = logging.getLogger(__name__)
+
+# Binance Futures cancels at most 10 orders per batchOrders DELETE
+MAX_CANCEL_BATCH = 10
+# Requests in flight at once while flattening
+FLATTEN_WORKERS = int(os.getenv("FLATTEN_WORKERS", "8"))
+
+# Resting orders that only exist to exit a position
+PROTECTIVE_TYPES = {'TAKE_PROFIT_MARKET', 'STOP_MARKET', 'TAKE_PROFIT', 'STOP', 'TRAILING_STOP_MARKET'}
+
+
+def protective_orders(open_orders, symbols):
+    """Open TP/SL (and other reduce-only) orders on symbols."""
+    return [o for o in open_orders if o['symbol'] in symbols
+            and (o.get('type') in PROTECTIVE_TYPES or o.get('reduceOnly') or o.get('closePosition'))]
+
+
+def _cancel_group(client, symbol, order_ids):
+    try:
+        # The client percent-encodes the list before signing it; a raw JSON list is re-encoded on the wire
+        responses = client.futures_cancel_orders(symbol=symbol, orderidlist=order_ids)
+    except Exception as e:
+        logger.error(f"FLATTEN_CANCEL_ERROR: Symbol={symbol}, IDs={order_ids}: {e}")
+        return [], [f"{order_id}: {e}" for order_id in order_ids]
+    cancelled, errors = [], []
+    for order_id, resp in zip(order_ids, responses):
+        if 'orderId' in resp:
+            cancelled.append(resp['orderId'])
+            journal_order(resp, 'cancelled', strategy='flatten')
+        else:
+            # -2011: already filled or cancelled, which is just as good
+            errors.append(f"{order_id}: APIError(code={resp.get('code')}): {resp.get('msg')}")
+    return cancelled, errors
+
+
+@timed('order', order_type='flatten')
+def flatten(symbols=None, client=None, cancel_protective=True):
+    """
+    Close every open position (or those on symbols) with reduce-only market
+    orders and cancel the TP/SL orders resting on them.
+
+    Positions and open orders come from the live account state, so nothing
+    is fetched first. Close batches all go out at once on a thread pool,
+    then the cancels for the symbols that closed, so the whole exit takes
+    about two round trips. Returns
+    {symbol: {'order', 'error', 'cancelled', 'cancel_errors'}}.
+    """
+    if client is None:
+        client = get_client()
+    state = get_account_state(client)
+    positions = state.positions()
+    if symbols is not None:
+        wanted = {s.upper() for s in symbols}
+        positions = [p for p in positions if p['symbol'] in wanted]
+    close_orders = build_close_orders(positions)
+    results = {o['symbol']: {'order': None, 'error': None, 'cancelled': [], 'cancel_errors': []} for o in close_orders}
+    if not close_orders:
+        return results
+
+    with ThreadPoolExecutor(max_workers=FLATTEN_WORKERS, thread_name_prefix="flatten") as pool:
+        closes = [(group, pool.submit(place_batch_orders, group, client, 'flatten'))
+                  for group in (close_orders[i:i + MAX_BATCH_SIZE] for i in range(0, len(close_orders), MAX_BATCH_SIZE))]
+        for group, future in closes:
+            for order, result in zip(group, future.result()):
+                results[order['symbol']].update(order=result['order'], error=result['error'])
+
+        # A position whose close failed keeps its TP/SL: only cancel behind closed ones
+        closed = {symbol for symbol, r in results.items() if r['order']}
+        cancels = {}
+        if cancel_protective and closed:
+            for o in protective_orders(state.open_orders(), closed):
+                cancels.setdefault(o['symbol'], []).append(o['orderId'])
+            manager = peek_oco_manager()
+            if manager is not None and cancels:
+                # Both legs are cancelled here; the manager must not chase the siblings
+                manager.release([order_id for ids in cancels.values() for order_id in ids])
+        cancelling = [(symbol, pool.submit(_cancel_group, client, symbol, ids[i:i + MAX_CANCEL_BATCH]))
+                      for symbol, ids in cancels.items() for i in range(0, len(ids), MAX_CANCEL_BATCH)]
+        for symbol, future in cancelling:
+            cancelled, errors = future.result()
+            results[symbol]['cancelled'] += cancelled
+            results[symbol]['cancel_errors'] += errors
+
+    failed = [symbol for symbol, r in results.items() if r['error']]
+    if failed:
+        METRICS.inc('bot_order_errors_total', amount=len(failed), order_type='flatten')
+    logger.info(f"FLATTEN_RESULT: Closed={len(results) - len(failed)}, Failed={failed}, "
+                f"Cancelled={sum(len(r['cancelled']) for r in results.values())}")
+    return results
+
+
+if __name__ == "__main__":
+    symbols = [s for s in sys.argv[1].upper().split(",") if s] if len(sys.argv) > 1 else None
+    try:
+        results = flatten(symbols)
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+    if not results:
+        print("✅ No open positions.")
+    for symbol, r in results.items():
+        if r['order']:
+            print(f"✅ {symbol}: closed by order {r['order']['orderId']}, cancelled {r['cancelled'] or 'no'} TP/SL orders")
+        else:
+            print(f"❌ {symbol}: {r['error']}")
+        for error in r['cancel_errors']:
+            print(f"   ⚠️ {symbol} cancel {error}")
+    sys.exit(0 if all(r['order'] for r in results.values()) else 1)
@@ -2,16 +2,24 @@
 import sys
 import os 
 import logging
-from binance.exceptions import BinanceAPIException
 
 # 🟢 FIX 1: Add the parent directory ('src') to the system path to find utils.py
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
+if __name__ == "__main__":
+    # Hand the command to a running order daemon before paying for the imports below
+    from daemon_client import forward_cli
+    forward_cli('oco', sys.argv[1:])
+
 # 🟢 FIX 2: Import the functions *after* the path fix
 try:
-    from utils import get_client, validate_order 
+    from utils import get_client
+    from batch_orders import place_batch_orders
+    from metrics import METRICS, span, timed
+    from journal import journal_order
+    from order_submit import new_client_order_id
 except ImportError as e:
     # Fail gracefully if utils is still not found
     print(f"FATAL ERROR: Could not import utility functions: {e}")
@@ -19,53 +27,87 @@ except ImportError as e:
 
 logger = logging.getLogger(__name__)
 
-def place_oco_conditional_orders(symbol, side, quantity, take_profit_trigger, stop_loss_trigger):
-    # ... (function body is the same, but remove the print statements inside the try blocks) ...
-    client = get_client()
+@timed('order', order_type='oco')
+def place_oco_conditional_orders(symbol, side, quantity, take_profit_trigger, stop_loss_trigger, client=None, manager=None,
+                                 client_order_ids=None):
+    """
+    Place reduce-only TP and SL legs. Pass an OcoManager (see oco_manager.py)
+    to have the surviving leg cancelled automatically when the other one fills,
+    and client_order_ids=(tp, sl) to name the legs yourself.
+    """
+    if client is None:
+        with span('client', order_type='oco'):
+            client = get_client()
     
-    # 1. Validate inputs (The trigger prices must meet precision rules)
-    validate_order(symbol, side, quantity, price=take_profit_trigger)
-    validate_order(symbol, side, quantity, price=stop_loss_trigger)
-    
-    orders = []
+    tp_cid, sl_cid = client_order_ids or (new_client_order_id('oco'), new_client_order_id('oco'))
+    legs = [
+        # --- Order 1: Take Profit (Closes the position for profit) ---
+        dict(symbol=symbol, side=side, type='TAKE_PROFIT_MARKET', quantity=quantity, stopPrice=take_profit_trigger, reduceOnly=True,
+             newClientOrderId=tp_cid),
+        # --- Order 2: Stop Loss (Closes the position to limit loss) ---
+        dict(symbol=symbol, side=side, type='STOP_MARKET', quantity=quantity, stopPrice=stop_loss_trigger, reduceOnly=True,
+             newClientOrderId=sl_cid),
+    ]
 
-    # --- Order 1: Take Profit (Closes the position for profit) ---
-    try:
-        tp_order = client.futures_create_order(
-            symbol=symbol, side=side, type='TAKE_PROFIT_MARKET', quantity=quantity, stopPrice=take_profit_trigger, reduceOnly=True
-        )
-        orders.append(tp_order)
-        logging.info(f"OCO_TP_SUCCESS: Trigger={take_profit_trigger}, ID={tp_order.get('orderId')}")
-        # REMOVED: print("✅ Take Profit Market Order placed...")
-    except BinanceAPIException as e:
-        logging.error(f"OCO_TP_ERROR: Failed to place Take Profit: {e}")
-        raise # Re-raise for Streamlit
-        
-    # --- Order 2: Stop Loss (Closes the position to limit loss) ---
+    if manager is not None:
+        # A leg can fill on the stream before the batch response is back
+        manager.expect(symbol, tp_cid, sl_cid)
+    # Both legs are validated locally and sent in a single batchOrders request
     try:
-        sl_order = client.futures_create_order(
-            symbol=symbol, side=side, type='STOP_MARKET', quantity=quantity, stopPrice=stop_loss_trigger, reduceOnly=True
-        )
-        orders.append(sl_order)
-        logging.info(f"OCO_SL_SUCCESS: Trigger={stop_loss_trigger}, ID={sl_order.get('orderId')}")
-        # REMOVED: print("✅ Stop Loss Market Order placed...")
-    except BinanceAPIException as e:
-        logging.error(f"OCO_SL_ERROR: Failed to place Stop Loss: {e}")
-        raise # Re-raise for Streamlit
-        
+        tp_result, sl_result = place_batch_orders(legs, client=client, strategy='oco')
+    except Exception:
+        if manager is not None:
+            manager.abandon(tp_cid, sl_cid)
+        raise
+
+    if tp_result['error'] or sl_result['error']:
+        if manager is not None:
+            manager.abandon(tp_cid, sl_cid)
+        METRICS.inc('bot_order_errors_total', order_type='oco')
+        if tp_result['error']:
+            logger.error("OCO_TP_ERROR: Failed to place Take Profit: %s", tp_result['error'])
+        if sl_result['error']:
+            logger.error("OCO_SL_ERROR: Failed to place Stop Loss: %s", sl_result['error'])
+
+        # Don't leave half a bracket resting on the book
+        for result in (tp_result, sl_result):
+            if result['order']:
+                cancelled = client.futures_cancel_order(symbol=symbol, orderId=result['order']['orderId'])
+                journal_order(cancelled, 'cancelled', strategy='oco')
+                logger.info("OCO_LEG_CANCELLED: ID=%s", result['order']['orderId'])
+        raise RuntimeError(tp_result['error'] or sl_result['error']) # Re-raise for Streamlit
+
+    tp_order, sl_order = tp_result['order'], sl_result['order']
+    logger.info("OCO_TP_SUCCESS: Trigger=%s", take_profit_trigger, extra={'order': tp_order})
+    logger.info("OCO_SL_SUCCESS: Trigger=%s", stop_loss_trigger, extra={'order': sl_order})
+
+    if manager is not None:
+        with span('track', order_type='oco'):
+            manager.track(symbol, tp_order, sl_order)
+
     # 🟢 FIX: Return the list of orders
-    return orders
+    return [tp_order, sl_order]
 
 if __name__ == "__main__":
-    # ... (CLI parsing code is here) ...
+    # Same arguments as the order daemon's 'oco' command
     if len(sys.argv) != 6:
-        # ... print usage ...
+        print("Usage: python src/advanced/oco.py <symbol> <BUY/SELL> <quantity> <take_profit> <stop_loss>")
         sys.exit(1)
-    
-    # ... (symbol, side, qty parsing) ...
+
+    symbol = sys.argv[1].upper()
+    side = sys.argv[2].upper()
+    try:
+        quantity = float(sys.argv[3])
+        tp_price = float(sys.argv[4])
+        sl_price = float(sys.argv[5])
+    except ValueError:
+        print("Error: Quantity, take profit and stop loss must be valid numbers.")
+        sys.exit(1)
+
     try:
         result = place_oco_conditional_orders(symbol, side, quantity, tp_price, sl_price)
         print("✅ OCO-like conditional orders placed successfully.")
         print(result)
     except Exception as e:
-        print(f"❌ Error: {e}")
\ No newline at end of file
+        print(f"❌ Error: {e}")
+        sys.exit(1)
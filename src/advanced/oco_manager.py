@@ -0,0 +1,248 @@
+# src/advanced/oco_manager.py
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the parent directory ('src') to the system path to find utils.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import get_client
+from exchange_info import CACHE_DIR
+from account_state import get_account_state
+from journal import get_journal, journal_order
+
+logger = logging.getLogger(__name__)
+
+# Pairs used to be persisted here; it is imported into the journal once, then removed
+LEGACY_PAIRS_FILE = os.path.join(CACHE_DIR, "oco_pairs.json")
+# A leg reaching one of these statuses cancels its sibling
+TRIGGER_STATUSES = {'PARTIALLY_FILLED', 'FILLED', 'CANCELED', 'EXPIRED'}
+# Number of trigger-to-cancel measurements kept
+LATENCY_SAMPLES = 1000
+
+
+class OcoManager:
+    """
+    Turns a TP/SL leg pair into a true OCO.
+
+    Listens to order updates from the user data stream; when one leg fills
+    (or is cancelled/expires), the sibling is cancelled from a dedicated
+    worker so the stream thread is never blocked on the REST call. Pairs are
+    journaled as strategy events and reconciled against open orders after a
+    restart.
+    """
+
+    def __init__(self, client, state, journal=None):
+        self.client = client
+        self.state = state
+        self.journal = journal or get_journal()
+        self._lock = threading.Lock()
+        self._pairs = {}
+        self._sibling = {}
+        self._own_cancels = set()
+        # clientOrderId -> pair sent but not yet acknowledged (see expect())
+        self._expected = {}
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="oco-cancel")
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        state.add_listener(self.on_order_update)
+
+    def expect(self, symbol, tp_client_id, sl_client_id):
+        """
+        Register a pair by client order id before it is sent: a leg can fill
+        on the stream before the batch response returns, and its sibling is
+        then cancelled by client order id.
+        """
+        pending = {'symbol': symbol, 'tp': tp_client_id, 'sl': sl_client_id, 'triggered': None}
+        with self._lock:
+            self._expected[tp_client_id] = self._expected[sl_client_id] = pending
+
+    def abandon(self, tp_client_id, sl_client_id):
+        """Forget an expected pair whose placement failed."""
+        with self._lock:
+            self._expected.pop(tp_client_id, None)
+            self._expected.pop(sl_client_id, None)
+
+    def track(self, symbol, tp_order, sl_order):
+        """Start managing a TP/SL pair returned by place_oco_conditional_orders."""
+        tp_id, sl_id = tp_order['orderId'], sl_order['orderId']
+        with self._lock:
+            pending = self._expected.pop(tp_order.get('clientOrderId'), None)
+            self._expected.pop(sl_order.get('clientOrderId'), None)
+            triggered = pending['triggered'] if pending else None
+            if triggered is None:
+                pair = self._add_pair(symbol, tp_id, sl_id)
+        if triggered is not None:
+            # A leg fired before the response: the sibling is already being cancelled
+            pair = {'symbol': symbol, 'tp': tp_id, 'sl': sl_id, 'created': time.time()}
+            self.journal.record_strategy('oco', min(tp_id, sl_id), 'triggered', dict(pair, **triggered))
+            return
+        self.journal.record_strategy('oco', min(tp_id, sl_id), 'active', pair)
+        logger.info(f"OCO_TRACK: Symbol={symbol}, TP={tp_id}, SL={sl_id}")
+
+    def pairs(self):
+        with self._lock:
+            return [dict(p) for p in self._pairs.values()]
+
+    def release(self, order_ids):
+        """Stop managing every pair with a leg in order_ids (their legs are being cancelled by the caller)."""
+        with self._lock:
+            pairs = {min(i, self._sibling[i]): self._pairs[min(i, self._sibling[i])] for i in order_ids if i in self._sibling}
+            for pair in pairs.values():
+                self._drop_pair(pair)
+        for key, pair in pairs.items():
+            self.journal.record_strategy('oco', key, 'released', pair)
+        return list(pairs.values())
+
+    def reconcile(self):
+        """
+        Re-apply OCO semantics to persisted pairs after a restart: a pair with
+        only one leg still open has its remaining leg cancelled.
+        """
+        with self._lock:
+            self._load()
+            pairs = list(self._pairs.values())
+
+        open_ids = {o['orderId'] for o in self.state.open_orders()}
+        for pair in pairs:
+            tp_open, sl_open = pair['tp'] in open_ids, pair['sl'] in open_ids
+            if tp_open and sl_open:
+                continue
+            with self._lock:
+                self._drop_pair(pair)
+            self.journal.record_strategy('oco', min(pair['tp'], pair['sl']), 'reconciled', pair)
+            for leg_id, still_open in ((pair['tp'], tp_open), (pair['sl'], sl_open)):
+                if still_open:
+                    self._cancel(pair['symbol'], leg_id, trigger_time=None, received=time.perf_counter())
+            logger.info(f"OCO_RECONCILED: Symbol={pair['symbol']}, TP={pair['tp']}, SL={pair['sl']}")
+
+    def latency_stats(self):
+        """p50/p99/max of local reaction and trigger-to-cancel latency, in ms."""
+        samples = list(self.latencies)
+        stats = {'count': len(samples)}
+        for key in ('reaction_ms', 'exposure_ms'):
+            values = sorted(s[key] for s in samples if s.get(key) is not None)
+            if values:
+                stats[key] = {
+                    'p50': values[len(values) // 2],
+                    'p99': values[min(len(values) - 1, int(len(values) * 0.99))],
+                    'max': values[-1],
+                }
+        return stats
+
+    # --- Stream callback ---
+
+    def on_order_update(self, order):
+        received = time.perf_counter()
+        order_id = order['orderId']
+        if order['status'] not in TRIGGER_STATUSES:
+            return
+
+        with self._lock:
+            if order_id in self._own_cancels:
+                self._own_cancels.discard(order_id)
+                return
+            sibling_id = self._sibling.get(order_id)
+            if sibling_id is not None:
+                pair = self._pairs[min(order_id, sibling_id)]
+                self._drop_pair(pair)
+                self._own_cancels.add(sibling_id)
+            else:
+                # Not acknowledged yet: only its client order id is known
+                pending = self._expected.get(order.get('clientOrderId'))
+                if pending is None or pending['triggered'] is not None:
+                    return
+                pending['triggered'] = {'leg': order_id, 'status': order['status']}
+                sibling_cid = pending['sl'] if order['clientOrderId'] == pending['tp'] else pending['tp']
+
+        if sibling_id is None:
+            self._pool.submit(self._cancel, order['symbol'], None, order.get('updateTime'), received, sibling_cid)
+            logger.info(f"OCO_TRIGGERED: Symbol={order['symbol']}, Leg={order_id} {order['status']} before ack, Cancelling={sibling_cid}")
+            return
+        self._pool.submit(self._cancel, order['symbol'], sibling_id, order.get('updateTime'), received)
+        # Bookkeeping after the cancel is on its way
+        self.journal.record_strategy('oco', min(order_id, sibling_id), 'triggered', dict(pair, leg=order_id, status=order['status']))
+        logger.info(f"OCO_TRIGGERED: Symbol={order['symbol']}, Leg={order_id} {order['status']}, Cancelling={sibling_id}")
+
+    # --- Internals ---
+
+    def _cancel(self, symbol, order_id, trigger_time, received, client_order_id=None):
+        ref = {'orderId': order_id} if order_id is not None else {'origClientOrderId': client_order_id}
+        try:
+            cancelled = self.client.futures_cancel_order(symbol=symbol, **ref)
+        except Exception as e:
+            # -2011: already filled/cancelled on the exchange side
+            logger.error(f"OCO_CANCEL_ERROR: Symbol={symbol}, ID={order_id or client_order_id}: {e}")
+            with self._lock:
+                # No CANCELED event will come to clear it
+                self._own_cancels.discard(order_id)
+            return
+        order_id = cancelled['orderId']
+
+        sample = {'symbol': symbol, 'order_id': order_id, 'reaction_ms': (time.perf_counter() - received) * 1000}
+        if trigger_time:
+            # Exchange transaction time of the trigger -> local cancel ack
+            sample['exposure_ms'] = time.time() * 1000 - trigger_time
+        self.latencies.append(sample)
+        journal_order(cancelled, 'cancelled', strategy='oco')
+        logger.info(f"OCO_SIBLING_CANCELLED: Symbol={symbol}, ID={order_id}, Reaction={sample['reaction_ms']:.1f}ms")
+
+    def _add_pair(self, symbol, tp_id, sl_id):
+        # Caller holds self._lock
+        pair = {'symbol': symbol, 'tp': tp_id, 'sl': sl_id, 'created': time.time()}
+        self._pairs[min(tp_id, sl_id)] = pair
+        self._sibling[tp_id] = sl_id
+        self._sibling[sl_id] = tp_id
+        return pair
+
+    def _drop_pair(self, pair):
+        # Caller holds self._lock
+        self._pairs.pop(min(pair['tp'], pair['sl']), None)
+        self._sibling.pop(pair['tp'], None)
+        self._sibling.pop(pair['sl'], None)
+
+    def _load(self):
+        # Caller holds self._lock
+        self._import_legacy_file()
+        for entry in self.journal.strategy_states('oco'):
+            pair = entry['data']
+            self._add_pair(pair['symbol'], pair['tp'], pair['sl'])
+
+    def _import_legacy_file(self):
+        try:
+            with open(LEGACY_PAIRS_FILE, "r") as fh:
+                pairs = json.load(fh)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable OCO pairs file {LEGACY_PAIRS_FILE}: {e}")
+            return
+        for pair in pairs:
+            self.journal.record_strategy('oco', min(pair['tp'], pair['sl']), 'active', pair)
+        self.journal.flush()
+        os.remove(LEGACY_PAIRS_FILE)
+        logger.info(f"OCO_PAIRS_IMPORTED: {len(pairs)} pairs moved into the journal")
+
+
+_MANAGER = None
+_MANAGER_LOCK = threading.Lock()
+
+
+def get_oco_manager(client=None):
+    """Return the process-wide OcoManager, reconciling persisted pairs on first use."""
+    global _MANAGER
+    with _MANAGER_LOCK:
+        if _MANAGER is None:
+            client = client or get_client()
+            _MANAGER = OcoManager(client, get_account_state(client))
+            _MANAGER.reconcile()
+        return _MANAGER
+
+
+def peek_oco_manager():
+    """The process-wide OcoManager if one is running (never starts it)."""
+    return _MANAGER
@@ -0,0 +1,394 @@
+# src/advanced/runner.py
+import os
+import sys
+import json
+import time
+import queue
+import logging
+import itertools
+import threading
+import multiprocessing
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.dirname(current_dir)
+PROJECT_ROOT = os.path.dirname(SRC_DIR)
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# JSON list of {"name", "api_key" | "api_key_env", "api_secret" | "api_secret_env"}; .env credentials when missing
+RUNNER_ACCOUNTS_FILE = os.getenv("RUNNER_ACCOUNTS_FILE", os.path.join(PROJECT_ROOT, "accounts.json"))
+RUNNER_WORKERS_PER_ACCOUNT = int(os.getenv("RUNNER_WORKERS_PER_ACCOUNT", "1"))
+# Each worker journals to its own database here, so a restarted worker rebuilds exactly its own jobs
+RUNNER_JOURNAL_DIR = os.getenv("RUNNER_JOURNAL_DIR", os.path.join(PROJECT_ROOT, "data", "runner"))
+# Workers report at least this often; one silent for WORKER_TIMEOUT is restarted
+HEARTBEAT_INTERVAL = 1.0
+WORKER_TIMEOUT = float(os.getenv("RUNNER_WORKER_TIMEOUT", "30"))
+
+JOB_KINDS = ('twap', 'oco', 'market', 'limit')
+FINAL_STATES = ('completed', 'failed', 'cancelled')
+
+
+def load_accounts(path=RUNNER_ACCOUNTS_FILE):
+    """Accounts from the runner's accounts file, or the .env account alone."""
+    try:
+        with open(path, "r") as fh:
+            entries = json.load(fh)
+    except FileNotFoundError:
+        entries = [{'name': 'default', 'api_key_env': 'API_KEY', 'api_secret_env': 'API_SECRET'}]
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    accounts = []
+    for entry in entries:
+        api_key = entry.get('api_key') or os.getenv(entry.get('api_key_env', ''), '')
+        api_secret = entry.get('api_secret') or os.getenv(entry.get('api_secret_env', ''), '')
+        if not api_key or not api_secret:
+            raise EnvironmentError(f"Credentials for account '{entry.get('name')}' are not configured.")
+        accounts.append({'name': entry['name'], 'api_key': api_key, 'api_secret': api_secret})
+    return accounts
+
+
+# --- Worker process ---
+
+def _run_job(job, client, scheduler, resend=False):
+    """
+    Start one job in the worker; returns (state, local TWAP id or None, result).
+
+    Its orders carry client order ids derived from the job's ref, so a job
+    sent again after a worker restart (resend=True) is looked up on the
+    exchange, or in the journal for a TWAP, instead of being placed twice.
+    """
+    from oco import place_oco_conditional_orders
+    from oco_manager import get_oco_manager
+    from market_orders import place_market_order
+    from limit_orders import place_limit_order
+    from order_submit import find_order, new_client_order_id
+    from journal import get_journal, journal_order
+
+    p = job['params']
+    ref = job['ref']
+    if job['kind'] == 'twap':
+        if resend:
+            for entry in get_journal().strategy_states('twap', active_only=False):
+                if entry['data'].get('ref') == ref:
+                    # Started before the restart: restored from the journal, or already over
+                    local_id = None if entry['state'] in FINAL_STATES else int(entry['strategy_id'])
+                    return entry['state'], local_id, None
+        local_id = scheduler.submit(p['symbol'], p['side'], p['total_quantity'], p['duration_seconds'],
+                                    p.get('num_chunks', 10), client=client, max_slippage_bps=p.get('max_slippage_bps'),
+                                    ref=ref, resumed=resend)
+        return 'running', local_id, None
+    if job['kind'] == 'oco':
+        leg_ids = (new_client_order_id('job', ref, 'tp'), new_client_order_id('job', ref, 'sl'))
+        if resend:
+            placed = [leg for leg in (find_order(client, p['symbol'], cid) for cid in leg_ids) if leg is not None]
+            if len(placed) == 2:
+                get_oco_manager(client).track(p['symbol'], *placed)
+                return 'completed', None, [leg['orderId'] for leg in placed]
+            if placed:
+                # Half a bracket: the worker died before the batch's own cleanup
+                # ran, so finish it the way that would have (cancel, then fail)
+                leg = placed[0]
+                if leg['status'] in ('NEW', 'PARTIALLY_FILLED'):
+                    leg = client.futures_cancel_order(symbol=p['symbol'], orderId=leg['orderId'])
+                    journal_order(leg, 'cancelled', strategy='oco')
+                raise RuntimeError(f"Only leg {leg['clientOrderId']} of the OCO pair was placed "
+                                   f"(order {leg['orderId']} is {leg['status']}).")
+        legs = place_oco_conditional_orders(p['symbol'], p['side'], p['quantity'], p['take_profit'], p['stop_loss'],
+                                            client=client, manager=get_oco_manager(client), client_order_ids=leg_ids)
+        return 'completed', None, [leg['orderId'] for leg in legs]
+    if job['kind'] == 'market':
+        order = place_market_order(p['symbol'], p['side'], p['quantity'], client=client,
+                                   client_order_id=new_client_order_id('job', ref), lookup_first=resend)
+        return 'completed', None, order['orderId']
+    if job['kind'] == 'limit':
+        order = place_limit_order(p['symbol'], p['side'], p['quantity'], p['price'], client=client,
+                                  client_order_id=new_client_order_id('job', ref), lookup_first=resend)
+        return 'completed', None, order['orderId']
+    raise ValueError(f"Unknown job kind '{job['kind']}'.")
+
+
+def worker_main(index, account, budget, journal_path, jobs, events, resume_restored):
+    """
+    Entry point of one worker process: owns one account's client, a slice
+    of the rate-limit budget and a TWAP scheduler, runs the jobs it is sent
+    and reports their state to the coordinator.
+    """
+    # Everything in this process defaults to the worker's account and journal
+    os.environ['API_KEY'] = account['api_key']
+    os.environ['API_SECRET'] = account['api_secret']
+    os.environ['JOURNAL_DB'] = journal_path
+    sys.path.extend([SRC_DIR, current_dir])
+
+    from utils import get_client
+    from rate_limiter import get_request_scheduler
+    from twap import get_scheduler
+    from journal import get_journal
+
+    def report(kind, **fields):
+        events.put(dict(fields, type=kind, worker=index, ts=time.time()))
+
+    try:
+        client = get_client()
+        get_request_scheduler().set_budget_share(**budget)
+        scheduler = get_scheduler()
+        if get_journal().strategy_states('oco'):
+            # Pairs placed before a restart are watched again by this worker
+            from oco_manager import get_oco_manager
+            get_oco_manager(client)
+    except Exception as e:
+        report('fatal', error=str(e))
+        return
+
+    twap_jobs = {}  # local TWAP id -> coordinator job id (None for restored ones)
+    for progress in scheduler.progress():
+        if progress['state'] == 'paused':
+            twap_jobs[progress['id']] = None
+            if resume_restored:
+                scheduler.resume(progress['id'])
+            report('restored', local_id=progress['id'], progress=scheduler.progress(progress['id']))
+    report('ready')
+
+    while True:
+        try:
+            message = jobs.get(timeout=HEARTBEAT_INTERVAL)
+        except queue.Empty:
+            message = {'op': 'tick'}
+        if message is None:
+            break
+
+        if message['op'] == 'run':
+            job = message['job']
+            try:
+                state, local_id, result = _run_job(job, client, scheduler, resend=message.get('resend', False))
+            except Exception as e:
+                report('status', job_id=job['id'], state='failed', error=str(e))
+            else:
+                if local_id is not None:
+                    twap_jobs[local_id] = job['id']
+                report('status', job_id=job['id'], state=state, local_id=local_id, result=result)
+        elif message['op'] == 'cancel':
+            local_id = message['local_id']
+            if local_id in twap_jobs:
+                scheduler.cancel(local_id)
+        elif message['op'] == 'adopt':
+            twap_jobs[message['local_id']] = message['job_id']
+
+        for local_id, job_id in list(twap_jobs.items()):
+            progress = scheduler.progress(local_id)
+            report('status', job_id=job_id, local_id=local_id, state=progress['state'], progress=progress,
+                   error=progress['error'])
+            if progress['state'] in FINAL_STATES:
+                del twap_jobs[local_id]
+        report('heartbeat')
+
+
+# --- Coordinator ---
+
+class StrategyRunner:
+    """
+    Shards strategy jobs across worker processes, several per account.
+
+    Each worker owns its account's client and an equal slice of the IP
+    weight budget and of the account's order budget, so workers never
+    throttle each other through one shared scheduler. The coordinator only
+    assigns jobs and collects status over queues; a worker that dies or goes
+    silent is restarted, rebuilds its TWAP schedules from its own journal and
+    carries on with them.
+    """
+
+    def __init__(self, accounts=None, workers_per_account=RUNNER_WORKERS_PER_ACCOUNT, journal_dir=RUNNER_JOURNAL_DIR):
+        self.accounts = {a['name']: a for a in (accounts or load_accounts())}
+        self.workers_per_account = max(1, workers_per_account)
+        self.journal_dir = journal_dir
+        self._ctx = multiprocessing.get_context('spawn')
+        self._events = self._ctx.Queue()
+        self._workers = {}
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        # Job ids restart at 1 every run: the tag keeps their client order ids apart
+        self._tag = format(int(time.time()), 'x')
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._threads = []
+
+    # --- Lifecycle ---
+
+    def start(self):
+        os.makedirs(self.journal_dir, exist_ok=True)
+        index = 0
+        for name in self.accounts:
+            for _ in range(self.workers_per_account):
+                self._workers[index] = {'account': name, 'process': None, 'jobs': None, 'heartbeat': 0.0, 'restarts': 0}
+                self._spawn(index, resume_restored=False)
+                index += 1
+        for target in (self._collect, self._supervise):
+            thread = threading.Thread(target=target, name=f"runner-{target.__name__.strip('_')}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=10.0):
+        """Stop every worker; running TWAP schedules are journaled and come back paused next time."""
+        self._stopped.set()
+        for worker in self._workers.values():
+            worker['jobs'].put(None)
+        for worker in self._workers.values():
+            worker['process'].join(timeout)
+            if worker['process'].is_alive():
+                worker['process'].terminate()
+
+    def _spawn(self, index, resume_restored):
+        worker = self._workers[index]
+        account = self.accounts[worker['account']]
+        # Weight limits are per IP (shared by all workers), order limits per account
+        budget = {'weight': 1.0 / (len(self.accounts) * self.workers_per_account), 'orders': 1.0 / self.workers_per_account}
+        journal_path = os.path.join(self.journal_dir, f"{worker['account']}-{index}.sqlite3")
+        worker['jobs'] = self._ctx.Queue()
+        worker['heartbeat'] = time.monotonic()
+        worker['process'] = self._ctx.Process(
+            target=worker_main, name=f"runner-worker-{index}", daemon=True,
+            args=(index, account, budget, journal_path, worker['jobs'], self._events, resume_restored),
+        )
+        worker['process'].start()
+        logger.info(f"RUNNER_WORKER_STARTED: Index={index}, Account={worker['account']}, PID={worker['process'].pid}")
+
+    # --- Jobs ---
+
+    def submit(self, account, kind, **params):
+        """Queue a job ('twap', 'oco', 'market' or 'limit') on the least busy worker of account; returns its id."""
+        if account not in self.accounts:
+            raise ValueError(f"Unknown account '{account}'.")
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind '{kind}' (one of {', '.join(JOB_KINDS)}).")
+        with self._lock:
+            candidates = [i for i, w in self._workers.items() if w['account'] == account]
+            index = min(candidates, key=lambda i: sum(1 for j in self._jobs.values()
+                                                      if j['worker'] == i and j['state'] not in FINAL_STATES))
+            job_id = next(self._ids)
+            job = {'id': job_id, 'ref': f"{self._tag}-{job_id}", 'account': account, 'kind': kind, 'params': params,
+                   'worker': index, 'state': 'queued', 'local_id': None, 'progress': None, 'result': None, 'error': None}
+            self._jobs[job['id']] = job
+            self._workers[index]['jobs'].put({'op': 'run', 'job': {k: job[k] for k in ('id', 'ref', 'kind', 'params')}})
+        logger.info(f"RUNNER_JOB_QUEUED: ID={job['id']}, Account={account}, Kind={kind}, Worker={index}")
+        return job['id']
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs[job_id]
+            if job['kind'] == 'twap' and job['local_id'] is not None and job['state'] not in FINAL_STATES:
+                self._workers[job['worker']]['jobs'].put({'op': 'cancel', 'local_id': job['local_id']})
+
+    def status(self, job_id=None):
+        """State of one job, or of every job."""
+        with self._lock:
+            if job_id is not None:
+                return dict(self._jobs[job_id])
+            return [dict(job) for job in self._jobs.values()]
+
+    def workers(self):
+        with self._lock:
+            return [{'index': i, 'account': w['account'], 'pid': w['process'].pid, 'alive': w['process'].is_alive(),
+                     'restarts': w['restarts'], 'heartbeat_age': time.monotonic() - w['heartbeat']}
+                    for i, w in self._workers.items()]
+
+    def wait(self, timeout=None):
+        """Block until every job is final; returns whether they all are."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while deadline is None or time.monotonic() < deadline:
+            with self._lock:
+                if all(job['state'] in FINAL_STATES for job in self._jobs.values()):
+                    return True
+            time.sleep(0.2)
+        return False
+
+    # --- Internals ---
+
+    def _collect(self):
+        while not self._stopped.is_set():
+            try:
+                event = self._events.get(timeout=HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                continue
+            with self._lock:
+                worker = self._workers.get(event['worker'])
+                if worker is not None:
+                    worker['heartbeat'] = time.monotonic()
+                if event['type'] == 'status' and event.get('job_id') in self._jobs:
+                    job = self._jobs[event['job_id']]
+                    for key in ('state', 'local_id', 'progress', 'result', 'error'):
+                        if event.get(key) is not None:
+                            job[key] = event[key]
+                elif event['type'] == 'restored':
+                    self._adopt(event)
+                elif event['type'] == 'fatal':
+                    logger.error(f"RUNNER_WORKER_FATAL: Index={event['worker']}: {event['error']}")
+
+    def _adopt(self, event):
+        # Caller holds self._lock: reattach a TWAP the restarted worker rebuilt from its journal
+        for job in self._jobs.values():
+            if job['worker'] == event['worker'] and (job['local_id'] == event['local_id'] or job['ref'] == event['progress'].get('ref')):
+                job['state'] = event['progress']['state']
+                job['local_id'] = event['local_id']
+                job['progress'] = event['progress']
+                self._workers[event['worker']]['jobs'].put({'op': 'adopt', 'local_id': event['local_id'], 'job_id': job['id']})
+                return
+
+    def _supervise(self):
+        while not self._stopped.wait(HEARTBEAT_INTERVAL):
+            with self._lock:
+                failed = [i for i, w in self._workers.items()
+                          if not w['process'].is_alive() or time.monotonic() - w['heartbeat'] > WORKER_TIMEOUT]
+            for index in failed:
+                self._restart(index)
+
+    def _restart(self, index):
+        worker = self._workers[index]
+        if worker['process'].is_alive():
+            worker['process'].terminate()
+        worker['process'].join(5)
+        worker['restarts'] += 1
+        logger.warning(f"RUNNER_WORKER_RESTART: Index={index}, Account={worker['account']}, Exit={worker['process'].exitcode}")
+        with self._lock:
+            self._spawn(index, resume_restored=True)
+            # Jobs the dead worker never reported on are sent again, to be looked up before
+            # anything is placed (it may have placed them); running TWAPs come back from its journal
+            for job in self._jobs.values():
+                if job['worker'] == index and job['state'] == 'queued':
+                    worker['jobs'].put({'op': 'run', 'job': {k: job[k] for k in ('id', 'ref', 'kind', 'params')}, 'resend': True})
+                elif job['worker'] == index and job['kind'] != 'twap' and job['state'] not in FINAL_STATES:
+                    job['state'], job['error'] = 'failed', 'worker died'
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python src/advanced/runner.py <jobs.json>")
+        print('  jobs.json: [{"account": "default", "kind": "twap", "symbol": "BTCUSDT", "side": "BUY", '
+              '"total_quantity": 0.01, "duration_seconds": 60, "num_chunks": 5}, ...]')
+        sys.exit(1)
+
+    sys.path.append(SRC_DIR)
+    import utils  # noqa: F401  (logging setup for the coordinator)
+
+    try:
+        with open(sys.argv[1], "r") as fh:
+            specs = json.load(fh)
+        runner = StrategyRunner().start()
+        job_ids = [runner.submit(spec.pop('account', 'default'), spec.pop('kind'), **spec) for spec in specs]
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+    try:
+        while not runner.wait(timeout=2):
+            done = sum(1 for j in runner.status() if j['state'] in FINAL_STATES)
+            print(f"{done}/{len(job_ids)} jobs finished, workers: {[w['alive'] for w in runner.workers()]}")
+    except KeyboardInterrupt:
+        print("Stopping; running TWAP schedules resume paused on the next start.")
+    finally:
+        runner.stop()
+
+    for job in runner.status():
+        icon = "✅" if job['state'] == 'completed' else "❌"
+        print(f"{icon} Job {job['id']} ({job['account']}/{job['kind']}): {job['state']} {job['error'] or job['result'] or ''}")
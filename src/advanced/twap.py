@@ -1,53 +1,424 @@
 # src/advanced/twap.py
+import os
 import sys
 import time
+import socket
+import heapq
+import itertools
 import logging
+import threading
+from decimal import Decimal, ROUND_DOWN
+from concurrent.futures import ThreadPoolExecutor
 # We need to import the function from market_orders.py to reuse its logic
 sys.path.append('src') # Temporarily add src to path if market_orders is not visible
-from market_orders import place_market_order 
+
+if __name__ == "__main__":
+    # Hand the command to a running order daemon before paying for the imports below
+    from daemon_client import forward_cli
+    forward_cli('twap', sys.argv[1:])
+
+from market_orders import place_market_order
+from utils import get_client
+from exchange_info import get_symbol_rules
+from order_book import get_order_book
+from metrics import METRICS, span
+from journal import get_journal
+from order_submit import new_client_order_id
 
 logger = logging.getLogger(__name__)
 
-def execute_twap_strategy(symbol, side, total_quantity, duration_seconds, num_chunks=10):
+# Orders in flight at once across all TWAP schedules
+TWAP_MAX_WORKERS = 8
+# Seconds a scheduler's claim on a job outlives its last renewal; another
+# process sharing the journal may restore the job only after that
+TWAP_LEASE_SECONDS = 30
+
+
+def next_chunk_quantity(total_quantity, num_chunks, chunk_index, executed_qty, step_size, min_qty=0.0):
+    """
+    Quantity for chunk `chunk_index` (0-based), step-size aware.
+
+    Each chunk tops the executed quantity up to its share of the schedule
+    (total * (i + 1) / n) rounded down to the step, so rounding remainders are
+    carried forward instead of lost, and the last chunk sends whatever is left.
+    A chunk below min_qty is skipped (0.0) and its quantity carried forward too.
+    """
+    total = Decimal(str(total_quantity))
+    if chunk_index >= num_chunks - 1:
+        target = total
+    else:
+        target = total * (chunk_index + 1) / num_chunks
+    remaining = max(target - Decimal(str(executed_qty)), Decimal(0))
+    if step_size:
+        step = Decimal(str(step_size))
+        remaining = (remaining / step).to_integral_value(rounding=ROUND_DOWN) * step
+    qty = float(remaining)
+    return qty if qty >= min_qty and qty > 0 else 0.0
+
+
+class TwapJob:
+    """State of one TWAP schedule. Use the pause/resume/cancel handles on TwapScheduler."""
+
+    def __init__(self, job_id, symbol, side, total_quantity, duration_seconds, num_chunks, client, max_slippage_bps=None, ref=None):
+        self.id = job_id
+        # Caller's id for the schedule (a runner job); chunk client order ids derive from it when set
+        self.ref = ref
+        self.symbol = symbol
+        self.side = side
+        self.total_quantity = total_quantity
+        self.duration_seconds = duration_seconds
+        self.num_chunks = num_chunks
+        self.interval = duration_seconds / num_chunks
+        self.client = client
+        self.max_slippage_bps = max_slippage_bps
+        self.state = 'running'
+        self.error = None
+        self.chunk_index = 0
+        self.in_flight = False
+        self.executed_qty = 0.0
+        self.results = []
+        self.started_at = time.monotonic()
+        self.paused_at = None
+        self.paused_total = 0.0
+        # Bumped on pause: heap entries pushed before it carry stale deadlines
+        self.generation = 0
+        # Chunk that may have been sent before a restart: looked up before sending
+        self.resumed_chunk = None
+        self.done = threading.Event()
+        # Keeps chunk client order ids unique if job ids restart with a fresh journal
+        self.tag = format(int(time.time()), 'x')
+
+    def deadline(self, chunk_index):
+        # Absolute deadline: per-chunk latency never accumulates as drift
+        return self.started_at + self.paused_total + chunk_index * self.interval
+
+    def chunk_client_order_id(self, chunk_index):
+        # Stable across retries and restarts, so a chunk is never filled twice
+        if self.ref:
+            return new_client_order_id('twap', self.ref, chunk_index)
+        return new_client_order_id('twap', self.id, self.tag, chunk_index)
+
+    def progress(self):
+        return {
+            'id': self.id,
+            'ref': self.ref,
+            'symbol': self.symbol,
+            'side': self.side,
+            'state': self.state,
+            'chunks_done': self.chunk_index,
+            'num_chunks': self.num_chunks,
+            'executed_qty': self.executed_qty,
+            'total_quantity': self.total_quantity,
+            'error': self.error,
+            'order_ids': [r.get('orderId') for r in self.results if isinstance(r, dict)],
+        }
+
+    def journal_data(self):
+        """Everything needed to rebuild this job from the journal after a restart."""
+        return {
+            'symbol': self.symbol,
+            'side': self.side,
+            'total_quantity': self.total_quantity,
+            'duration_seconds': self.duration_seconds,
+            'num_chunks': self.num_chunks,
+            'max_slippage_bps': self.max_slippage_bps,
+            'chunk_index': self.chunk_index,
+            'executed_qty': self.executed_qty,
+            'order_ids': [r.get('orderId') for r in self.results if isinstance(r, dict)],
+            'error': self.error,
+            'tag': self.tag,
+            'ref': self.ref,
+        }
+
+
+def _owner_alive(owner):
+    # Owners are "host:pid:instance"; a holder on another host cannot be checked
+    host, pid = owner.split(':')[:2]
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class TwapScheduler:
+    """
+    Runs many TWAP schedules concurrently on one timer thread.
+
+    Due chunks are taken from a heap of absolute deadlines and handed to a
+    small worker pool, so a slow order on one schedule never delays another.
+    Every state change is journaled; schedules that were still running when
+    the process stopped come back paused, to be resumed or cancelled. Each
+    job is leased in the journal to the scheduler running it, so several
+    processes sharing one journal never trade the same schedule.
+    """
+
+    def __init__(self, max_workers=TWAP_MAX_WORKERS, journal=None, lease_seconds=TWAP_LEASE_SECONDS):
+        self._jobs = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self.journal = journal or get_journal()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        self.lease_seconds = lease_seconds
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="twap-chunk")
+        self._restore()
+        self._thread = threading.Thread(target=self._run, name="twap-scheduler", daemon=True)
+        self._thread.start()
+        threading.Thread(target=self._renew_leases, name="twap-lease", daemon=True).start()
+
+    # --- Handles ---
+
+    def submit(self, symbol, side, total_quantity, duration_seconds, num_chunks=10, client=None, max_slippage_bps=None,
+               ref=None, resumed=False):
+        """
+        Start a TWAP schedule and return its job id. With max_slippage_bps, each
+        chunk is capped at the local book's depth within that many bps of the
+        touch and the rest is carried forward. ref names the schedule for the
+        caller; with resumed=True (the same ref may have been started by a
+        process that died) its first chunk is looked up before it is sent.
+        """
+        if client is None:
+            client = get_client()
+        job_id = self.journal.next_leased_id('twap', self.owner, self.lease_seconds)
+        with self._cond:
+            job = TwapJob(job_id, symbol, side, total_quantity, duration_seconds, num_chunks, client, max_slippage_bps, ref)
+            if resumed:
+                job.resumed_chunk = 0
+            self._jobs[job.id] = job
+            self._push(job)
+            self._journal(job)
+        logger.info(f"TWAP_START: ID={job.id}, Symbol={symbol}, Total Qty={total_quantity}, Duration={duration_seconds}s, Chunks={num_chunks}")
+        return job.id
+
+    def pause(self, job_id):
+        with self._cond:
+            job = self._jobs[job_id]
+            if job.state == 'running':
+                job.state = 'paused'
+                job.paused_at = time.monotonic()
+                job.generation += 1
+                self._journal(job)
+
+    def resume(self, job_id):
+        if self._jobs[job_id].client is None:
+            # Restored from the journal: bind a client only when it trades again
+            self._jobs[job_id].client = get_client()
+        with self._cond:
+            job = self._jobs[job_id]
+            if job.state == 'paused':
+                job.paused_total += time.monotonic() - job.paused_at
+                job.paused_at = None
+                job.state = 'running'
+                if not job.in_flight:
+                    self._push(job)
+                self._journal(job)
+
+    def cancel(self, job_id):
+        with self._cond:
+            job = self._jobs[job_id]
+            if job.state in ('running', 'paused'):
+                self._finish(job, 'cancelled')
+
+    def progress(self, job_id=None):
+        """Progress dict for one job, or a list for every job."""
+        with self._cond:
+            if job_id is not None:
+                return self._jobs[job_id].progress()
+            return [job.progress() for job in self._jobs.values()]
+
+    def wait(self, job_id, timeout=None):
+        return self._jobs[job_id].done.wait(timeout)
+
+    # --- Internals ---
+
+    def _journal(self, job):
+        self.journal.record_strategy('twap', job.id, job.state, job.journal_data())
+
+    def _restore(self):
+        # Rebuild unfinished schedules from the journal, paused, without any REST call
+        now = time.monotonic()
+        for entry in self.journal.strategy_states('twap'):
+            data = entry['data']
+            job_id = int(entry['strategy_id'])
+            if not self.journal.acquire_lease('twap', job_id, self.owner, self.lease_seconds):
+                holder = self.journal.lease_owner('twap', job_id)
+                # A holder that died on this host need not be waited out
+                if _owner_alive(holder) or not self.journal.acquire_lease('twap', job_id, self.owner, self.lease_seconds, takeover_from=holder):
+                    logger.info(f"TWAP_RESTORE_SKIPPED: ID={job_id} is run by another process")
+                    continue
+            job = TwapJob(job_id, data['symbol'], data['side'], data['total_quantity'], data['duration_seconds'],
+                          data['num_chunks'], None, data.get('max_slippage_bps'), data.get('ref'))
+            job.chunk_index = data['chunk_index']
+            job.executed_qty = data['executed_qty']
+            job.results = [{'orderId': order_id} for order_id in data.get('order_ids', [])]
+            job.tag = data.get('tag', job.tag)
+            job.resumed_chunk = job.chunk_index
+            # The next chunk becomes due one interval after resume()
+            job.started_at = now - (job.chunk_index - 1) * job.interval
+            job.state = 'paused'
+            job.paused_at = now
+            self._jobs[job_id] = job
+            self._journal(job)
+            logger.info(f"TWAP_RESTORED: ID={job_id}, Chunk={job.chunk_index}/{job.num_chunks}, Executed={job.executed_qty}/{job.total_quantity}")
+
+    def _renew_leases(self):
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            with self._cond:
+                ids = [job.id for job in self._jobs.values() if job.state in ('running', 'paused')]
+            if not ids:
+                continue
+            try:
+                held = set(self.journal.renew_leases('twap', ids, self.owner, self.lease_seconds))
+            except Exception as e:
+                logger.warning(f"TWAP_LEASE_RENEW_FAILED: {e}")
+                continue
+            with self._cond:
+                for job_id in set(ids) - held:
+                    # Taken over after our lease lapsed: stop without journaling over the new owner
+                    job = self._jobs[job_id]
+                    job.state = 'lost'
+                    job.generation += 1
+                    job.done.set()
+                    logger.error(f"TWAP_LEASE_LOST: ID={job_id}, another process now runs it")
+
+    def _push(self, job):
+        # Caller holds self._cond
+        heapq.heappush(self._heap, (job.deadline(job.chunk_index), next(self._seq), job.id, job.chunk_index, job.generation))
+        self._cond.notify()
+
+    def _finish(self, job, state, error=None):
+        # Caller holds self._cond
+        job.state = state
+        job.error = error
+        job.done.set()
+        self._journal(job)
+        logger.info(f"TWAP_{state.upper()}: ID={job.id}, Executed={job.executed_qty}/{job.total_quantity}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._cond.wait(timeout)
+                _, _, job_id, chunk_index, generation = heapq.heappop(self._heap)
+                job = self._jobs[job_id]
+                # Entries for paused/cancelled jobs, superseded chunks or pre-pause deadlines are dropped
+                if job.state != 'running' or job.in_flight or chunk_index != job.chunk_index or generation != job.generation:
+                    continue
+                job.in_flight = True
+            self._pool.submit(self._run_chunk, job, chunk_index)
+
+    def _run_chunk(self, job, chunk_index):
+        try:
+            rules = get_symbol_rules(job.client, job.symbol)
+            qty = next_chunk_quantity(
+                job.total_quantity, job.num_chunks, chunk_index, job.executed_qty,
+                rules.get('stepSize'), rules.get('minQty', 0.0),
+            )
+            if qty > 0 and job.max_slippage_bps is not None and chunk_index < job.num_chunks - 1:
+                qty = self._cap_to_depth(job, qty, rules)
+            if qty > 0:
+                # Lateness of the chunk against its schedule slot, then the order itself
+                METRICS.histogram('bot_twap_chunk_lag_seconds').record((time.monotonic() - job.deadline(chunk_index)) * 1e6)
+                with span('chunk', order_type='twap'):
+                    order = place_market_order(job.symbol, job.side, qty, client=job.client, strategy='twap', strategy_id=job.id,
+                                               client_order_id=job.chunk_client_order_id(chunk_index),
+                                               lookup_first=chunk_index == job.resumed_chunk)
+                job.results.append(order)
+                job.executed_qty = float(Decimal(str(job.executed_qty)) + Decimal(str(qty)))
+                logger.info("TWAP_CHUNK_SUCCESS: ID=%s, Chunk=%d/%d, Qty=%s", job.id, chunk_index + 1, job.num_chunks, qty, extra={'order': order})
+            else:
+                logger.info(f"TWAP_CHUNK_CARRIED: ID={job.id}, Chunk={chunk_index + 1}/{job.num_chunks} below minQty")
+        except Exception as e:
+            logger.error(f"TWAP_CHUNK_ERROR: ID={job.id}, Chunk {chunk_index + 1} failed: {e}")
+            METRICS.inc('bot_order_errors_total', order_type='twap')
+            with self._cond:
+                job.in_flight = False
+                # Stop the TWAP if one chunk fails
+                if job.state in ('running', 'paused'):
+                    self._finish(job, 'failed', str(e))
+            return
+
+        with self._cond:
+            job.in_flight = False
+            job.chunk_index = chunk_index + 1
+            if job.state == 'lost':
+                return
+            if job.chunk_index >= job.num_chunks:
+                if job.state in ('running', 'paused'):
+                    self._finish(job, 'completed')
+            else:
+                if job.state == 'running':
+                    self._push(job)
+                self._journal(job)
+
+    @staticmethod
+    def _cap_to_depth(job, qty, rules):
+        book = get_order_book(job.symbol, job.client)
+        if book is None:
+            return qty
+        available = book.depth(job.side, max_price_move_bps=job.max_slippage_bps)
+        if available >= qty:
+            return qty
+        capped = next_chunk_quantity(available, 1, 0, 0.0, rules.get('stepSize'), rules.get('minQty', 0.0))
+        logger.info(f"TWAP_CHUNK_CAPPED: ID={job.id}, Qty={qty} -> {capped} (depth within {job.max_slippage_bps}bps)")
+        return capped
+
+
+_SCHEDULER = None
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def get_scheduler():
+    """Return the process-wide TwapScheduler."""
+    global _SCHEDULER
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None:
+            _SCHEDULER = TwapScheduler()
+        return _SCHEDULER
+
+
+def execute_twap_strategy(symbol, side, total_quantity, duration_seconds, num_chunks=10, client=None):
     """
     Splits a large order into smaller market orders executed over time.
+    Blocks until the schedule finishes; use get_scheduler().submit() to run it in the background.
     """
     if duration_seconds < num_chunks * 2: # Ensure reasonable interval (min 2 seconds)
         print("Duration is too short for the number of chunks.")
         logger.error("TWAP_ERROR: Duration constraint failed.")
         return
 
-    chunk_quantity = total_quantity / num_chunks
+    scheduler = get_scheduler()
     interval_seconds = duration_seconds / num_chunks
-    
+
     print(f"Starting TWAP: {total_quantity} over {duration_seconds}s in {num_chunks} chunks ({interval_seconds:.1f}s interval).")
-    logger.info(f"TWAP_START: Symbol={symbol}, Total Qty={total_quantity}, Duration={duration_seconds}s")
-    
-    for i in range(num_chunks):
-        chunk_num = i + 1
-        print(f"Chunk {chunk_num}/{num_chunks}: Placing {chunk_quantity:.6f} {side} order...")
-        
-        # Reuse the existing market order function
-        # Note: You MUST ensure chunk_quantity passes the minQty/stepSize validation!
-        try:
-            place_market_order(symbol, side, chunk_quantity) 
-        except Exception as e:
-            logger.error(f"TWAP_CHUNK_ERROR: Chunk {chunk_num} failed: {e}")
-            print(f"❌ TWAP execution interrupted due to error in chunk {chunk_num}: {e}")
-            break # Stop the TWAP if one chunk fails
-        
-        if chunk_num < num_chunks:
-            print(f"Waiting {interval_seconds:.1f} seconds...")
-            time.sleep(interval_seconds)
-            
-    print("✅ TWAP strategy complete.")
-    logger.info("TWAP_COMPLETE: All chunks attempted.")
+    job_id = scheduler.submit(symbol, side, total_quantity, duration_seconds, num_chunks, client=client)
+
+    reported = 0
+    while not scheduler.wait(job_id, timeout=0.5):
+        progress = scheduler.progress(job_id)
+        if progress['chunks_done'] > reported:
+            reported = progress['chunks_done']
+            print(f"Chunk {reported}/{num_chunks} done: {progress['executed_qty']:.6f} {side} executed so far.")
+
+    progress = scheduler.progress(job_id)
+    if progress['state'] == 'failed':
+        print(f"❌ TWAP execution interrupted due to error in chunk {progress['chunks_done'] + 1}: {progress['error']}")
+    else:
+        print("✅ TWAP strategy complete.")
+    return progress
 
 if __name__ == "__main__":
     if len(sys.argv) != 5:
         print("Usage: python src/advanced/twap.py <symbol> <BUY/SELL> <total_quantity> <duration_seconds>")
         sys.exit(1)
-    
+
     symbol = sys.argv[1].upper()
     side = sys.argv[2].upper()
     try:
@@ -58,4 +429,4 @@ if __name__ == "__main__":
         sys.exit(1)
 
     # Use a fixed number of chunks (e.g., 5) for a short test, or 10 for standard
-    execute_twap_strategy(symbol, side, total_quantity, duration, num_chunks=5)
\ No newline at end of file
+    execute_twap_strategy(symbol, side, total_quantity, duration, num_chunks=5)
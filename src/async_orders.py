@@ -0,0 +1,351 @@
+# src/async_orders.py
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import aiohttp
+from binance import AsyncClient
+from binance.client import BinanceAPIException, BinanceRequestException
+from utils import TESTNET_FUTURES_URL, HTTP_POOL_SIZE, check_order
+from exchange_info import EXCHANGE_INFO
+from filters import compile_filters
+from batch_orders import OrderRejected, _to_wire
+from rate_limiter import RequestShed, get_request_scheduler, critical_reads
+from time_sync import HmacSigner, get_time_sync
+from metrics import METRICS
+from journal import journal_order
+from order_submit import (ORDER_SUBMIT_ATTEMPTS, ORDER_RETRY_BACKOFF, ORDER_LOOKUP_ATTEMPTS, DUPLICATE_CLIENT_ID,
+                          ORDER_DOES_NOT_EXIST, UNKNOWN_STATUS_CODES, OrderStatusUnknown, new_client_order_id)
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of orders in flight at once per engine
+MAX_CONCURRENCY = int(os.getenv("ASYNC_MAX_CONCURRENCY", "10"))
+
+# Failures after which a request may or may not have reached the exchange
+TRANSPORT_ERRORS = (BinanceRequestException, aiohttp.ClientError, asyncio.TimeoutError)
+
+
+def _unknown_outcome(error):
+    if isinstance(error, BinanceAPIException):
+        return error.status_code >= 500 or error.code in UNKNOWN_STATUS_CODES
+    return isinstance(error, TRANSPORT_ERRORS)
+
+
+async def find_order(client, symbol, client_order_id, attempts=ORDER_LOOKUP_ATTEMPTS):
+    """order_submit.find_order on an AsyncClient."""
+    delay = ORDER_RETRY_BACKOFF
+    for attempt in range(1, attempts + 1):
+        try:
+            with critical_reads():
+                return await client.futures_get_order(symbol=symbol, origClientOrderId=client_order_id)
+        except BinanceAPIException as e:
+            if e.code == ORDER_DOES_NOT_EXIST:
+                return None
+            if not _unknown_outcome(e):
+                raise
+            error = e
+        except (*TRANSPORT_ERRORS, RequestShed) as e:
+            error = e
+        logger.warning(f"ORDER_LOOKUP_FAILED: ClientOrderId={client_order_id}, Attempt={attempt}/{attempts}: {error}")
+        if attempt < attempts:
+            METRICS.inc('bot_retries_total', component='order_lookup')
+            await asyncio.sleep(delay)
+            delay *= 2
+    raise OrderStatusUnknown(f"Status of order {client_order_id} unknown after {attempts} lookups: {error}") from error
+
+
+async def submit_order(client, params, attempts=ORDER_SUBMIT_ATTEMPTS):
+    """
+    order_submit.submit_order on an AsyncClient (without hedging): after an
+    unclear answer the order is looked up by its newClientOrderId and only
+    sent again if the exchange has none.
+    """
+    client_order_id = params['newClientOrderId']
+    delay = ORDER_RETRY_BACKOFF
+    for attempt in range(1, attempts + 1):
+        try:
+            return await client.futures_create_order(**params)
+        except BinanceAPIException as e:
+            if e.code == DUPLICATE_CLIENT_ID:
+                existing = await find_order(client, params['symbol'], client_order_id)
+                if existing is not None:
+                    logger.info(f"ORDER_DEDUPLICATED: ClientOrderId={client_order_id}, OrderId={existing.get('orderId')}")
+                    return existing
+            elif not _unknown_outcome(e):
+                raise
+            error = e
+        except TRANSPORT_ERRORS as e:
+            error = e
+
+        logger.warning(f"ORDER_OUTCOME_UNKNOWN: ClientOrderId={client_order_id}, Attempt={attempt}/{attempts}: {error}")
+        await asyncio.sleep(delay)
+        delay *= 2
+        existing = await find_order(client, params['symbol'], client_order_id)
+        if existing is not None:
+            logger.info(f"ORDER_FOUND_AFTER_ERROR: ClientOrderId={client_order_id}, OrderId={existing.get('orderId')}")
+            return existing
+        if attempt < attempts:
+            METRICS.inc('bot_retries_total', component='order')
+    raise error
+
+
+def _log_refresh_error(task):
+    # Stale rules keep serving; the next order past the stale mark tries again
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"ASYNC_RULES_REFRESH_ERROR: {task.exception()}")
+
+
+class AsyncOrderEngine:
+    """
+    Async counterparts of place_market_order, place_limit_order and
+    place_oco_conditional_orders built on python-binance's AsyncClient.
+
+    All clients share one aiohttp connector, so independent orders reuse the
+    same connection pool, and a semaphore bounds how many are in flight.
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, pool_size=HTTP_POOL_SIZE):
+        self.max_concurrency = max_concurrency
+        self.pool_size = pool_size
+        self._connector = None
+        self._semaphore = None
+        self._clients = {}
+        self._rules_loading = None
+        self._rules_refresh = None
+
+    async def get_client(self, api_key=None, api_secret=None):
+        """Return the AsyncClient for the given (or .env) credentials, building it on first use."""
+        api_key = api_key or os.getenv("API_KEY")
+        api_secret = api_secret or os.getenv("API_SECRET")
+        if not api_key or not api_secret:
+            raise EnvironmentError("API credentials not configured.")
+
+        client = self._clients.get(api_key)
+        if client is None:
+            if self._connector is None:
+                self._connector = aiohttp.TCPConnector(limit=self.pool_size * 4, limit_per_host=self.pool_size)
+
+            client = AsyncClient(api_key, api_secret)
+            client.FUTURES_URL = TESTNET_FUTURES_URL
+            # Swap the client's private session for one on the shared connector
+            headers = dict(client.session.headers)
+            await client.session.close()
+            client.session = aiohttp.ClientSession(connector=self._connector, connector_owner=False, headers=headers)
+            HmacSigner.install(client)
+            get_request_scheduler().attach_async(client)
+            sync = get_time_sync()
+            if sync.synced_at is None:
+                t0 = time.time()
+                server_ms = (await client.futures_time())['serverTime']
+                sync.record(t0, time.time(), server_ms)
+            sync.track(client)
+            self._clients[api_key] = client
+        return client
+
+    async def close(self):
+        for client in self._clients.values():
+            await client.session.close()
+        self._clients.clear()
+        if self._connector is not None:
+            await self._connector.close()
+            self._connector = None
+
+    def _slots(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _load_rules(self, client):
+        # One download at a time however many orders are waiting on it
+        if self._rules_loading is None or self._rules_loading.done():
+            with critical_reads():  # The task copies the context it is created in
+                self._rules_loading = asyncio.ensure_future(client.futures_exchange_info())
+        info = await asyncio.shield(self._rules_loading)
+        await asyncio.to_thread(EXCHANGE_INFO.load, info)
+
+    async def _validate(self, client, symbol, side, quantity, price=None, **filters):
+        # Rules come from the shared exchange-info cache; a miss is filled
+        # through this engine's own AsyncClient, never a sync client.
+        rules = EXCHANGE_INFO.peek(symbol)
+        if rules is None:
+            await self._load_rules(client)
+            rules = EXCHANGE_INFO.peek(symbol)
+            if rules is None:
+                raise ValueError(f"Symbol {symbol} not found in exchange info.")
+        elif EXCHANGE_INFO.is_stale() and (self._rules_refresh is None or self._rules_refresh.done()):
+            # Refreshed in the background; the task is kept so it is not collected mid-download
+            self._rules_refresh = asyncio.ensure_future(self._load_rules(client))
+            self._rules_refresh.add_done_callback(_log_refresh_error)
+        return check_order(compile_filters(rules), symbol, side, quantity, price, **filters)
+
+    async def _submit(self, client, params, strategy='async'):
+        # One id per logical order: a send that ends without an answer is looked up, not repeated blindly
+        params['newClientOrderId'] = new_client_order_id(strategy)
+        try:
+            async with self._slots():
+                return await submit_order(client, params)
+        except Exception as e:
+            logger.error("ASYNC_ORDER_ERROR: Symbol=%s, Type=%s: %s", params['symbol'], params['type'], e)
+            METRICS.inc('bot_order_errors_total', order_type=params['type'].lower())
+            # An unknown outcome may still have placed the order
+            event = 'unknown' if isinstance(e, OrderStatusUnknown) else 'rejected'
+            journal_order(params, event, strategy, error=str(e))
+            raise
+
+    async def market_order(self, symbol, side, quantity, client=None):
+        client = client or await self.get_client()
+        quantity, _ = await self._validate(client, symbol, side, quantity, order_type='MARKET')
+        order = await self._submit(client, dict(symbol=symbol, side=side.upper(), type="MARKET", quantity=quantity))
+        logger.info("ASYNC_MARKET_ORDER_SUCCESS: Symbol=%s, Side=%s", symbol, side, extra={'order': order})
+        journal_order(order, strategy='async')
+        return order
+
+    async def limit_order(self, symbol, side, quantity, price, client=None):
+        client = client or await self.get_client()
+        quantity, price = await self._validate(client, symbol, side, quantity, price, order_type='LIMIT')
+        order = await self._submit(client, dict(symbol=symbol, side=side, type="LIMIT", timeInForce="GTC",
+                                                quantity=quantity, price=price))
+        logger.info("ASYNC_LIMIT_ORDER_SUCCESS: Symbol=%s, Side=%s", symbol, side, extra={'order': order})
+        journal_order(order, strategy='async')
+        return order
+
+    async def oco_orders(self, symbol, side, quantity, take_profit_trigger, stop_loss_trigger, client=None):
+        client = client or await self.get_client()
+        quantity, _ = await self._validate(client, symbol, side, quantity, order_type='TAKE_PROFIT_MARKET', stop_price=take_profit_trigger, reduce_only=True)
+        await self._validate(client, symbol, side, quantity, order_type='STOP_MARKET', stop_price=stop_loss_trigger, reduce_only=True)
+
+        legs = [
+            dict(symbol=symbol, side=side, type='TAKE_PROFIT_MARKET', quantity=quantity, stopPrice=take_profit_trigger, reduceOnly=True,
+                 newClientOrderId=new_client_order_id('oco')),
+            dict(symbol=symbol, side=side, type='STOP_MARKET', quantity=quantity, stopPrice=stop_loss_trigger, reduceOnly=True,
+                 newClientOrderId=new_client_order_id('oco')),
+        ]
+        try:
+            async with self._slots():
+                responses = await client.futures_place_batch_order(batchOrders=[_to_wire(leg) for leg in legs])
+        except Exception as e:
+            if not _unknown_outcome(e):
+                raise
+            # The batch may have landed: read each leg back instead of sending it again
+            logger.warning(f"ORDER_OUTCOME_UNKNOWN: OCO {symbol}: {e}")
+            try:
+                found = [await find_order(client, symbol, leg['newClientOrderId']) for leg in legs]
+            except OrderStatusUnknown as unknown:
+                for leg in legs:
+                    journal_order(leg, 'unknown', 'oco', error=str(unknown))
+                raise
+            responses = [order or {'code': getattr(e, 'code', None), 'msg': str(e)} for order in found]
+
+        rejected = [r for r in responses if 'orderId' not in r]
+        if rejected:
+            # Don't leave half a bracket resting on the book
+            for r in responses:
+                if 'orderId' in r:
+                    journal_order(r, strategy='oco')
+                    journal_order(await client.futures_cancel_order(symbol=symbol, orderId=r['orderId']), 'cancelled', strategy='oco')
+            logger.error(f"ASYNC_OCO_ERROR: {rejected[0]}")
+            raise OrderRejected(rejected[0].get('code'), rejected[0].get('msg'))
+
+        for r in responses:
+            journal_order(r, strategy='oco')
+        logger.info("ASYNC_OCO_SUCCESS: Symbol=%s, IDs=%s", symbol, [r['orderId'] for r in responses])
+        return responses
+
+    async def place_many(self, requests):
+        """
+        Place independent orders concurrently. Each request is a dict produced by
+        parse_order_spec(). Returns one order (or exception) per request, in order.
+        """
+        handlers = {
+            'market': lambda r: self.market_order(r['symbol'], r['side'], r['quantity']),
+            'limit': lambda r: self.limit_order(r['symbol'], r['side'], r['quantity'], r['price']),
+            'oco': lambda r: self.oco_orders(r['symbol'], r['side'], r['quantity'], r['take_profit'], r['stop_loss']),
+        }
+        await self.get_client()
+        return await asyncio.gather(*(handlers[r['kind']](r) for r in requests), return_exceptions=True)
+
+
+class SyncOrderEngine:
+    """
+    Blocking facade over AsyncOrderEngine for the CLI and Streamlit.
+
+    The engine lives on a private event loop in a daemon thread, so its
+    connection pool stays warm between calls from synchronous code.
+    """
+
+    def __init__(self, engine=None):
+        self.engine = engine or AsyncOrderEngine()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="async-orders", daemon=True)
+        self._thread.start()
+
+    def run(self, coro, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    def place_many(self, requests, timeout=None):
+        return self.run(self.engine.place_many(requests), timeout)
+
+    def close(self):
+        self.run(self.engine.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+_ENGINE = None
+_ENGINE_LOCK = threading.Lock()
+
+
+def get_engine():
+    """Return the process-wide SyncOrderEngine."""
+    global _ENGINE
+    with _ENGINE_LOCK:
+        if _ENGINE is None:
+            _ENGINE = SyncOrderEngine()
+        return _ENGINE
+
+
+def parse_order_spec(spec):
+    """
+    Parse 'market:SYMBOL:SIDE:QTY', 'limit:SYMBOL:SIDE:QTY:PRICE' or
+    'oco:SYMBOL:SIDE:QTY:TP:SL' into a request dict for place_many().
+    """
+    parts = spec.strip().split(":")
+    kind = parts[0].lower()
+    expected = {'market': 4, 'limit': 5, 'oco': 6}
+    if kind not in expected or len(parts) != expected[kind]:
+        raise ValueError(f"Invalid order spec '{spec}'.")
+
+    request = {'kind': kind, 'symbol': parts[1].upper(), 'side': parts[2].upper(), 'quantity': float(parts[3])}
+    if kind == 'limit':
+        request['price'] = float(parts[4])
+    elif kind == 'oco':
+        request['take_profit'] = float(parts[4])
+        request['stop_loss'] = float(parts[5])
+    return request
+
+
+def place_orders_concurrently(requests, timeout=None):
+    """Place independent orders at the same time and wait for all of them."""
+    return get_engine().place_many(requests, timeout)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python src/async_orders.py market:SYMBOL:SIDE:QTY limit:SYMBOL:SIDE:QTY:PRICE oco:SYMBOL:SIDE:QTY:TP:SL ...")
+        sys.exit(1)
+
+    try:
+        requests = [parse_order_spec(spec) for spec in sys.argv[1:]]
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    results = place_orders_concurrently(requests)
+    for spec, result in zip(sys.argv[1:], results):
+        if isinstance(result, Exception):
+            print(f"❌ {spec}: {result}")
+        else:
+            print(f"✅ {spec}: {result}")
+    get_engine().close()
@@ -0,0 +1,135 @@
+# src/batch_orders.py
+import sys
+
+if __name__ == "__main__":
+    # Hand the command to a running order daemon before paying for the imports below
+    from daemon_client import forward_cli
+    forward_cli('batch', sys.argv[1:])
+
+import json
+import logging
+from decimal import Decimal
+from utils import get_client, validate_orders
+from metrics import METRICS, span
+from journal import journal_order
+
+logger = logging.getLogger(__name__)
+
+# Binance Futures accepts at most 5 orders per batchOrders request
+MAX_BATCH_SIZE = 5
+
+
+class OrderRejected(Exception):
+    """An order in a batch was rejected by the exchange."""
+
+    def __init__(self, code, msg):
+        super().__init__(f"APIError(code={code}): {msg}")
+        self.code = code
+        self.msg = msg
+
+
+def _format_value(value):
+    # batchOrders is sent as a JSON list of string values
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float):
+        return format(Decimal(str(value)).normalize(), "f")
+    return str(value)
+
+
+def _to_wire(order):
+    return {k: _format_value(v) for k, v in order.items() if v is not None}
+
+
+def build_close_orders(positions):
+    """
+    Build reduce-only MARKET orders that close the given positions.
+    Each position needs 'symbol' and a signed 'positionAmt'.
+    """
+    orders = []
+    for p in positions:
+        amt = float(p['positionAmt'])
+        if amt == 0:
+            continue
+        orders.append({
+            'symbol': p['symbol'],
+            'side': 'SELL' if amt > 0 else 'BUY',
+            'type': 'MARKET',
+            'quantity': abs(amt),
+            'reduceOnly': True,
+        })
+    return orders
+
+
+def place_batch_orders(orders, client=None, strategy='batch', strategy_id=None):
+    """
+    Validate a list of orders locally (vectorized per symbol and type), then
+    submit the valid ones, with their exact quantities and prices, through the
+    futures batchOrders endpoint in groups of up to MAX_BATCH_SIZE.
+
+    Each order is a dict of futures_create_order parameters. Returns one
+    {'order': ..., 'error': ...} dict per input order, in input order.
+    """
+    if client is None:
+        client = get_client()
+
+    results = [{'order': None, 'error': None} for _ in orders]
+    pending = []
+    orders = list(orders)
+
+    with span('validate', order_type='batch'):
+        checked = validate_orders(orders, client=client)
+    for i, (qty, price, error) in enumerate(checked):
+        if error is not None:
+            results[i]['error'] = str(error)
+            continue
+        orders[i] = dict(orders[i], quantity=qty)
+        if price is not None:
+            orders[i]['price'] = price
+        pending.append(i)
+
+    for start in range(0, len(pending), MAX_BATCH_SIZE):
+        group = pending[start:start + MAX_BATCH_SIZE]
+        try:
+            with span('submit', order_type='batch'):
+                responses = client.futures_place_batch_order(batchOrders=[_to_wire(orders[i]) for i in group])
+        except Exception as e:
+            logger.error(f"BATCH_ORDER_ERROR: {len(group)} orders failed: {e}")
+            for i in group:
+                results[i]['error'] = str(e)
+            continue
+
+        for i, resp in zip(group, responses):
+            if 'orderId' in resp:
+                results[i]['order'] = resp
+            else:
+                results[i]['error'] = str(OrderRejected(resp.get('code'), resp.get('msg')))
+                METRICS.inc('bot_rejects_total', endpoint='batchOrders', code=resp.get('code'))
+
+    for order, result in zip(orders, results):
+        if result['order']:
+            journal_order(result['order'], strategy=strategy, strategy_id=strategy_id)
+        else:
+            journal_order(order, 'rejected', strategy, strategy_id, result['error'])
+
+    placed = sum(1 for r in results if r['order'])
+    logger.info("BATCH_ORDER_RESULT: Placed=%d, Failed=%d", placed, len(orders) - placed)
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python src/batch_orders.py '<json list of orders>'")
+        sys.exit(1)
+
+    try:
+        orders = json.loads(sys.argv[1])
+    except ValueError:
+        print("Error: Orders must be a JSON list of order objects.")
+        sys.exit(1)
+
+    try:
+        for r in place_batch_orders(orders):
+            print(f"✅ {r['order']}" if r['order'] else f"❌ {r['error']}")
+    except Exception as e:
+        print(f"❌ Error: {e}")
@@ -0,0 +1,118 @@
+# src/daemon_client.py
+import os
+import sys
+import json
+import socket
+import struct
+
+# Standard library only: CLI scripts import this before python-binance, so
+# a command forwarded to the daemon never pays for the heavy imports.
+
+# --- Configuration ---
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ORDER_DAEMON_SOCKET = os.getenv("ORDER_DAEMON_SOCKET", os.path.join(PROJECT_ROOT, ".cache", "orderd.sock"))
+# Seconds to wait for a reply; an order is answered as soon as the exchange acknowledges it
+ORDER_DAEMON_TIMEOUT = float(os.getenv("ORDER_DAEMON_TIMEOUT", "30"))
+# Set ORDER_DAEMON=0 to always run CLI commands in-process
+ORDER_DAEMON_ENABLED = os.getenv("ORDER_DAEMON", "1") != "0"
+
+# Every message is a 4-byte big-endian length followed by that many bytes of UTF-8 JSON
+HEADER = struct.Struct(">I")
+MAX_MESSAGE = 16 * 1024 * 1024
+
+
+class DaemonUnavailable(Exception):
+    """No order daemon is listening on the socket."""
+
+
+class DaemonError(Exception):
+    """The daemon ran the request and it failed (the message is the original error)."""
+
+
+def send_message(sock, message):
+    body = json.dumps(message, default=str).encode("utf-8")
+    sock.sendall(HEADER.pack(len(body)) + body)
+
+
+def _recv_exactly(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("connection closed mid-message")
+        buf += chunk
+    return bytes(buf)
+
+
+def recv_message(sock):
+    """Next message on sock, or None if the peer closed the connection between messages."""
+    first = sock.recv(HEADER.size)
+    if not first:
+        return None
+    header = first + _recv_exactly(sock, HEADER.size - len(first))
+    (size,) = HEADER.unpack(header)
+    if size > MAX_MESSAGE:
+        raise ValueError(f"message of {size} bytes exceeds the {MAX_MESSAGE} byte limit")
+    return json.loads(_recv_exactly(sock, size))
+
+
+class DaemonClient:
+    """
+    One connection to the order daemon. Requests on it are answered in
+    order; keep it open to place many orders without reconnecting.
+    """
+
+    def __init__(self, path=ORDER_DAEMON_SOCKET, timeout=ORDER_DAEMON_TIMEOUT):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.connect(path)
+        except OSError as e:
+            # Missing, refused, stale, unreadable or over-long path: nothing was sent yet
+            self.sock.close()
+            raise DaemonUnavailable(f"no order daemon on {path}: {e}") from None
+
+    def request(self, op, **args):
+        """Run op in the daemon and return its result; raises DaemonError if it failed there."""
+        send_message(self.sock, {'op': op, 'args': args})
+        reply = recv_message(self.sock)
+        if reply is None:
+            raise ConnectionError("order daemon closed the connection")
+        if not reply['ok']:
+            raise DaemonError(reply['error'])
+        return reply['result']
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def request(op, **args):
+    """One-shot request on a fresh connection."""
+    with DaemonClient() as client:
+        return client.request(op, **args)
+
+
+def forward_cli(command, argv):
+    """
+    Run a CLI command in the daemon if one is running: print its output and
+    exit with its status. Returns (to continue in direct mode) otherwise.
+    """
+    if not ORDER_DAEMON_ENABLED:
+        return
+    try:
+        reply = request('cli', command=command, argv=list(argv))
+    except DaemonUnavailable:
+        return
+    except (DaemonError, OSError) as e:
+        # Once sent, the order may be live: never retry it in direct mode
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+    if reply['output']:
+        print(reply['output'])
+    sys.exit(reply['exit_code'])
@@ -0,0 +1,169 @@
+# src/dashboard_service.py
+import os
+import time
+import logging
+import threading
+from utils import get_client
+from market_data import get_market_feed
+from account_state import get_user_stream
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# How often the snapshot is rebuilt from the streams (an order update wakes it early)
+DASHBOARD_REFRESH = float(os.getenv("DASHBOARD_REFRESH", "0.5"))
+# A watched symbol without a streamed price gets at most one REST ticker per this many seconds
+PRICE_FALLBACK_INTERVAL = float(os.getenv("DASHBOARD_PRICE_FALLBACK_INTERVAL", "5"))
+# Minimum seconds between REST resyncs requested from the UI, across all sessions
+RESYNC_MIN_INTERVAL = float(os.getenv("DASHBOARD_RESYNC_MIN_INTERVAL", "10"))
+
+SECTIONS = ('prices', 'balances', 'open_orders', 'positions')
+
+
+def position_rows(positions, mark_prices):
+    """Display rows for non-zero positions, PNL revalued at the streamed mark; returns (rows, total_pnl)."""
+    rows = []
+    total_pnl = 0.0
+    for p in positions:
+        pos_amt = float(p.get('positionAmt', '0.0'))
+        entry_price = float(p['entryPrice'])
+        # Position events only carry PNL as of the last account change
+        mark_price = mark_prices.get(p['symbol'])
+        if mark_price is not None:
+            pnl_val = (mark_price - entry_price) * pos_amt
+        else:
+            pnl_val = float(p.get('unRealizedProfit', '0.0'))
+        total_pnl += pnl_val
+        rows.append({
+            'Symbol': p['symbol'],
+            'Side': 'LONG' if pos_amt > 0 else 'SHORT',
+            'Size': f"{pos_amt:.6f}",
+            'Entry Price': f"{entry_price:.2f}",
+            'Liq. Price': f"{float(p.get('liquidationPrice', '0')):.2f}",
+            'Unrealized PNL': f"{pnl_val:.2f}",
+        })
+    return rows, total_pnl
+
+
+class DashboardService:
+    """
+    Long-lived snapshot of what the dashboard shows.
+
+    One background thread rebuilds prices, balances, open orders and
+    positions from the market-data feed and the user data stream. Every UI
+    session reads the same snapshot, so API load does not grow with sessions
+    or clicks: the only REST calls left are a throttled ticker fallback for
+    symbols the feed has no price for yet, and throttled resyncs.
+    """
+
+    def __init__(self, client, refresh=DASHBOARD_REFRESH):
+        self.client = client
+        self.refresh = refresh
+        self.stream = get_user_stream(client)
+        self.feed = get_market_feed()
+        self._sections = dict.fromkeys(SECTIONS)
+        self._symbols = set()
+        self._fallback = {}
+        self._account_version = None
+        self._last_resync = 0.0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self.stream.state.add_listener(lambda order: self._wake.set())
+        self._update()
+        self._thread = threading.Thread(target=self._run, name="dashboard-service", daemon=True)
+        self._thread.start()
+
+    # --- Reads ---
+
+    def section(self, name):
+        """Latest data of one section (None until first built)."""
+        with self._lock:
+            return self._sections[name]
+
+    def price(self, symbol):
+        """Latest price for symbol (watching it from now on)."""
+        self.watch(symbol)
+        return self._price(symbol)
+
+    # --- Requests from the UI ---
+
+    def watch(self, symbol):
+        """Include symbol in the prices section."""
+        with self._lock:
+            if symbol in self._symbols:
+                return
+            self._symbols.add(symbol)
+        self.feed.subscribe(symbol)
+        self._wake.set()
+
+    def resync(self):
+        """Rebuild account state from REST, at most once per RESYNC_MIN_INTERVAL; returns whether it ran."""
+        with self._lock:
+            if time.monotonic() - self._last_resync < RESYNC_MIN_INTERVAL:
+                return False
+            self._last_resync = time.monotonic()
+        self.stream.resync()
+        self._wake.set()
+        return True
+
+    # --- Internals ---
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.refresh)
+            self._wake.clear()
+            try:
+                self._update()
+            except Exception as e:
+                logger.error(f"DASHBOARD_UPDATE_ERROR: {e}")
+
+    def _price(self, symbol):
+        price = self.feed.latest_price(symbol)
+        if price is not None:
+            return price
+        cached = self._fallback.get(symbol)
+        if cached is not None and time.monotonic() - cached[0] < PRICE_FALLBACK_INTERVAL:
+            return cached[1]
+        # Stream still warming up (or stale): one REST ticker per interval, shared by all sessions
+        self._fallback[symbol] = (time.monotonic(), cached[1] if cached else None)
+        try:
+            price = float(self.client.futures_symbol_ticker(symbol=symbol)['price'])
+        except Exception as e:
+            logger.warning(f"DASHBOARD_PRICE_FALLBACK_ERROR: {symbol}: {e}")
+            return cached[1] if cached else None
+        self._fallback[symbol] = (time.monotonic(), price)
+        return price
+
+    def _update(self):
+        state = self.stream.state
+        positions = state.positions()
+        for p in positions:
+            self.watch(p['symbol'])
+        with self._lock:
+            symbols = sorted(self._symbols)
+        prices = {symbol: self._price(symbol) for symbol in symbols}
+        self._publish('prices', prices)
+
+        if state.version != self._account_version:
+            self._account_version = state.version
+            self._publish('balances', state.balances())
+            self._publish('open_orders', state.open_orders())
+        # Positions are revalued at the mark, so they move with prices too
+        self._publish('positions', position_rows(positions, prices))
+
+    def _publish(self, name, data):
+        with self._lock:
+            self._sections[name] = data
+
+
+_SERVICE = None
+_LOCK = threading.Lock()
+
+
+def get_dashboard_service(client=None):
+    """Return the process-wide DashboardService, starting it on first use."""
+    global _SERVICE
+    with _LOCK:
+        if _SERVICE is None:
+            _SERVICE = DashboardService(client or get_client())
+        return _SERVICE
@@ -0,0 +1,196 @@
+# src/exchange_info.py
+import os
+import json
+import math
+import time
+import logging
+import threading
+from rate_limiter import get_request_scheduler, critical_reads
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(PROJECT_ROOT, ".cache")
+
+# Serve cached rules for this long before refreshing them in the background
+EXCHANGE_INFO_TTL = float(os.getenv("EXCHANGE_INFO_TTL", "3600"))
+# Snapshots older than this are refreshed synchronously instead of being served
+EXCHANGE_INFO_MAX_AGE = float(os.getenv("EXCHANGE_INFO_MAX_AGE", "86400"))
+# Minimum index age before an unknown symbol forces a refresh
+UNKNOWN_SYMBOL_REFRESH = 60.0
+EXCHANGE_INFO_SNAPSHOT = os.getenv("EXCHANGE_INFO_SNAPSHOT", os.path.join(CACHE_DIR, "exchange_info.json"))
+
+
+def parse_symbol(symbol_info):
+    """Flatten one exchangeInfo symbol entry into the rules dict used by the validators."""
+    rules = {
+        'symbol': symbol_info['symbol'],
+        'status': symbol_info.get('status'),
+        'filters': {f['filterType']: f for f in symbol_info.get('filters', [])},
+    }
+    for f in symbol_info.get('filters', []):
+        # Extract key filters: lot size and price filter
+        if f['filterType'] == 'PRICE_FILTER':
+            rules['price_precision'] = int(-math.log10(float(f['tickSize'])))
+            rules['tickSize'] = float(f['tickSize'])
+            rules['minPrice'] = float(f['minPrice'])
+        elif f['filterType'] == 'LOT_SIZE':
+            rules['quantity_precision'] = int(-math.log10(float(f['stepSize'])))
+            rules['stepSize'] = float(f['stepSize'])
+            rules['minQty'] = float(f['minQty'])
+    return rules
+
+
+class ExchangeInfoCache:
+    """
+    Thread-safe cache of futures exchange rules for every symbol.
+
+    The exchangeInfo payload is parsed once into a dict keyed by symbol. Entries
+    are served for `ttl` seconds and then refreshed on a background thread while
+    the old index keeps serving reads. Every refresh is written to a disk snapshot
+    so a cold start can skip the download entirely.
+    """
+
+    def __init__(self, ttl=EXCHANGE_INFO_TTL, max_age=EXCHANGE_INFO_MAX_AGE, snapshot_path=EXCHANGE_INFO_SNAPSHOT):
+        self.ttl = ttl
+        self.max_age = max_age
+        self.snapshot_path = snapshot_path
+        self._lock = threading.Lock()
+        self._index = None
+        self._rate_limits = []
+        self._fetched_at = 0.0
+        self._refreshing = False
+
+    def get(self, client, symbol):
+        """Return the parsed rules for symbol, loading or refreshing the index as needed."""
+        index = self._ensure_loaded(client)
+        rules = index.get(symbol)
+        if rules is None:
+            # The symbol may have been listed after our snapshot was taken,
+            # but don't let repeated typos turn into repeated downloads
+            if time.time() - self._fetched_at > UNKNOWN_SYMBOL_REFRESH:
+                index = self.refresh(client)
+                rules = index.get(symbol)
+            if rules is None:
+                raise ValueError(f"Symbol {symbol} not found in exchange info.")
+        return rules
+
+    def symbols(self, client):
+        """Return every indexed symbol."""
+        return list(self._ensure_loaded(client))
+
+    def rate_limits(self, client):
+        """Return the rateLimits section of the last exchangeInfo payload."""
+        self._ensure_loaded(client)
+        return list(self._rate_limits)
+
+    def peek(self, symbol):
+        """Rules for symbol if the index (or its snapshot) holds them and is not past max_age; never downloads."""
+        with self._lock:
+            if self._index is None:
+                self._load_snapshot()
+            index = self._index
+        if index is None or time.time() - self._fetched_at > self.max_age:
+            return None
+        return index.get(symbol)
+
+    def is_stale(self):
+        """True once the index is past its ttl and due for a refresh."""
+        return time.time() - self._fetched_at > self.ttl
+
+    def refresh(self, client):
+        """Download exchangeInfo, rebuild the whole index in one pass and snapshot it."""
+        # Orders cannot be validated without it: never shed
+        with critical_reads():
+            info = client.futures_exchange_info()
+        return self.load(info)
+
+    def load(self, info):
+        """Index an exchangeInfo payload fetched by the caller (e.g. through an AsyncClient)."""
+        index = {s['symbol']: parse_symbol(s) for s in info['symbols']}
+        fetched_at = time.time()
+
+        with self._lock:
+            self._index = index
+            self._rate_limits = info.get('rateLimits', [])
+            self._fetched_at = fetched_at
+
+        if self._rate_limits:
+            get_request_scheduler().set_rate_limits(self._rate_limits)
+        self._write_snapshot(index, self._rate_limits, fetched_at)
+        logger.info(f"Exchange rules loaded and cached for {len(index)} symbols.")
+        return index
+
+    def clear(self):
+        with self._lock:
+            self._index = None
+            self._fetched_at = 0.0
+
+    def _ensure_loaded(self, client):
+        index = self._index
+        if index is None:
+            with self._lock:
+                if self._index is None:
+                    self._load_snapshot()
+                index = self._index
+
+        age = time.time() - self._fetched_at
+        if index is None or age > self.max_age:
+            return self.refresh(client)
+        if age > self.ttl:
+            self._refresh_in_background(client)
+        return index
+
+    def _refresh_in_background(self, client):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh(client)
+            except Exception as e:
+                logger.warning(f"Background exchange info refresh failed: {e}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="exchange-info-refresh", daemon=True).start()
+
+    def _load_snapshot(self):
+        # Caller holds self._lock
+        try:
+            with open(self.snapshot_path, "r") as fh:
+                snapshot = json.load(fh)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable exchange info snapshot {self.snapshot_path}: {e}")
+            return
+
+        self._index = snapshot['symbols']
+        self._rate_limits = snapshot.get('rateLimits', [])
+        self._fetched_at = snapshot['fetched_at']
+        if self._rate_limits:
+            get_request_scheduler().set_rate_limits(self._rate_limits)
+        logger.info(f"Exchange rules loaded from snapshot for {len(self._index)} symbols.")
+
+    def _write_snapshot(self, index, rate_limits, fetched_at):
+        snapshot = {'fetched_at': fetched_at, 'rateLimits': rate_limits, 'symbols': index}
+        tmp_path = f"{self.snapshot_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+            with open(tmp_path, "w") as fh:
+                json.dump(snapshot, fh, separators=(",", ":"))
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            logger.warning(f"Could not write exchange info snapshot: {e}")
+
+
+EXCHANGE_INFO = ExchangeInfoCache()
+
+
+def get_symbol_rules(client, symbol):
+    """Return the cached exchange rules for symbol."""
+    return EXCHANGE_INFO.get(client, symbol)
@@ -0,0 +1,231 @@
+# src/filters.py
+import math
+import threading
+import numpy as np
+
+# Guards float -> integer unit conversion against representation error (0.29 * 100 = 28.999999999999996)
+UNIT_EPSILON = 1e-6
+
+
+class FilterError(ValueError):
+    """An order breaks one of the symbol's exchange filters."""
+
+    def __init__(self, filter_type, message):
+        super().__init__(message)
+        self.filter_type = filter_type
+
+
+def _decimals(text):
+    """Decimal places of a filter value string ('0.00100000' -> 3)."""
+    text = str(text).rstrip('0')
+    return len(text.split('.')[1]) if '.' in text else 0
+
+
+def floor_to_increment(value, increment):
+    """Round value down to a multiple of increment using integer math (None increment: unchanged)."""
+    if increment is None:
+        return value
+    scale = 10 ** _decimals(f"{float(increment):.12f}")
+    step = round(float(increment) * scale)
+    if step <= 0:
+        return value
+    units = math.floor(value * scale + UNIT_EPSILON)
+    return (units // step * step) / scale
+
+
+# Reason codes of the vectorized path, in check order
+BATCH_OK, BATCH_QTY_STEP, BATCH_QTY_RANGE, BATCH_PRICE_TICK, BATCH_PRICE_RANGE, BATCH_NOTIONAL, BATCH_PERCENT_PRICE = range(7)
+BATCH_REASONS = ('OK', 'LOT_SIZE step', 'LOT_SIZE range', 'PRICE_FILTER tick', 'PRICE_FILTER range', 'MIN_NOTIONAL', 'PERCENT_PRICE')
+
+MARKET_TYPES = {'MARKET', 'STOP_MARKET', 'TAKE_PROFIT_MARKET', 'TRAILING_STOP_MARKET'}
+
+
+class SymbolFilters:
+    """
+    Every filter of one symbol precompiled into integer units.
+
+    Prices are held in ticks of 10**-price_decimals and quantities in units of
+    10**-qty_decimals, so grid, range and notional checks are exact integer
+    comparisons instead of float division with a tolerance. check() validates
+    one order; check_batch() validates NumPy arrays of orders in one call.
+    """
+
+    def __init__(self, rules):
+        f = rules.get('filters', {})
+        self.symbol = rules['symbol']
+        self.status = rules.get('status')
+
+        price = f.get('PRICE_FILTER', {})
+        lot = f.get('LOT_SIZE', {})
+        market_lot = f.get('MARKET_LOT_SIZE', lot)
+        self.price_decimals = max((_decimals(price.get(k, '0')) for k in ('tickSize', 'minPrice', 'maxPrice')), default=0)
+        self.qty_decimals = max((_decimals(d.get(k, '0')) for d in (lot, market_lot) for k in ('stepSize', 'minQty', 'maxQty')), default=0)
+        self.price_scale = 10 ** self.price_decimals
+        self.qty_scale = 10 ** self.qty_decimals
+
+        self.tick = self._price_units(price.get('tickSize', 0)) or 1
+        self.min_price = self._price_units(price.get('minPrice', 0))
+        self.max_price = self._price_units(price.get('maxPrice', 0)) or None
+        # (step, min, max) for limit-type and market-type orders
+        self.lot = self._lot(lot)
+        self.market_lot = self._lot(market_lot)
+
+        notional = f.get('MIN_NOTIONAL', {})
+        self.min_notional = float(notional.get('notional', notional.get('minNotional', 0)) or 0)
+        percent = f.get('PERCENT_PRICE', {})
+        self.multiplier_up = float(percent['multiplierUp']) if percent else None
+        self.multiplier_down = float(percent['multiplierDown']) if percent else None
+        self.max_num_orders = int(f['MAX_NUM_ORDERS']['limit']) if 'MAX_NUM_ORDERS' in f else None
+
+    def _price_units(self, value):
+        return round(float(value) * self.price_scale)
+
+    def _qty_units(self, value):
+        return round(float(value) * self.qty_scale)
+
+    def _lot(self, lot):
+        return (self._qty_units(lot.get('stepSize', 0)) or 1, self._qty_units(lot.get('minQty', 0)), self._qty_units(lot.get('maxQty', 0)) or None)
+
+    @staticmethod
+    def _exact(value, scale):
+        # Integer units of value, or None if it has more decimals than the scale allows
+        scaled = value * scale
+        units = round(scaled)
+        return units if abs(scaled - units) <= UNIT_EPSILON else None
+
+    # --- Single order ---
+
+    def normalize(self, qty, price=None, order_type=None):
+        """Round qty down to the lot step and price down to the tick; returns (qty, price)."""
+        step = (self.market_lot if order_type in MARKET_TYPES else self.lot)[0]
+        q_units = math.floor(qty * self.qty_scale + UNIT_EPSILON) // step * step
+        norm_price = None
+        if price is not None:
+            p_units = math.floor(price * self.price_scale + UNIT_EPSILON) // self.tick * self.tick
+            norm_price = p_units / self.price_scale
+        return q_units / self.qty_scale, norm_price
+
+    def check(self, qty, price=None, order_type=None, stop_price=None, reduce_only=False, mark_price=None, open_orders=None):
+        """
+        Validate one order against every filter; returns the exact (qty, price)
+        or raises FilterError. mark_price enables PERCENT_PRICE and the market
+        MIN_NOTIONAL check, open_orders the MAX_NUM_ORDERS check.
+        """
+        if order_type is None:
+            order_type = 'LIMIT' if price is not None else 'MARKET'
+        if self.status not in (None, 'TRADING'):
+            raise FilterError('STATUS', f"{self.symbol} is not trading (status {self.status}).")
+
+        step, min_qty, max_qty = self.market_lot if order_type in MARKET_TYPES else self.lot
+        filter_name = 'MARKET_LOT_SIZE' if order_type in MARKET_TYPES else 'LOT_SIZE'
+        q_units = self._exact(qty, self.qty_scale)
+        if q_units is None or q_units % step:
+            raise FilterError(filter_name, f"Quantity {qty} must be a multiple of the step size {step / self.qty_scale}.")
+        if q_units < min_qty:
+            raise FilterError(filter_name, f"Quantity {qty} is less than minimum quantity {min_qty / self.qty_scale}.")
+        if max_qty is not None and q_units > max_qty:
+            raise FilterError(filter_name, f"Quantity {qty} is above maximum quantity {max_qty / self.qty_scale}.")
+
+        for label, value in (('Price', price), ('Stop price', stop_price)):
+            if value is None:
+                continue
+            p_units = self._exact(value, self.price_scale)
+            if p_units is None or p_units % self.tick:
+                raise FilterError('PRICE_FILTER', f"{label} {value} must be a multiple of the tick size {self.tick / self.price_scale}.")
+            if p_units < self.min_price or (self.max_price is not None and p_units > self.max_price):
+                raise FilterError('PRICE_FILTER', f"{label} {value} is outside [{self.min_price / self.price_scale}, {(self.max_price or 0) / self.price_scale}].")
+
+        if price is not None and mark_price and self.multiplier_up is not None and order_type not in MARKET_TYPES:
+            if price > mark_price * self.multiplier_up or price < mark_price * self.multiplier_down:
+                raise FilterError('PERCENT_PRICE', f"Price {price} is outside {self.multiplier_down}-{self.multiplier_up}x of mark {mark_price}.")
+
+        reference = price if price is not None and order_type not in MARKET_TYPES else (stop_price or mark_price)
+        if self.min_notional and not reduce_only and reference:
+            # Integer product of units vs. the notional in the same units
+            notional_units = q_units * round(reference * self.price_scale)
+            if notional_units < round(self.min_notional * self.qty_scale * self.price_scale):
+                raise FilterError('MIN_NOTIONAL', f"Order notional {qty * reference:.4f} is below the minimum {self.min_notional}.")
+
+        if self.max_num_orders is not None and open_orders is not None and order_type != 'MARKET' and open_orders >= self.max_num_orders:
+            raise FilterError('MAX_NUM_ORDERS', f"{self.symbol} already has {open_orders} open orders (max {self.max_num_orders}).")
+
+        return q_units / self.qty_scale, (None if price is None else round(price * self.price_scale) / self.price_scale)
+
+    # --- Vectorized ---
+
+    def check_batch(self, qty, price=None, order_type='LIMIT', mark_price=None, reduce_only=False, normalize=False, stop_price=None):
+        """
+        Validate arrays of orders in one pass.
+
+        Returns (qty, price, reasons): the exact (or, with normalize=True,
+        rounded-down) quantities and prices as float arrays, and an int8 array
+        of BATCH_* reason codes where 0 means the order passes. Stop prices
+        are checked as given, never normalized.
+        """
+        qty = np.asarray(qty, dtype=np.float64)
+        step, min_qty, max_qty = self.market_lot if order_type in MARKET_TYPES else self.lot
+        reasons = np.zeros(qty.shape, dtype=np.int8)
+
+        def flag(mask, code):
+            # First failing check wins
+            reasons[(reasons == BATCH_OK) & mask] = code
+
+        q_scaled = qty * self.qty_scale
+        if normalize:
+            q_units = np.floor(q_scaled + UNIT_EPSILON).astype(np.int64) // step * step
+        else:
+            q_units = np.rint(q_scaled).astype(np.int64)
+            flag((np.abs(q_scaled - q_units) > UNIT_EPSILON) | (q_units % step != 0), BATCH_QTY_STEP)
+        flag((q_units < min_qty) | ((q_units > max_qty) if max_qty is not None else False), BATCH_QTY_RANGE)
+
+        p_units = None
+        if price is not None:
+            price = np.broadcast_to(np.asarray(price, dtype=np.float64), qty.shape)
+            p_scaled = price * self.price_scale
+            if normalize:
+                p_units = np.floor(p_scaled + UNIT_EPSILON).astype(np.int64) // self.tick * self.tick
+            else:
+                p_units = np.rint(p_scaled).astype(np.int64)
+                flag((np.abs(p_scaled - p_units) > UNIT_EPSILON) | (p_units % self.tick != 0), BATCH_PRICE_TICK)
+            flag((p_units < self.min_price) | ((p_units > self.max_price) if self.max_price is not None else False), BATCH_PRICE_RANGE)
+
+        s_units = None
+        if stop_price is not None:
+            s_scaled = np.broadcast_to(np.asarray(stop_price, dtype=np.float64), qty.shape) * self.price_scale
+            s_units = np.rint(s_scaled).astype(np.int64)
+            flag((np.abs(s_scaled - s_units) > UNIT_EPSILON) | (s_units % self.tick != 0), BATCH_PRICE_TICK)
+            flag((s_units < self.min_price) | ((s_units > self.max_price) if self.max_price is not None else False), BATCH_PRICE_RANGE)
+
+        if p_units is not None and order_type not in MARKET_TYPES:
+            reference_units = p_units
+        elif s_units is not None:
+            reference_units = s_units
+        else:
+            reference_units = np.int64(round(mark_price * self.price_scale)) if mark_price else None
+        if self.min_notional and not reduce_only and reference_units is not None:
+            flag(q_units * reference_units < round(self.min_notional * self.qty_scale * self.price_scale), BATCH_NOTIONAL)
+
+        if p_units is not None and mark_price and self.multiplier_up is not None and order_type not in MARKET_TYPES:
+            out_of_band = (p_units > mark_price * self.multiplier_up * self.price_scale) | (p_units < mark_price * self.multiplier_down * self.price_scale)
+            flag(out_of_band, BATCH_PERCENT_PRICE)
+
+        norm_qty = q_units / self.qty_scale
+        norm_price = p_units / self.price_scale if p_units is not None else None
+        return norm_qty, norm_price, reasons
+
+
+_COMPILED = {}
+_LOCK = threading.Lock()
+
+
+def compile_filters(rules):
+    """Return the SymbolFilters for a parsed rules dict, compiled once per exchange-info refresh."""
+    symbol = rules['symbol']
+    cached = _COMPILED.get(symbol)
+    # A refresh replaces the rules dict, so identity tells us when to recompile
+    if cached is not None and cached[0] is rules:
+        return cached[1]
+    compiled = SymbolFilters(rules)
+    with _LOCK:
+        _COMPILED[symbol] = (rules, compiled)
+    return compiled
@@ -0,0 +1,296 @@
+# src/journal.py
+import os
+import json
+import time
+import queue
+import atexit
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JOURNAL_DB = os.getenv("JOURNAL_DB", os.path.join(PROJECT_ROOT, "data", "journal.sqlite3"))
+# Most rows written in one transaction
+JOURNAL_BATCH_SIZE = int(os.getenv("JOURNAL_BATCH_SIZE", "500"))
+
+# Strategy states that are still in flight and get rebuilt on startup
+ACTIVE_STATES = ('running', 'paused', 'active')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    seq INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    event TEXT NOT NULL,
+    order_id INTEGER,
+    client_order_id TEXT,
+    symbol TEXT,
+    side TEXT,
+    type TEXT,
+    status TEXT,
+    qty REAL,
+    price REAL,
+    stop_price REAL,
+    executed_qty REAL,
+    avg_price REAL,
+    fill_qty REAL,
+    fill_price REAL,
+    update_time INTEGER,
+    strategy TEXT,
+    strategy_id TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS orders_order_id ON orders (order_id);
+CREATE INDEX IF NOT EXISTS orders_client_order_id ON orders (client_order_id);
+CREATE INDEX IF NOT EXISTS orders_symbol_ts ON orders (symbol, ts);
+CREATE INDEX IF NOT EXISTS orders_ts ON orders (ts);
+CREATE INDEX IF NOT EXISTS orders_strategy_ts ON orders (strategy, ts);
+
+CREATE TABLE IF NOT EXISTS strategy_events (
+    seq INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    strategy TEXT NOT NULL,
+    strategy_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS strategy_events_id ON strategy_events (strategy, strategy_id, seq);
+
+CREATE TABLE IF NOT EXISTS leases (
+    strategy TEXT NOT NULL,
+    strategy_id TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (strategy, strategy_id)
+);
+"""
+
+ORDER_COLUMNS = ('ts', 'event', 'order_id', 'client_order_id', 'symbol', 'side', 'type', 'status', 'qty', 'price',
+                 'stop_price', 'executed_qty', 'avg_price', 'fill_qty', 'fill_price', 'update_time',
+                 'strategy', 'strategy_id', 'error')
+INSERT_ORDER = f"INSERT INTO orders ({', '.join(ORDER_COLUMNS)}) VALUES ({', '.join('?' * len(ORDER_COLUMNS))})"
+INSERT_STRATEGY = "INSERT INTO strategy_events (ts, strategy, strategy_id, state, data) VALUES (?, ?, ?, ?, ?)"
+
+
+def _number(value):
+    # Exchange numbers arrive as strings; '0' placeholders are stored as NULL
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value or None
+
+
+def order_row(order, event, strategy=None, strategy_id=None, error=None):
+    """Journal row for an order response, stream update or (with error) rejected request."""
+    get = order.get
+    return (
+        time.time(), event, get('orderId'), get('clientOrderId') or get('newClientOrderId'), get('symbol'),
+        get('side'), get('type'), get('status'), _number(get('origQty', get('quantity'))), _number(get('price')),
+        _number(get('stopPrice')), _number(get('executedQty')), _number(get('avgPrice')),
+        _number(get('lastFilledQty')), _number(get('lastFilledPrice')), get('updateTime'),
+        strategy, None if strategy_id is None else str(strategy_id), error,
+    )
+
+
+class Journal:
+    """
+    Append-only order and strategy journal in SQLite (WAL mode).
+
+    Writers only put a row on a queue; one writer thread drains it and
+    commits whatever has accumulated in a single transaction, so the order
+    path never waits on disk. Reads open their own connection and see every
+    committed row while the writer keeps going.
+    """
+
+    def __init__(self, path=JOURNAL_DB, batch_size=JOURNAL_BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self._queue = queue.SimpleQueue()
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+        self._thread = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # --- Writes (non-blocking) ---
+
+    def record_order(self, order, event='placed', strategy=None, strategy_id=None, error=None):
+        self._queue.put((INSERT_ORDER, order_row(order, event, strategy, strategy_id, error)))
+
+    def record_strategy(self, strategy, strategy_id, state, data=None):
+        """Append a state change of one strategy instance (a TWAP job, an OCO pair)."""
+        self._queue.put((INSERT_STRATEGY, (time.time(), strategy, str(strategy_id), state,
+                                           None if data is None else json.dumps(data, default=str))))
+
+    def flush(self, timeout=5.0):
+        """Wait until everything queued so far is committed."""
+        done = threading.Event()
+        self._queue.put((None, done))
+        return done.wait(timeout)
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            waiters = [args for sql, args in batch if sql is None]
+            rows = [(sql, args) for sql, args in batch if sql is not None]
+            try:
+                self._write(conn, rows)
+            except Exception as e:
+                # One bad row must not take the rest of the batch with it
+                logger.warning(f"JOURNAL_BATCH_ERROR: retrying {len(rows)} rows one by one: {e}")
+                for row in rows:
+                    try:
+                        self._write(conn, [row])
+                    except Exception as e:
+                        logger.error(f"JOURNAL_WRITE_ERROR: row lost: {e} {row[1]!r}")
+            for done in waiters:
+                done.set()
+
+    @staticmethod
+    def _write(conn, rows):
+        # One transaction: all rows or none
+        with conn:
+            for sql, args in rows:
+                conn.execute(sql, args)
+
+    # --- Reads ---
+
+    def _reader(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+        return conn
+
+    def orders(self, symbol=None, strategy=None, strategy_id=None, order_id=None, client_order_id=None,
+               since=None, until=None, event=None, limit=None):
+        """Journal rows matching every given filter, oldest first (since/until are epoch seconds)."""
+        self.flush()
+        filters = {'symbol = ?': symbol, 'strategy = ?': strategy, 'strategy_id = ?': strategy_id,
+                   'order_id = ?': order_id, 'client_order_id = ?': client_order_id,
+                   'ts >= ?': since, 'ts < ?': until, 'event = ?': event}
+        clauses = [(clause, value) for clause, value in filters.items() if value is not None]
+        sql = "SELECT * FROM orders"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clause for clause, _ in clauses)
+        sql += " ORDER BY seq"
+        params = [value for _, value in clauses]
+        if limit is not None:
+            # Newest `limit` rows, still returned oldest first
+            sql = f"SELECT * FROM ({sql.replace('ORDER BY seq', 'ORDER BY seq DESC')} LIMIT ?) ORDER BY seq"
+            params.append(limit)
+        return [dict(row) for row in self._reader().execute(sql, params)]
+
+    def orders_today(self, strategy=None, symbol=None):
+        """Rows journaled since 00:00 UTC, optionally for one strategy or symbol."""
+        now = time.time()
+        return self.orders(symbol=symbol, strategy=strategy, since=now - now % 86400)
+
+    def strategy_states(self, strategy=None, active_only=True):
+        """Latest state of every strategy instance: [{strategy, strategy_id, state, data, ts}]."""
+        self.flush()
+        sql = ("SELECT e.* FROM strategy_events e JOIN (SELECT MAX(seq) AS seq FROM strategy_events"
+               + (" WHERE strategy = ?" if strategy else "") + " GROUP BY strategy, strategy_id) latest USING (seq)"
+               + (f" WHERE e.state IN ({', '.join('?' * len(ACTIVE_STATES))})" if active_only else "") + " ORDER BY e.seq")
+        params = ([strategy] if strategy else []) + (list(ACTIVE_STATES) if active_only else [])
+        states = []
+        for row in self._reader().execute(sql, params):
+            entry = dict(row)
+            entry['data'] = json.loads(entry['data']) if entry['data'] else {}
+            states.append(entry)
+        return states
+
+    # --- Leases (synchronous: ownership is settled before acting on it) ---
+
+    def next_leased_id(self, strategy, owner, ttl):
+        """
+        Next numeric id of strategy, unique across every process sharing the
+        database, leased to owner for ttl seconds.
+        """
+        conn = self._reader()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT MAX(n) FROM (SELECT MAX(CAST(strategy_id AS INTEGER)) AS n FROM strategy_events WHERE strategy = ?"
+                " UNION ALL SELECT MAX(CAST(strategy_id AS INTEGER)) FROM leases WHERE strategy = ?)", (strategy, strategy)).fetchone()
+            strategy_id = (row[0] or 0) + 1
+            conn.execute("INSERT INTO leases (strategy, strategy_id, owner, expires) VALUES (?, ?, ?, ?)",
+                         (strategy, str(strategy_id), owner, time.time() + ttl))
+        return strategy_id
+
+    def acquire_lease(self, strategy, strategy_id, owner, ttl, takeover_from=None):
+        """
+        Claim a strategy instance for owner; False while another owner's lease
+        is live, unless that owner is takeover_from (known to be gone).
+        """
+        now = time.time()
+        with self._reader() as conn:
+            cursor = conn.execute(
+                "INSERT INTO leases (strategy, strategy_id, owner, expires) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (strategy, strategy_id) DO UPDATE SET owner = excluded.owner, expires = excluded.expires"
+                " WHERE leases.owner = excluded.owner OR leases.expires < ? OR leases.owner = ?",
+                (strategy, str(strategy_id), owner, now + ttl, now, takeover_from))
+        return cursor.rowcount == 1
+
+    def lease_owner(self, strategy, strategy_id):
+        """Current holder of a strategy instance's lease (None if never leased)."""
+        row = self._reader().execute("SELECT owner FROM leases WHERE strategy = ? AND strategy_id = ?",
+                                     (strategy, str(strategy_id))).fetchone()
+        return row[0] if row else None
+
+    def renew_leases(self, strategy, strategy_ids, owner, ttl):
+        """Extend owner's leases; returns the ids still held (a lapsed one may have been taken over)."""
+        held = []
+        with self._reader() as conn:
+            for strategy_id in strategy_ids:
+                cursor = conn.execute("UPDATE leases SET expires = ? WHERE strategy = ? AND strategy_id = ? AND owner = ?",
+                                      (time.time() + ttl, strategy, str(strategy_id), owner))
+                if cursor.rowcount:
+                    held.append(strategy_id)
+        return held
+
+    def last_strategy_id(self, strategy):
+        """Highest numeric id ever journaled for strategy (0 if none)."""
+        self.flush()
+        row = self._reader().execute(
+            "SELECT MAX(CAST(strategy_id AS INTEGER)) FROM strategy_events WHERE strategy = ?", (strategy,)).fetchone()
+        return row[0] or 0
+
+
+_JOURNAL = None
+_LOCK = threading.Lock()
+
+
+def get_journal():
+    """Return the process-wide Journal, opening the database on first use."""
+    global _JOURNAL
+    with _LOCK:
+        if _JOURNAL is None:
+            _JOURNAL = Journal()
+            atexit.register(_JOURNAL.flush)
+        return _JOURNAL
+
+
+def journal_order(order, event='placed', strategy=None, strategy_id=None, error=None):
+    """Queue one order row; never raises into the order path."""
+    try:
+        get_journal().record_order(order, event, strategy, strategy_id, error)
+    except Exception as e:
+        logger.error(f"JOURNAL_ERROR: {e}")
@@ -0,0 +1,291 @@
+# src/klines_store.py
+import os
+import sys
+import time
+import logging
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from binance.client import BinanceAPIException, BinanceRequestException
+from requests.exceptions import RequestException
+from utils import get_client
+from rate_limiter import RequestShed
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+KLINES_DIR = os.getenv("KLINES_DIR", os.path.join(PROJECT_ROOT, "data", "klines"))
+# Pages fetched at once per series; each 1500-candle page weighs 10
+KLINES_WORKERS = int(os.getenv("KLINES_WORKERS", "4"))
+# History fetched for a series that has nothing stored yet
+KLINES_DEFAULT_DAYS = float(os.getenv("KLINES_DEFAULT_DAYS", "30"))
+PAGE_LIMIT = 1500
+MAX_PAGE_ATTEMPTS = 8
+
+# (column, dtype, index in the REST kline row); open_time is written last, see append()
+COLUMNS = (
+    ('open', np.float64, 1),
+    ('high', np.float64, 2),
+    ('low', np.float64, 3),
+    ('close', np.float64, 4),
+    ('volume', np.float64, 5),
+    ('close_time', np.int64, 6),
+    ('quote_volume', np.float64, 7),
+    ('trades', np.int64, 8),
+    ('taker_buy_volume', np.float64, 9),
+    ('taker_buy_quote_volume', np.float64, 10),
+    ('open_time', np.int64, 0),
+)
+COLUMN_NAMES = tuple(name for name, _, _ in COLUMNS)
+
+INTERVAL_MS = {
+    '1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+    '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000, '6h': 21_600_000, '8h': 28_800_000,
+    '12h': 43_200_000, '1d': 86_400_000, '3d': 259_200_000, '1w': 604_800_000,
+}
+# Weekly candles open on Mondays, but the epoch (1970-01-01) was a Thursday
+INTERVAL_OFFSET_MS = {'1w': 4 * 86_400_000}
+
+
+def interval_ms(interval):
+    try:
+        return INTERVAL_MS[interval]
+    except KeyError:
+        raise ValueError(f"Unsupported kline interval '{interval}' (one of {', '.join(INTERVAL_MS)}).") from None
+
+
+class Klines:
+    """
+    Read-only columns of one symbol/interval series.
+
+    Columns are np.memmap views of the store's files, so opening a year of
+    1m candles maps the files instead of reading them; slicing with
+    between() returns views as well. to_frame() copies into pandas.
+    """
+
+    def __init__(self, symbol, interval, columns):
+        self.symbol = symbol
+        self.interval = interval
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns['open_time'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['columns'][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def between(self, start_ms=None, end_ms=None):
+        """Candles with start_ms <= open_time < end_ms, as views."""
+        open_time = self.columns['open_time']
+        lo = 0 if start_ms is None else int(np.searchsorted(open_time, start_ms, 'left'))
+        hi = len(open_time) if end_ms is None else int(np.searchsorted(open_time, end_ms, 'left'))
+        return Klines(self.symbol, self.interval, {name: col[lo:hi] for name, col in self.columns.items()})
+
+    def to_frame(self):
+        import pandas as pd
+        frame = pd.DataFrame({name: np.asarray(col) for name, col in self.columns.items()})
+        frame.index = pd.to_datetime(frame['open_time'], unit='ms', utc=True)
+        return frame
+
+
+class KlineStore:
+    """
+    Append-only columnar kline files: <root>/<SYMBOL>/<interval>/<column>.bin.
+
+    Each column is a flat little-endian array, so a reader maps it with
+    np.memmap and an append is a plain write at the end of every file.
+    open_time is appended last and readers use the shortest column, so a
+    reader never sees a half-written candle. One writer per series.
+    """
+
+    def __init__(self, root=KLINES_DIR):
+        self.root = root
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _dir(self, symbol, interval):
+        return os.path.join(self.root, symbol.upper(), interval)
+
+    def _path(self, symbol, interval, column):
+        return os.path.join(self._dir(symbol, interval), f"{column}.bin")
+
+    def _series_lock(self, symbol, interval):
+        with self._lock:
+            return self._locks.setdefault((symbol.upper(), interval), threading.Lock())
+
+    def series(self):
+        """Every stored (symbol, interval)."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted((symbol, interval) for symbol in os.listdir(self.root)
+                      for interval in os.listdir(os.path.join(self.root, symbol)) if interval in INTERVAL_MS)
+
+    def _rows(self, symbol, interval):
+        # Complete candles on disk: the shortest column wins
+        sizes = []
+        for name, dtype, _ in COLUMNS:
+            try:
+                sizes.append(os.path.getsize(self._path(symbol, interval, name)) // np.dtype(dtype).itemsize)
+            except FileNotFoundError:
+                return 0
+        return min(sizes)
+
+    def last_open_time(self, symbol, interval):
+        """open_time of the newest stored candle, or None."""
+        rows = self._rows(symbol, interval)
+        if not rows:
+            return None
+        with open(self._path(symbol, interval, 'open_time'), 'rb') as fh:
+            fh.seek((rows - 1) * 8)
+            return int(np.frombuffer(fh.read(8), dtype='<i8')[0])
+
+    def load(self, symbol, interval, start_ms=None, end_ms=None):
+        """Memory-map a stored series (empty columns if nothing is stored)."""
+        symbol = symbol.upper()
+        rows = self._rows(symbol, interval)
+        columns = {}
+        for name, dtype, _ in COLUMNS:
+            dtype = np.dtype(dtype).newbyteorder('<')
+            if rows:
+                columns[name] = np.memmap(self._path(symbol, interval, name), dtype=dtype, mode='r', shape=(rows,))
+            else:
+                columns[name] = np.empty(0, dtype=dtype)
+        klines = Klines(symbol, interval, columns)
+        return klines if start_ms is None and end_ms is None else klines.between(start_ms, end_ms)
+
+    def append(self, symbol, interval, rows):
+        """Append REST kline rows newer than the last stored candle; returns how many were written."""
+        if not rows:
+            return 0
+        symbol = symbol.upper()
+        with self._series_lock(symbol, interval):
+            os.makedirs(self._dir(symbol, interval), exist_ok=True)
+            stored = self._repair(symbol, interval)
+            last = self.last_open_time(symbol, interval) if stored else None
+            if last is not None:
+                rows = [r for r in rows if r[0] > last]
+            if not rows:
+                return 0
+            for name, dtype, index in COLUMNS:
+                values = np.array([r[index] for r in rows], dtype=np.float64 if dtype is np.float64 else np.int64)
+                with open(self._path(symbol, interval, name), 'ab') as fh:
+                    fh.write(values.astype(np.dtype(dtype).newbyteorder('<'), copy=False).tobytes())
+            return len(rows)
+
+    def _repair(self, symbol, interval):
+        # Cut columns left longer than open_time by an interrupted append
+        rows = self._rows(symbol, interval)
+        for name, dtype, _ in COLUMNS:
+            path = self._path(symbol, interval, name)
+            size = rows * np.dtype(dtype).itemsize
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                with open(path, 'r+b') as fh:
+                    fh.truncate(size)
+        return rows
+
+
+class KlinesDownloader:
+    """
+    Pages futures klines into a KlineStore.
+
+    Each series resumes from its newest stored candle. Pages of a series are
+    fetched concurrently but appended in order, so an interrupted download
+    leaves a clean prefix to resume from. Every call goes through the shared
+    rate-limit scheduler as a read; when it sheds a page to keep headroom
+    for orders, the page is retried after a backoff instead of failing.
+    """
+
+    def __init__(self, store=None, client=None, workers=KLINES_WORKERS):
+        self.store = store or KlineStore()
+        self.client = client or get_client()
+        self.workers = max(1, workers)
+
+    def _fetch(self, symbol, interval, start_ms, end_ms):
+        delay = 0.5
+        for attempt in range(MAX_PAGE_ATTEMPTS):
+            try:
+                return self.client.futures_klines(symbol=symbol, interval=interval, startTime=start_ms,
+                                                  endTime=end_ms, limit=PAGE_LIMIT)
+            except RequestShed:
+                pass  # Orders have the headroom; wait for the window
+            except BinanceAPIException as e:
+                if e.status_code not in (429, 418) and e.status_code < 500:
+                    raise
+            except (BinanceRequestException, RequestException) as e:
+                logger.warning(f"KLINES_PAGE_RETRY: {symbol} {interval} @ {start_ms}: {e}")
+            METRICS.inc('bot_retries_total', component='klines')
+            time.sleep(delay)
+            delay = min(delay * 2, 30.0)
+        raise RuntimeError(f"Gave up on {symbol} {interval} page at {start_ms} after {MAX_PAGE_ATTEMPTS} attempts.")
+
+    def download(self, symbol, interval, start_ms=None, end_ms=None):
+        """Top up one series; returns the number of candles appended."""
+        symbol = symbol.upper()
+        step = interval_ms(interval)
+        offset = INTERVAL_OFFSET_MS.get(interval, 0)
+        now = int(time.time() * 1000)
+        end_ms = min(end_ms or now, now)
+        last = self.store.last_open_time(symbol, interval)
+        if last is not None:
+            start_ms = max(start_ms or 0, last + step)
+        elif start_ms is None:
+            start_ms = end_ms - int(KLINES_DEFAULT_DAYS * 86_400_000)
+        start_ms = offset - (offset - start_ms) // step * step
+
+        page_span = PAGE_LIMIT * step
+        pages = list(range(start_ms, end_ms, page_span))
+        added = 0
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="klines") as pool:
+            for i in range(0, len(pages), self.workers):
+                chunk = pages[i:i + self.workers]
+                results = pool.map(lambda s: self._fetch(symbol, interval, s, min(s + page_span, end_ms) - 1), chunk)
+                for rows in results:
+                    # Only closed candles are stored (judged by their own close time): the files are append-only
+                    added += self.store.append(symbol, interval, [r for r in rows if r[0] < end_ms and r[6] < now])
+        logger.info(f"KLINES_DOWNLOADED: {symbol} {interval} +{added} candles ({len(pages)} pages)")
+        return added
+
+    def download_many(self, symbols, intervals, start_ms=None, end_ms=None):
+        """Top up every symbol/interval pair; returns {(symbol, interval): candles appended}."""
+        return {(s.upper(), i): self.download(s, i, start_ms, end_ms) for s in symbols for i in intervals}
+
+
+def download_klines(symbols, intervals, start_ms=None, end_ms=None, client=None):
+    """Download (or resume) klines for every symbol/interval into the default store."""
+    return KlinesDownloader(client=client).download_many(symbols, intervals, start_ms, end_ms)
+
+
+def load_klines(symbol, interval, start_ms=None, end_ms=None):
+    """Memory-map a stored series from the default store."""
+    return KlineStore().load(symbol, interval, start_ms, end_ms)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python src/klines_store.py SYMBOL[,SYMBOL...] INTERVAL[,INTERVAL...] [DAYS]")
+        sys.exit(1)
+
+    symbols = [s for s in sys.argv[1].upper().split(",") if s]
+    intervals = [i for i in sys.argv[2].split(",") if i]
+    try:
+        for interval in intervals:
+            interval_ms(interval)
+        start = None
+        if len(sys.argv) == 4:
+            start = int(time.time() * 1000) - int(float(sys.argv[3]) * 86_400_000)
+        added = download_klines(symbols, intervals, start_ms=start)
+    except Exception as e:
+        print(f"❌ Download failed: {e}")
+        sys.exit(1)
+
+    store = KlineStore()
+    for (symbol, interval), count in added.items():
+        print(f"✅ {symbol} {interval}: +{count} candles, {len(store.load(symbol, interval))} stored")
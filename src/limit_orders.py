@@ -1,34 +1,57 @@
 # src/limit_orders.py (FINAL)
 import sys
+
+if __name__ == "__main__":
+    # Hand the command to a running order daemon before paying for the imports below
+    from daemon_client import forward_cli
+    forward_cli('limit', sys.argv[1:])
+
 import logging
 from utils import get_client, validate_order 
+from metrics import METRICS, span, timed
+from journal import journal_order
+from order_submit import OrderStatusUnknown, new_client_order_id, submit_order
 from binance.exceptions import BinanceAPIException # Ensure imported for better error catching
 
-logging.basicConfig(filename="bot.log", level=logging.INFO, format="%(asctime)s %(message)s")
 logger = logging.getLogger(__name__)
 
-def place_limit_order(symbol, side, quantity, price):
-    client = get_client()
+@timed('order', order_type='limit')
+def place_limit_order(symbol, side, quantity, price, client=None, strategy='limit', strategy_id=None, client_order_id=None, lookup_first=False):
+    # One id per logical order: resends after a timeout are deduplicated by it
+    client_order_id = client_order_id or new_client_order_id(strategy)
+    if client is None:
+        with span('client', order_type='limit'):
+            client = get_client()
     try:
         # Call validation function
-        validate_order(symbol, side, quantity, price) 
+        with span('validate', order_type='limit'):
+            # Send the exact quantity and price the filters accepted
+            quantity, price = validate_order(symbol, side, quantity, price, client=client, order_type='LIMIT')
         
-        order = client.futures_create_order(
-            symbol=symbol,
-            side=side,
-            type="LIMIT",
-            timeInForce="GTC",
-            quantity=quantity,
-            price=price
-        )
+        with span('submit', order_type='limit'):
+            order = submit_order(client, dict(
+                symbol=symbol,
+                side=side,
+                type="LIMIT",
+                timeInForce="GTC",
+                quantity=quantity,
+                price=price,
+                newClientOrderId=client_order_id,
+            ), lookup_first=lookup_first)
         # Use a more consistent log format
-        logging.info(f"LIMIT_ORDER_SUCCESS: Symbol={symbol}, Side={side}, OrderID={order.get('orderId')}") 
+        logger.info("LIMIT_ORDER_SUCCESS: Symbol=%s, Side=%s", symbol, side, extra={'order': order})
+        journal_order(order, strategy=strategy, strategy_id=strategy_id)
         # 🟢 FIX: Return the order object
         return order
         
     except Exception as e:
         # Log the error, but re-raise for Streamlit
-        logging.error(f"LIMIT_ORDER_ERROR: {e}")
+        logger.error("LIMIT_ORDER_ERROR: Symbol=%s: %s", symbol, e)
+        METRICS.inc('bot_order_errors_total', order_type='limit')
+        # An unknown outcome may still have placed the order
+        event = 'unknown' if isinstance(e, OrderStatusUnknown) else 'rejected'
+        journal_order({'symbol': symbol, 'side': side, 'type': 'LIMIT', 'quantity': quantity, 'price': price,
+                       'newClientOrderId': client_order_id}, event, strategy, strategy_id, str(e))
         # 🟢 FIX: Re-raise the exception
         raise 
 
@@ -0,0 +1,138 @@
+# src/log_config.py
+import os
+import json
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+# --- Configuration ---
+LOG_FILE = os.getenv("LOG_FILE", "bot.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Size-based rotation (bytes, 0 = off) ...
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(20 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+# ... or time-based rotation, e.g. "midnight" or "H" (takes precedence when set)
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "")
+
+# Order fields kept in log records; the full response is never dumped
+ORDER_LOG_FIELDS = ('orderId', 'clientOrderId', 'symbol', 'side', 'type', 'status',
+                    'origQty', 'executedQty', 'price', 'avgPrice', 'stopPrice', 'reduceOnly')
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def compact_order(order):
+    """The identifying fields of an order response, for log records."""
+    if not isinstance(order, dict):
+        return order
+    return {k: order[k] for k in ORDER_LOG_FIELDS if k in order and order[k] not in (None, '', '0', '0.0', False)}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: ts, level, logger, msg, plus every `extra=` field.
+
+    An `order` extra is reduced to compact_order() here, on the writer thread,
+    so callers can pass the raw response without paying for it.
+    """
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f".{int(record.msecs):03d}",
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith('_'):
+                entry[key] = compact_order(value) if key == 'order' else value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+# Argument types that cannot change between the call and the write
+_IMMUTABLE = {str, int, float, bool, bytes, type(None)}
+_CONTAINERS = {dict, list, set}
+# Attribute count of a record logged without `extra=`
+_RECORD_ATTRS = len(vars(logging.LogRecord('', 0, '', 0, '', (), None)))
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    QueueHandler that enqueues the record almost untouched.
+
+    The stock prepare() renders the message in the calling thread; here
+    msg % args and every field are formatted by the listener instead, so the
+    caller only pays for a queue put. Only values the caller could still
+    mutate are pinned down first: a message with a mutable argument is
+    rendered now, and container extras (the `order` dict) are copied.
+    """
+
+    def prepare(self, record):
+        args = record.args
+        if args:
+            for arg in (args.values() if isinstance(args, dict) else args):
+                if type(arg) not in _IMMUTABLE:
+                    record.msg, record.args = record.getMessage(), None
+                    break
+        attrs = record.__dict__
+        if len(attrs) > _RECORD_ATTRS:
+            for key in attrs.keys() - _RESERVED:
+                if type(attrs[key]) in _CONTAINERS:
+                    attrs[key] = attrs[key].copy()
+        return record
+
+
+_LISTENER = None
+_LOCK = threading.Lock()
+
+
+def _file_handler(path):
+    if LOG_ROTATE_WHEN:
+        return TimedRotatingFileHandler(path, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    return RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+
+
+def setup_logging(path=LOG_FILE, level=LOG_LEVEL, force=False):
+    """
+    Route the root logger through a queue to a background JSON-lines writer.
+
+    Like logging.basicConfig(), does nothing if the root logger already has
+    handlers (unless force=True), so an embedding application keeps control.
+    """
+    global _LISTENER
+    with _LOCK:
+        root = logging.getLogger()
+        if root.handlers and not force:
+            return
+        if force:
+            shutdown_logging()
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+
+        handler = _file_handler(path)
+        handler.setFormatter(JsonFormatter())
+        log_queue = queue.SimpleQueue()  # Unbounded: put() never blocks the order thread
+        _LISTENER = QueueListener(log_queue, handler, respect_handler_level=True)
+        _LISTENER.start()
+        root.addHandler(LazyQueueHandler(log_queue))
+        root.setLevel(level)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread."""
+    global _LISTENER
+    if _LISTENER is not None:
+        _LISTENER.stop()
+        for handler in _LISTENER.handlers:
+            handler.close()
+        _LISTENER = None
+
+
+atexit.register(shutdown_logging)
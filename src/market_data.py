@@ -0,0 +1,213 @@
+# src/market_data.py
+import os
+import json
+import time
+import logging
+import threading
+import numpy as np
+import websocket
+from utils import TESTNET_FUTURES_WS_URL
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Symbols subscribed when the feed starts (more can be added with subscribe())
+MARKET_DATA_SYMBOLS = [s for s in os.getenv("MARKET_DATA_SYMBOLS", "BTCUSDT").upper().split(",") if s]
+# A symbol with no update for this many seconds is reported as stale
+STALE_AFTER = float(os.getenv("MARKET_DATA_STALE_AFTER", "5"))
+# Reconnect when the whole connection has been silent this long
+SILENCE_RECONNECT = float(os.getenv("MARKET_DATA_SILENCE_RECONNECT", "15"))
+MAX_RECONNECT_DELAY = 30.0
+
+# Columns of the ticker table
+MARK, BID, ASK, BID_QTY, ASK_QTY, UPDATED = range(6)
+NUM_COLUMNS = 6
+
+
+class MarketDataFeed:
+    """
+    Background mark-price and bookTicker feed for a set of futures symbols.
+
+    Latest values live in one float64 table with a row per symbol, so a price
+    read is a dict lookup plus an array index. The WebSocket runs on a daemon
+    thread and reconnects on its own when it drops or goes silent.
+    """
+
+    def __init__(self, symbols=None, ws_url=TESTNET_FUTURES_WS_URL, stale_after=STALE_AFTER, capacity=64):
+        self.ws_url = ws_url
+        self.stale_after = stale_after
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._table = np.full((capacity, NUM_COLUMNS), np.nan)
+        self._ws = None
+        self._thread = None
+        self._watchdog = None
+        self._stopped = threading.Event()
+        self._last_message = 0.0
+        self._request_id = 0
+        for symbol in symbols or MARKET_DATA_SYMBOLS:
+            self._row(symbol)
+
+    # --- Reads ---
+
+    def latest_price(self, symbol, max_age=None):
+        """Return the latest mark price for symbol, or None if unknown or stale."""
+        row = self._rows.get(symbol)
+        if row is None:
+            return None
+        values = self._table[row]
+        if time.monotonic() - values[UPDATED] > (max_age or self.stale_after):
+            return None
+        price = values[MARK]
+        if price != price:  # NaN: no mark price yet, fall back to the mid
+            price = (values[BID] + values[ASK]) / 2
+        return None if price != price else float(price)
+
+    def best_quote(self, symbol):
+        """Return (bid, bid_qty, ask, ask_qty) for symbol, or None if unknown or stale."""
+        row = self._rows.get(symbol)
+        if row is None or self.is_stale(symbol):
+            return None
+        values = self._table[row]
+        return float(values[BID]), float(values[BID_QTY]), float(values[ASK]), float(values[ASK_QTY])
+
+    def is_stale(self, symbol):
+        row = self._rows.get(symbol)
+        if row is None:
+            return True
+        updated = self._table[row, UPDATED]
+        return updated != updated or time.monotonic() - updated > self.stale_after
+
+    def symbols(self):
+        return list(self._rows)
+
+    # --- Subscription management ---
+
+    def subscribe(self, symbol):
+        """Start streaming symbol if it is not already in the table."""
+        if symbol in self._rows:
+            return
+        self._row(symbol)
+        ws = self._ws
+        if ws is not None and ws.sock and ws.sock.connected:
+            self._request_id += 1
+            ws.send(json.dumps({"method": "SUBSCRIBE", "params": self._streams([symbol]), "id": self._request_id}))
+        logger.info(f"MARKET_DATA_SUBSCRIBE: Symbol={symbol}")
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="market-data", daemon=True)
+        self._thread.start()
+        self._watchdog = threading.Thread(target=self._watch, name="market-data-watchdog", daemon=True)
+        self._watchdog.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._ws is not None:
+            self._ws.close()
+        self._thread = None
+
+    # --- Internals ---
+
+    def _row(self, symbol):
+        with self._lock:
+            row = self._rows.get(symbol)
+            if row is None:
+                row = len(self._rows)
+                if row >= len(self._table):
+                    grown = np.full((len(self._table) * 2, NUM_COLUMNS), np.nan)
+                    grown[:len(self._table)] = self._table
+                    self._table = grown
+                self._rows[symbol] = row
+            return row
+
+    @staticmethod
+    def _streams(symbols):
+        streams = []
+        for symbol in symbols:
+            streams.append(f"{symbol.lower()}@markPrice@1s")
+            streams.append(f"{symbol.lower()}@bookTicker")
+        return streams
+
+    def _run(self):
+        delay = 1.0
+        while not self._stopped.is_set():
+            url = f"{self.ws_url}/stream?streams={'/'.join(self._streams(self.symbols()))}"
+            self._ws = websocket.WebSocketApp(url, on_open=self._on_open, on_message=self._on_message, on_error=self._on_error)
+            started = time.monotonic()
+            self._ws.run_forever(ping_interval=60, ping_timeout=20)
+            if self._stopped.is_set():
+                break
+            # Reset the backoff after a connection that stayed up for a while
+            delay = 1.0 if time.monotonic() - started > 60 else min(delay * 2, MAX_RECONNECT_DELAY)
+            logger.warning(f"MARKET_DATA_RECONNECT: Retrying in {delay:.0f}s")
+            METRICS.inc('bot_retries_total', component='market_data')
+            self._stopped.wait(delay)
+
+    def _watch(self):
+        while not self._stopped.wait(1.0):
+            ws = self._ws
+            if ws is not None and self._last_message and time.monotonic() - self._last_message > SILENCE_RECONNECT:
+                logger.warning("MARKET_DATA_SILENT: No messages received, forcing reconnect")
+                self._last_message = 0.0
+                ws.close()
+
+    def _on_open(self, ws):
+        self._last_message = time.monotonic()
+        logger.info(f"MARKET_DATA_CONNECTED: Symbols={','.join(self.symbols())}")
+
+    def _on_error(self, ws, error):
+        logger.error(f"MARKET_DATA_ERROR: {error}")
+
+    def _on_message(self, ws, message):
+        now = time.monotonic()
+        self._last_message = now
+        data = json.loads(message).get("data")
+        if not data:
+            return
+        row = self._rows.get(data.get("s"))
+        if row is None:
+            return
+
+        values = self._table[row]
+        event = data.get("e")
+        if event == "markPriceUpdate":
+            values[MARK] = float(data["p"])
+        elif event == "bookTicker" or "b" in data:
+            values[BID] = float(data["b"])
+            values[BID_QTY] = float(data["B"])
+            values[ASK] = float(data["a"])
+            values[ASK_QTY] = float(data["A"])
+        else:
+            return
+        values[UPDATED] = now
+
+
+_FEED = None
+_FEED_LOCK = threading.Lock()
+
+
+def get_market_feed():
+    """Return the process-wide MarketDataFeed, starting it on first use."""
+    global _FEED
+    with _FEED_LOCK:
+        if _FEED is None:
+            _FEED = MarketDataFeed().start()
+        return _FEED
+
+
+def peek_price(symbol):
+    """Latest streamed price if a feed is already running (never starts one)."""
+    feed = _FEED
+    return feed.latest_price(symbol) if feed is not None else None
+
+
+def latest_price(symbol):
+    """Return the latest streamed price for symbol (None if stale or not subscribed)."""
+    feed = get_market_feed()
+    feed.subscribe(symbol)
+    return feed.latest_price(symbol)
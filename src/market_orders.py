@@ -1,36 +1,56 @@
 import sys
+
+if __name__ == "__main__":
+    # Hand the command to a running order daemon before paying for the imports below
+    from daemon_client import forward_cli
+    forward_cli('market', sys.argv[1:])
+
 import logging
 from utils import get_client, validate_order
+from metrics import METRICS, span, timed
+from journal import journal_order
+from order_submit import OrderStatusUnknown, new_client_order_id, submit_order
 from binance.exceptions import BinanceAPIException # Ensure this is imported
 
-# Configure logging for standalone use (if not configured elsewhere)
-try:
-    logger = logging.getLogger(__name__)
-except NameError:
-    logging.basicConfig(filename="bot.log", level=logging.INFO, format="%(asctime)s %(message)s")
-    logger = logging.getLogger(__name__)
+logger = logging.getLogger(__name__)
 
 
-def place_market_order(symbol, side, quantity):
-    client = get_client()
+@timed('order', order_type='market')
+def place_market_order(symbol, side, quantity, client=None, strategy='market', strategy_id=None, client_order_id=None, lookup_first=False):
+    # One id per logical order: resends after a timeout are deduplicated by it
+    client_order_id = client_order_id or new_client_order_id(strategy)
+    if client is None:
+        with span('client', order_type='market'):
+            client = get_client()
     try:
         # Validate order parameters
-        validate_order(symbol, side, quantity) 
+        with span('validate', order_type='market'):
+            # Send the exact quantity the filters accepted
+            quantity, _ = validate_order(symbol, side, quantity, client=client, order_type='MARKET')
         
-        order = client.futures_create_order(
-            symbol=symbol,
-            side=side.upper(),
-            type="MARKET",
-            quantity=quantity
-        )
+        with span('submit', order_type='market'):
+            order = submit_order(client, dict(
+                symbol=symbol,
+                side=side.upper(),
+                type="MARKET",
+                quantity=quantity,
+                newClientOrderId=client_order_id,
+            ), lookup_first=lookup_first)
         
-        logging.info(f"Market Order SUCCESS: {order}")
+        # Raw response goes in as `order`; the log writer keeps only its key fields
+        logger.info("MARKET_ORDER_SUCCESS: Symbol=%s, Side=%s", symbol, side, extra={'order': order})
+        journal_order(order, strategy=strategy, strategy_id=strategy_id)
         
         # 🟢 FIX for Streamlit: Return the order object
         return order
         
     except Exception as e:
-        logging.error(f"Market Order Failed: {str(e)}")
+        logger.error("MARKET_ORDER_ERROR: Symbol=%s: %s", symbol, e)
+        METRICS.inc('bot_order_errors_total', order_type='market')
+        # An unknown outcome may still have placed the order
+        event = 'unknown' if isinstance(e, OrderStatusUnknown) else 'rejected'
+        journal_order({'symbol': symbol, 'side': side, 'type': 'MARKET', 'quantity': quantity,
+                       'newClientOrderId': client_order_id}, event, strategy, strategy_id, str(e))
         # 🟢 FIX for Streamlit: Re-raise the exception for the UI wrapper to catch
         raise 
 
@@ -0,0 +1,329 @@
+# src/metrics.py
+import os
+import time
+import logging
+import threading
+import functools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Port of the Prometheus text endpoint started by serve_metrics()
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+# Interface it binds to; loopback only unless a scraper on another host needs it (e.g. 0.0.0.0)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# Histogram resolution: 2**SUB_BUCKET_BITS sub-buckets per power of two (~1.6% error at 7)
+SUB_BUCKET_BITS = 7
+# Quantiles exported for every histogram
+EXPORT_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class Histogram:
+    """
+    HDR-style log-linear histogram of integer microsecond values.
+
+    Values below 2**SUB_BUCKET_BITS get one bucket each; above that, every
+    power of two is split into 2**(SUB_BUCKET_BITS - 1) equal buckets, so the
+    relative error of any percentile is bounded no matter how large the value.
+    Recording is O(1) and memory grows only with the range actually seen.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    @staticmethod
+    def _index(value):
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        if shift <= 0:
+            return value
+        return (shift << (SUB_BUCKET_BITS - 1)) + (value >> shift)
+
+    @staticmethod
+    def _value(index):
+        # Midpoint of the bucket, inverse of _index
+        half = 1 << (SUB_BUCKET_BITS - 1)
+        if index < 2 * half:
+            return index
+        shift = (index >> (SUB_BUCKET_BITS - 1)) - 1
+        mantissa = index - (shift << (SUB_BUCKET_BITS - 1))
+        return (mantissa << shift) + ((1 << shift) >> 1)
+
+    def record(self, micros):
+        value = max(0, int(micros))
+        index = self._index(value)
+        with self._lock:
+            self._counts[index] = self._counts.get(index, 0) + 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, q):
+        """Value (us) at quantile q in [0, 1], or None if nothing was recorded."""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = max(1, round(q * self.count))
+            seen = 0
+            for index in sorted(self._counts):
+                seen += self._counts[index]
+                if seen >= rank:
+                    return min(self._value(index), self.max)
+            return self.max
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+            self.count = self.sum = self.max = 0
+
+
+class _Span:
+    # A plain class rather than @contextmanager: spans sit on the order hot path
+    __slots__ = ('hist', 'start')
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.record((time.perf_counter_ns() - self.start) // 1000)
+        return False
+
+
+class Metrics:
+    """
+    Process-wide registry of latency histograms, counters and gauges.
+
+    Series are keyed by name plus a sorted label tuple. span() times a block
+    into the `bot_stage_seconds` histogram labelled with the stage name.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+    def histogram(self, name, **labels):
+        key = self._key(name, labels)
+        hist = self._histograms.get(key)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(key, Histogram())
+        return hist
+
+    def inc(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def span(self, stage, **labels):
+        """Context manager recording the wall time of the enclosed block as one sample of `stage`."""
+        return _Span(self.histogram('bot_stage_seconds', stage=stage, **labels))
+
+    def timed(self, stage, **labels):
+        """Decorator form of span()."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(stage, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+    # --- Export ---
+
+    def snapshot(self):
+        """Plain-dict view for the dashboard: latency percentiles in ms, counters and gauges."""
+        with self._lock:
+            histograms = list(self._histograms.items())
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+        rows = []
+        for (name, labels), hist in histograms:
+            if not hist.count:
+                continue
+            row = dict(labels)
+            row.update({
+                'count': hist.count,
+                'p50_ms': hist.percentile(0.5) / 1000,
+                'p99_ms': hist.percentile(0.99) / 1000,
+                'max_ms': hist.max / 1000,
+            })
+            rows.append(row)
+        return {
+            'latency': rows,
+            'counters': {self._series(n, l): v for (n, l), v in counters.items()},
+            'gauges': {self._series(n, l): v for (n, l), v in gauges.items()},
+        }
+
+    @staticmethod
+    def _series(name, labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return name
+        body = ','.join(f'{k}="{v}"' for k, v in pairs)
+        return f"{name}{{{body}}}"
+
+    def render_prometheus(self):
+        """Prometheus text exposition (histograms are exported as summaries, in seconds)."""
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+
+        lines = []
+        typed = set()
+        for (name, labels), hist in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} summary")
+                typed.add(name)
+            for q in EXPORT_QUANTILES:
+                value = hist.percentile(q)
+                if value is not None:
+                    lines.append(f"{self._series(name, labels, [('quantile', q)])} {value / 1e6:.6f}")
+            lines.append(f"{self._series(name + '_sum', labels)} {hist.sum / 1e6:.6f}")
+            lines.append(f"{self._series(name + '_count', labels)} {hist.count}")
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{self._series(name, labels)} {value}")
+        for (name, labels), value in gauges:
+            if name not in typed:
+                lines.append(f"# TYPE {name} gauge")
+                typed.add(name)
+            lines.append(f"{self._series(name, labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
+
+
+def span(stage, **labels):
+    """Shorthand for METRICS.span()."""
+    return METRICS.span(stage, **labels)
+
+
+def timed(stage, **labels):
+    """Shorthand for METRICS.timed()."""
+    return METRICS.timed(stage, **labels)
+
+
+# --- Client instrumentation ---
+
+def _endpoint(url):
+    # https://host/fapi/v1/order -> order (keeps label cardinality bounded)
+    return urlsplit(url).path.split('/', 3)[-1]
+
+
+def instrument_client(client, metrics=METRICS):
+    """
+    Time signing and HTTP round trips of a python-binance Client and track
+    the rate-limit headers and API rejects of every response. The network
+    span covers the exchange's own processing time as well.
+    """
+    if getattr(client, '_metrics_instrumented', False):
+        return client
+    generate_signature = client._generate_signature
+    session_request = client.session.request
+    request = client._request
+
+    sign_hist = metrics.histogram('bot_stage_seconds', stage='sign')
+
+    def timed_signature(data):
+        start = time.perf_counter_ns()
+        try:
+            return generate_signature(data)
+        finally:
+            sign_hist.record((time.perf_counter_ns() - start) // 1000)
+
+    def timed_session_request(method, url, *args, **kwargs):
+        endpoint = _endpoint(url)
+        with metrics.span('network', endpoint=endpoint):
+            response = session_request(method, url, *args, **kwargs)
+        headers = response.headers
+        if 'X-MBX-USED-WEIGHT-1M' in headers:
+            metrics.set('bot_used_weight_1m', int(headers['X-MBX-USED-WEIGHT-1M']))
+        if 'X-MBX-ORDER-COUNT-10S' in headers:
+            metrics.set('bot_order_count_10s', int(headers['X-MBX-ORDER-COUNT-10S']))
+        if 'X-MBX-ORDER-COUNT-1M' in headers:
+            metrics.set('bot_order_count_1m', int(headers['X-MBX-ORDER-COUNT-1M']))
+        metrics.inc('bot_requests_total', endpoint=endpoint, status=response.status_code)
+        return response
+
+    def counted_request(method, uri, signed, force_params=False, **kwargs):
+        try:
+            return request(method, uri, signed, force_params, **kwargs)
+        except Exception as e:
+            code = getattr(e, 'code', None)
+            if code is not None:
+                metrics.inc('bot_rejects_total', endpoint=_endpoint(uri), code=code)
+            raise
+
+    client._generate_signature = timed_signature
+    client.session.request = timed_session_request
+    client._request = counted_request
+    client._metrics_instrumented = True
+    return client
+
+
+# --- Prometheus endpoint ---
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = METRICS.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_SERVER = None
+_SERVER_LOCK = threading.Lock()
+
+
+def serve_metrics(port=METRICS_PORT, host=METRICS_HOST):
+    """Start the /metrics endpoint once per process; returns the server, or None if the port is taken."""
+    global _SERVER
+    with _SERVER_LOCK:
+        if _SERVER is None:
+            try:
+                _SERVER = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                logger.warning(f"METRICS_SERVER_ERROR: Port={port}: {e}")
+                return None
+            _SERVER.daemon_threads = True
+            threading.Thread(target=_SERVER.serve_forever, name="metrics-http", daemon=True).start()
+            logger.info(f"METRICS_SERVER_STARTED: http://{host}:{port}/metrics")
+        return _SERVER
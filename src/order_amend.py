@@ -0,0 +1,342 @@
+# src/order_amend.py
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from urllib.parse import quote
+from utils import get_client, get_symbol_filters
+from account_state import get_account_state, peek_account_state, TERMINAL_STATUSES
+from market_data import get_market_feed, peek_price
+from batch_orders import MAX_BATCH_SIZE, OrderRejected, _to_wire
+from metrics import METRICS, span, timed
+from journal import journal_order
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Minimum seconds between two amends of the same order; targets arriving in between are coalesced
+REPRICE_MIN_INTERVAL = float(os.getenv("REPRICE_MIN_INTERVAL", "0.2"))
+# How often pegged orders are compared with the streamed best bid/ask
+PEG_POLL_INTERVAL = float(os.getenv("PEG_POLL_INTERVAL", "0.1"))
+
+NO_NEED_TO_MODIFY = -5027
+ORDER_DOES_NOT_EXIST = -2013
+# Amend responses kept until the user data stream has caught up with them
+MAX_REMEMBERED_AMENDS = 1024
+
+_AMENDED = OrderedDict()
+_AMENDED_LOCK = threading.Lock()
+
+
+def _remember(order):
+    with _AMENDED_LOCK:
+        _AMENDED[order['orderId']] = order
+        _AMENDED.move_to_end(order['orderId'])
+        while len(_AMENDED) > MAX_REMEMBERED_AMENDS:
+            _AMENDED.popitem(last=False)
+
+
+def _resting_order(client, symbol, order_id=None, client_order_id=None):
+    # Side/qty/price of the order as it rests now: streamed state if a stream is already running, else one REST
+    # lookup (starting the stream would cost a listenKey, a socket and a three-call resync).
+    # The stream may not have delivered our own last amend yet, so the newer of the two wins.
+    state = peek_account_state()
+    for order in state.open_orders(symbol) if state is not None else ():
+        if order['orderId'] == order_id or (client_order_id and order.get('clientOrderId') == client_order_id):
+            with _AMENDED_LOCK:
+                amended = _AMENDED.get(order['orderId'])
+                if amended is not None and amended.get('updateTime', 0) <= order.get('updateTime', 0):
+                    del _AMENDED[order['orderId']]
+                    amended = None
+            return amended or order
+    ref = {'orderId': order_id} if order_id is not None else {'origClientOrderId': client_order_id}
+    return client.futures_get_order(symbol=symbol, **ref)
+
+
+def _amendment(client, symbol, order_id=None, client_order_id=None, price=None, quantity=None, side=None):
+    """Complete, validated modify parameters (the endpoint wants side, quantity and price every time)."""
+    if order_id is None and client_order_id is None:
+        raise ValueError("Pass order_id or client_order_id.")
+    if side is None or price is None or quantity is None:
+        resting = _resting_order(client, symbol, order_id, client_order_id)
+        side = side or resting['side']
+        price = float(resting['price']) if price is None else price
+        quantity = float(resting['origQty']) if quantity is None else quantity
+    # An amend adds no order, so MAX_NUM_ORDERS does not apply
+    quantity, price = get_symbol_filters(symbol, client).check(quantity, price, 'LIMIT', mark_price=peek_price(symbol))
+    params = {'symbol': symbol, 'side': side, 'quantity': quantity, 'price': price}
+    if order_id is not None:
+        params['orderId'] = order_id
+    else:
+        params['origClientOrderId'] = client_order_id
+    return params
+
+
+@timed('order', order_type='amend')
+def amend_order(symbol, order_id=None, price=None, quantity=None, side=None, client=None, client_order_id=None,
+                strategy='amend', strategy_id=None):
+    """
+    Change the price and/or quantity of a resting LIMIT order in place
+    (PUT /fapi/v1/order): one request instead of a cancel plus a new order,
+    and the order is never off the book in between. Only a quantity
+    decrease keeps queue priority; a new price re-queues it at that level.
+    Missing side/price/quantity are taken from the order as it rests.
+    """
+    if client is None:
+        with span('client', order_type='amend'):
+            client = get_client()
+    try:
+        with span('validate', order_type='amend'):
+            params = _amendment(client, symbol, order_id, client_order_id, price, quantity, side)
+        with span('submit', order_type='amend'):
+            order = client.futures_modify_order(**params)
+        _remember(order)
+        logger.info("AMEND_ORDER_SUCCESS: Symbol=%s, Price=%s, Qty=%s", symbol, params['price'], params['quantity'], extra={'order': order})
+        journal_order(order, 'amended', strategy, strategy_id)
+        return order
+    except Exception as e:
+        logger.error("AMEND_ORDER_ERROR: Symbol=%s, ID=%s: %s", symbol, order_id or client_order_id, e)
+        METRICS.inc('bot_order_errors_total', order_type='amend')
+        raise
+
+
+def _put_batch(client, amendments):
+    # futures_v1_put_batch_orders signs the JSON as is but sends it form-encoded, which fails with -1022.
+    # Percent-encode the list before signing, as futures_cancel_orders does, so it goes out exactly as signed
+    batch = quote(json.dumps([_to_wire(a) for a in amendments], separators=(',', ':')))
+    return client._request_futures_api("put", "batchOrders", True, data={'batchOrders': batch}, force_params=True)
+
+
+def amend_orders(amendments, client=None, strategy='amend', strategy_id=None):
+    """
+    Amend many resting LIMIT orders through PUT batchOrders, up to
+    MAX_BATCH_SIZE per request. Each amendment is a dict of amend_order
+    arguments (symbol, order_id or client_order_id, price, quantity, side).
+    Returns one {'order': ..., 'error': ...} dict per amendment, in order.
+    """
+    if client is None:
+        client = get_client()
+
+    results = [{'order': None, 'error': None} for _ in amendments]
+    pending = []
+    for i, a in enumerate(amendments):
+        try:
+            with span('validate', order_type='amend'):
+                pending.append((i, _amendment(client, a['symbol'], a.get('order_id'), a.get('client_order_id'),
+                                              a.get('price'), a.get('quantity'), a.get('side'))))
+        except Exception as e:
+            results[i]['error'] = str(e)
+
+    for start in range(0, len(pending), MAX_BATCH_SIZE):
+        group = pending[start:start + MAX_BATCH_SIZE]
+        try:
+            with span('submit', order_type='amend'):
+                responses = _put_batch(client, [params for _, params in group])
+        except Exception as e:
+            logger.error(f"AMEND_BATCH_ERROR: {len(group)} amendments failed: {e}")
+            for i, _ in group:
+                results[i]['error'] = str(e)
+            continue
+        for (i, _), resp in zip(group, responses):
+            if 'orderId' in resp:
+                results[i]['order'] = resp
+                _remember(resp)
+                journal_order(resp, 'amended', strategy, strategy_id)
+            else:
+                results[i]['error'] = str(OrderRejected(resp.get('code'), resp.get('msg')))
+                METRICS.inc('bot_rejects_total', endpoint='batchOrders', code=resp.get('code'))
+
+    amended = sum(1 for r in results if r['order'])
+    logger.info("AMEND_BATCH_RESULT: Amended=%d, Failed=%d", amended, len(amendments) - amended)
+    return results
+
+
+class Repricer:
+    """
+    Coalescing price chaser for resting LIMIT orders.
+
+    reprice() only records the latest target of an order; one worker sends
+    it once the order's last amend is REPRICE_MIN_INTERVAL old, so a burst
+    of targets costs one request and superseded prices are never sent.
+    Targets due together go out in PUT batchOrders requests. peg() keeps an
+    order at the streamed best bid (BUY) or ask (SELL), offset by whole ticks
+    away from the touch. Orders that fill or are cancelled are dropped.
+    """
+
+    def __init__(self, client=None, min_interval=REPRICE_MIN_INTERVAL, peg_interval=PEG_POLL_INTERVAL):
+        self.client = client or get_client()
+        self.min_interval = min_interval
+        self.peg_interval = peg_interval
+        self.feed = None
+        self._orders = {}   # orderId -> {'symbol', 'filters', 'side', 'quantity', 'price', 'updated', 'target', 'sent_at', 'peg'}
+        self._cond = threading.Condition()
+        get_account_state(self.client).add_listener(self._on_order_update)
+        self._thread = threading.Thread(target=self._run, name="repricer", daemon=True)
+        self._thread.start()
+
+    # --- Handles ---
+
+    def reprice(self, symbol, order_id, price):
+        """Move order_id to price as soon as its rate allows; a later call replaces this target."""
+        self._track(symbol, order_id)
+        with self._cond:
+            if order_id in self._orders:
+                self._orders[order_id]['target'] = price
+                self._cond.notify()
+
+    def peg(self, symbol, order_id, offset_ticks=0):
+        """Keep order_id offset_ticks behind the touch on its own side of the book."""
+        if self.feed is None:
+            self.feed = get_market_feed()
+        self.feed.subscribe(symbol)
+        self._track(symbol, order_id)
+        with self._cond:
+            if order_id in self._orders:
+                self._orders[order_id]['peg'] = offset_ticks
+                self._cond.notify()
+
+    def forget(self, order_id):
+        with self._cond:
+            self._orders.pop(order_id, None)
+
+    def orders(self):
+        with self._cond:
+            return {order_id: dict(entry) for order_id, entry in self._orders.items()}
+
+    # --- Internals ---
+
+    def _track(self, symbol, order_id):
+        with self._cond:
+            if order_id in self._orders:
+                return
+        # Looked up outside the lock: both may cost a REST call
+        resting = _resting_order(self.client, symbol, order_id)
+        filters = get_symbol_filters(symbol, self.client)
+        with self._cond:
+            self._orders.setdefault(order_id, {
+                'symbol': symbol, 'filters': filters, 'side': resting['side'], 'quantity': float(resting['origQty']),
+                'price': float(resting['price']), 'updated': resting.get('updateTime', 0),
+                'target': None, 'sent_at': 0.0, 'peg': None,
+            })
+
+    def _on_order_update(self, order):
+        with self._cond:
+            entry = self._orders.get(order['orderId'])
+            if entry is None:
+                return
+            if order['status'] in TERMINAL_STATUSES:
+                del self._orders[order['orderId']]
+                return
+            if order['updateTime'] < entry['updated']:
+                return  # Event of an amend whose response was already applied
+            entry['updated'] = order['updateTime']
+            entry['price'] = float(order['price'])
+            entry['quantity'] = float(order['origQty'])
+
+    def _peg_targets(self):
+        # Caller holds self._cond: nothing here may block (filters were resolved in _track)
+        for entry in self._orders.values():
+            if entry['peg'] is None or self.feed is None:
+                continue
+            quote = self.feed.best_quote(entry['symbol'])
+            if quote is None:
+                continue
+            bid, _, ask, _ = quote
+            filters = entry['filters']
+            tick = filters.tick / filters.price_scale
+            touch = bid - entry['peg'] * tick if entry['side'] == 'BUY' else ask + entry['peg'] * tick
+            entry['target'] = filters.normalize(entry['quantity'], touch, 'LIMIT')[1]
+
+    def _due(self, now):
+        # Caller holds self._cond: targets that differ from the resting price and whose interval has passed
+        due, wait = [], None
+        for order_id, entry in self._orders.items():
+            target = entry['target']
+            if target is None or target == entry['price']:
+                entry['target'] = None
+                continue
+            ready_at = entry['sent_at'] + self.min_interval
+            if ready_at <= now:
+                due.append({'symbol': entry['symbol'], 'order_id': order_id, 'side': entry['side'],
+                            'quantity': entry['quantity'], 'price': target})
+                entry['target'], entry['sent_at'] = None, now
+            else:
+                wait = min(wait or ready_at - now, ready_at - now)
+        return due, wait
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if any(e['peg'] is not None for e in self._orders.values()):
+                    self._peg_targets()
+                due, wait = self._due(time.monotonic())
+                if not due:
+                    if any(e['peg'] is not None for e in self._orders.values()):
+                        wait = min(wait or self.peg_interval, self.peg_interval)
+                    self._cond.wait(wait)
+                    continue
+            try:
+                self._send(due)
+            except Exception as e:
+                logger.error(f"REPRICE_ERROR: {len(due)} amendments: {e}")
+
+    def _send(self, due):
+        # A single target costs weight 1 on the order endpoint instead of 5 on batchOrders
+        if len(due) == 1:
+            try:
+                results = [{'order': amend_order(**due[0], client=self.client, strategy='reprice'), 'error': None}]
+            except Exception as e:
+                results = [{'order': None, 'error': str(e)}]
+        else:
+            results = amend_orders(due, client=self.client, strategy='reprice')
+        with self._cond:
+            for amendment, result in zip(due, results):
+                entry = self._orders.get(amendment['order_id'])
+                if entry is None:
+                    continue
+                if result['order']:
+                    entry['price'] = float(result['order']['price'])
+                    entry['updated'] = result['order'].get('updateTime', entry['updated'])
+                elif f"code={ORDER_DOES_NOT_EXIST})" in result['error']:
+                    del self._orders[amendment['order_id']]  # Filled or cancelled before the stream said so
+                elif f"code={NO_NEED_TO_MODIFY})" not in result['error']:
+                    logger.warning(f"REPRICE_FAILED: ID={amendment['order_id']}, Price={amendment['price']}: {result['error']}")
+        METRICS.inc('bot_reprices_total', amount=len(due))
+
+
+_REPRICER = None
+_LOCK = threading.Lock()
+
+
+def get_repricer(client=None):
+    """Return the process-wide Repricer, starting its worker on first use."""
+    global _REPRICER
+    with _LOCK:
+        if _REPRICER is None:
+            _REPRICER = Repricer(client)
+        return _REPRICER
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (4, 5):
+        print("Usage: python src/order_amend.py <symbol> <order_id> <price> [quantity]")
+        sys.exit(1)
+
+    try:
+        symbol = sys.argv[1].upper()
+        order_id = int(sys.argv[2])
+        price = float(sys.argv[3])
+        quantity = float(sys.argv[4]) if len(sys.argv) == 5 else None
+    except ValueError:
+        print("Error: order_id must be an integer, price and quantity numbers.")
+        sys.exit(1)
+
+    try:
+        result = amend_order(symbol, order_id, price=price, quantity=quantity)
+        print("✅ Order amended successfully.")
+        print(result)
+    except Exception as e:
+        print(f"❌ Error: {e}")
@@ -0,0 +1,295 @@
+# src/order_book.py
+import os
+import json
+import time
+import logging
+import threading
+from bisect import bisect_left
+import websocket
+from utils import TESTNET_FUTURES_WS_URL, get_client
+from metrics import METRICS
+from rate_limiter import critical_reads
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+ORDER_BOOK_SNAPSHOT_LIMIT = int(os.getenv("ORDER_BOOK_SNAPSHOT_LIMIT", "1000"))
+ORDER_BOOK_STREAM_SPEED = os.getenv("ORDER_BOOK_STREAM_SPEED", "100ms")
+MAX_RECONNECT_DELAY = 30.0
+
+
+class OrderBook:
+    """
+    Local L2 mirror of one futures order book.
+
+    Each side is a pair of parallel sorted lists (price keys, quantities).
+    Bids are keyed by negated price so both sides sort best-first, and every
+    level lookup is a bisect. Updates come from apply_diff(); a sequence gap
+    marks the book out of sync so the owner can reload a snapshot.
+    """
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self._lock = threading.RLock()
+        self._bid_keys, self._bid_qtys = [], []
+        self._ask_keys, self._ask_qtys = [], []
+        self.last_update_id = 0
+        self.synced = False
+        self.updated_at = 0.0
+
+    # --- Updates ---
+
+    def load_snapshot(self, snapshot):
+        """Replace the book with a futures_order_book() response."""
+        with self._lock:
+            bids = sorted((-float(p), float(q)) for p, q in snapshot['bids'] if float(q) > 0)
+            asks = sorted((float(p), float(q)) for p, q in snapshot['asks'] if float(q) > 0)
+            self._bid_keys, self._bid_qtys = [k for k, _ in bids], [q for _, q in bids]
+            self._ask_keys, self._ask_qtys = [k for k, _ in asks], [q for _, q in asks]
+            self.last_update_id = snapshot['lastUpdateId']
+            self.synced = False
+            self.updated_at = time.monotonic()
+
+    def apply_diff(self, event):
+        """
+        Apply one depthUpdate event. Returns False on a sequence gap, after
+        which the book must be reloaded from a snapshot.
+        """
+        with self._lock:
+            if event['u'] < self.last_update_id:
+                return True  # Older than the snapshot
+            if not self.synced:
+                # First event after a snapshot must straddle lastUpdateId
+                if event['U'] > self.last_update_id:
+                    return False
+                self.synced = True
+            elif event['pu'] != self.last_update_id:
+                self.synced = False
+                return False
+
+            for p, q in event['b']:
+                self._set_level(self._bid_keys, self._bid_qtys, -float(p), float(q))
+            for p, q in event['a']:
+                self._set_level(self._ask_keys, self._ask_qtys, float(p), float(q))
+            self.last_update_id = event['u']
+            self.updated_at = time.monotonic()
+            return True
+
+    @staticmethod
+    def _set_level(keys, qtys, key, qty):
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            if qty == 0:
+                del keys[i]
+                del qtys[i]
+            else:
+                qtys[i] = qty
+        elif qty != 0:
+            keys.insert(i, key)
+            qtys.insert(i, qty)
+
+    # --- Queries ---
+
+    def best_bid(self):
+        """(price, qty) of the best bid, or None."""
+        with self._lock:
+            return (-self._bid_keys[0], self._bid_qtys[0]) if self._bid_keys else None
+
+    def best_ask(self):
+        """(price, qty) of the best ask, or None."""
+        with self._lock:
+            return (self._ask_keys[0], self._ask_qtys[0]) if self._ask_keys else None
+
+    def _side(self, side):
+        # Liquidity a taker order of `side` consumes: BUY walks the asks
+        if side == 'BUY':
+            return self._ask_keys, self._ask_qtys, 1.0
+        return self._bid_keys, self._bid_qtys, -1.0
+
+    def depth(self, side, max_price_move_bps=None, levels=None):
+        """
+        Cumulative quantity available to a taker order of `side`, optionally
+        limited to the first `levels` levels or to prices within
+        `max_price_move_bps` of the touch.
+        """
+        with self._lock:
+            keys, qtys, sign = self._side(side)
+            if not keys:
+                return 0.0
+            end = len(keys)
+            if max_price_move_bps is not None:
+                limit = keys[0] * (1 + max_price_move_bps / 10000) if sign > 0 else keys[0] * (1 - max_price_move_bps / 10000)
+                end = bisect_left(keys, limit + 1e-12)
+            if levels is not None:
+                end = min(end, levels)
+            return sum(qtys[:end])
+
+    def expected_fill_price(self, side, qty):
+        """Average price a taker order of `side` for qty would fill at, or None if the book is too thin."""
+        with self._lock:
+            keys, qtys, sign = self._side(side)
+            remaining, cost = qty, 0.0
+            for key, level_qty in zip(keys, qtys):
+                take = min(remaining, level_qty)
+                cost += take * key * sign
+                remaining -= take
+                if remaining <= 0:
+                    return cost / qty
+            return None
+
+    def would_cross(self, side, price):
+        """True if a limit order of `side` at price would execute immediately."""
+        touch = self.best_ask() if side == 'BUY' else self.best_bid()
+        if touch is None:
+            return False
+        return price >= touch[0] if side == 'BUY' else price <= touch[0]
+
+
+class OrderBookFeed:
+    """
+    Keeps an OrderBook per symbol in sync with the diff-depth stream.
+
+    Events are buffered while a REST snapshot loads and replayed on top of
+    it; any sequence gap triggers a fresh snapshot for that symbol only.
+    """
+
+    def __init__(self, client=None, symbols=(), ws_url=TESTNET_FUTURES_WS_URL):
+        self.client = client or get_client()
+        self.ws_url = ws_url
+        self._books = {}
+        self._buffers = {}
+        self._lock = threading.Lock()
+        self._ws = None
+        self._thread = None
+        self._stopped = threading.Event()
+        self._request_id = 0
+        for symbol in symbols:
+            self._books[symbol] = OrderBook(symbol)
+
+    def book(self, symbol):
+        """Return the OrderBook for symbol, subscribing to it on first use (None until synced)."""
+        book = self._books.get(symbol)
+        if book is None:
+            self.subscribe(symbol)
+            return None
+        return book if book.synced else None
+
+    def subscribe(self, symbol):
+        with self._lock:
+            if symbol in self._books:
+                return
+            self._books[symbol] = OrderBook(symbol)
+        ws = self._ws
+        if ws is not None and ws.sock and ws.sock.connected:
+            self._request_id += 1
+            ws.send(json.dumps({"method": "SUBSCRIBE", "params": [self._stream(symbol)], "id": self._request_id}))
+            self._resync(symbol)
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="order-book", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._ws is not None:
+            self._ws.close()
+        self._thread = None
+
+    @staticmethod
+    def _stream(symbol):
+        return f"{symbol.lower()}@depth@{ORDER_BOOK_STREAM_SPEED}"
+
+    def _run(self):
+        delay = 1.0
+        while not self._stopped.is_set():
+            if not self._books:
+                self._stopped.wait(0.2)
+                continue
+            streams = '/'.join(self._stream(s) for s in list(self._books))
+            self._ws = websocket.WebSocketApp(f"{self.ws_url}/stream?streams={streams}", on_open=self._on_open, on_message=self._on_message)
+            started = time.monotonic()
+            self._ws.run_forever(ping_interval=60, ping_timeout=20)
+            if self._stopped.is_set():
+                break
+            delay = 1.0 if time.monotonic() - started > 60 else min(delay * 2, MAX_RECONNECT_DELAY)
+            logger.warning(f"ORDER_BOOK_RECONNECT: Retrying in {delay:.0f}s")
+            METRICS.inc('bot_retries_total', component='order_book')
+            self._stopped.wait(delay)
+
+    def _on_open(self, ws):
+        # Symbols added while we were connecting are not in the URL yet
+        self._request_id += 1
+        ws.send(json.dumps({"method": "SUBSCRIBE", "params": [self._stream(s) for s in list(self._books)], "id": self._request_id}))
+        for symbol in list(self._books):
+            self._resync(symbol)
+
+    def _resync(self, symbol):
+        """Buffer live events for symbol and load a snapshot on a worker thread."""
+        with self._lock:
+            if symbol in self._buffers:
+                return  # Already resyncing
+            self._buffers[symbol] = []
+        threading.Thread(target=self._load_snapshot, args=(symbol,), name=f"order-book-snapshot-{symbol}", daemon=True).start()
+
+    def _load_snapshot(self, symbol):
+        try:
+            with critical_reads():
+                snapshot = self.client.futures_order_book(symbol=symbol, limit=ORDER_BOOK_SNAPSHOT_LIMIT)
+        except Exception as e:
+            logger.error(f"ORDER_BOOK_SNAPSHOT_ERROR: Symbol={symbol}: {e}")
+            with self._lock:
+                self._buffers.pop(symbol, None)
+            return
+
+        book = self._books[symbol]
+        # Snapshot, replay and live diffs all apply under the lock, so the
+        # stream thread never touches the book halfway through a replay
+        with self._lock:
+            book.load_snapshot(snapshot)
+            for event in self._buffers[symbol]:
+                if not book.apply_diff(event):
+                    logger.warning(f"ORDER_BOOK_GAP: Symbol={symbol} during replay, reloading snapshot")
+                    self._buffers[symbol] = []  # Keep buffering for the next snapshot
+                    break
+            else:
+                del self._buffers[symbol]
+                logger.info(f"ORDER_BOOK_SYNCED: Symbol={symbol}, LastUpdateId={book.last_update_id}")
+                return
+        threading.Thread(target=self._load_snapshot, args=(symbol,), name=f"order-book-snapshot-{symbol}", daemon=True).start()
+
+    def _on_message(self, ws, message):
+        event = json.loads(message).get("data")
+        if not event or event.get("e") != "depthUpdate":
+            return
+        symbol = event["s"]
+        with self._lock:
+            buffer = self._buffers.get(symbol)
+            if buffer is not None:
+                buffer.append(event)
+                return
+            book = self._books.get(symbol)
+            if book is None or book.apply_diff(event):
+                return
+        logger.warning(f"ORDER_BOOK_GAP: Symbol={symbol}, reloading snapshot")
+        self._resync(symbol)
+
+
+_FEED = None
+_FEED_LOCK = threading.Lock()
+
+
+def get_order_books(client=None):
+    """Return the process-wide OrderBookFeed, starting it on first use."""
+    global _FEED
+    with _FEED_LOCK:
+        if _FEED is None:
+            _FEED = OrderBookFeed(client).start()
+        return _FEED
+
+
+def get_order_book(symbol, client=None):
+    """Return the synced local book for symbol, or None while it is still loading."""
+    return get_order_books(client).book(symbol)
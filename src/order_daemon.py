@@ -0,0 +1,202 @@
+# src/order_daemon.py
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import socketserver
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "advanced"))
+
+from utils import get_client
+from exchange_info import get_symbol_rules
+from market_data import MARKET_DATA_SYMBOLS, get_market_feed
+from account_state import get_user_stream
+from market_orders import place_market_order
+from limit_orders import place_limit_order
+from batch_orders import place_batch_orders
+from oco import place_oco_conditional_orders
+from oco_manager import get_oco_manager
+from twap import get_scheduler
+from daemon_client import ORDER_DAEMON_SOCKET, DaemonClient, DaemonUnavailable, send_message, recv_message
+
+logger = logging.getLogger(__name__)
+
+
+# --- CLI commands forwarded by the scripts: (usage, argument parsers, handler) ---
+
+def _cli_market(symbol, side, qty):
+    return f"✅ Market order placed successfully.\n{place_market_order(symbol, side, qty)}"
+
+
+def _cli_limit(symbol, side, qty, price):
+    return f"✅ Limit order placed successfully.\n{place_limit_order(symbol, side, qty, price)}"
+
+
+def _cli_batch(orders):
+    return "\n".join(f"✅ {r['order']}" if r['order'] else f"❌ {r['error']}" for r in place_batch_orders(orders))
+
+
+def _cli_oco(symbol, side, qty, tp_price, sl_price):
+    result = place_oco_conditional_orders(symbol, side, qty, tp_price, sl_price, manager=get_oco_manager())
+    return f"✅ OCO-like conditional orders placed successfully.\n{result}"
+
+
+def _cli_twap(symbol, side, total_quantity, duration):
+    # The schedule runs on in the daemon; the CLI returns as soon as it is started
+    job_id = get_scheduler().submit(symbol, side, total_quantity, duration, num_chunks=5)
+    return f"✅ TWAP job {job_id} started in the order daemon ({total_quantity} {side} over {duration}s in 5 chunks)."
+
+
+def _upper(value):
+    return value.upper()
+
+
+CLI_COMMANDS = {
+    'market': ("python src/market_orders.py SYMBOL SIDE QTY", (_upper, _upper, float), _cli_market),
+    'limit': ("python src/limit_orders.py <symbol> <BUY/SELL> <quantity> <price>", (_upper, _upper, float, float), _cli_limit),
+    'batch': ("python src/batch_orders.py '<json list of orders>'", (json.loads,), _cli_batch),
+    'oco': ("python src/advanced/oco.py <symbol> <BUY/SELL> <quantity> <take_profit> <stop_loss>",
+            (_upper, _upper, float, float, float), _cli_oco),
+    'twap': ("python src/advanced/twap.py <symbol> <BUY/SELL> <total_quantity> <duration_seconds>",
+             (_upper, _upper, float, int), _cli_twap),
+}
+
+
+def run_cli(command, argv):
+    """Run a forwarded CLI command; returns {'output', 'exit_code'} as the script would have printed."""
+    usage, parsers, handler = CLI_COMMANDS[command]
+    if len(argv) != len(parsers):
+        return {'output': f"Usage: {usage}", 'exit_code': 1}
+    try:
+        args = [parse(value) for parse, value in zip(parsers, argv)]
+    except ValueError as e:
+        return {'output': f"Error: invalid argument: {e}", 'exit_code': 1}
+    try:
+        return {'output': handler(*args), 'exit_code': 0}
+    except Exception as e:
+        return {'output': f"❌ Error: {e}", 'exit_code': 1}
+
+
+class OrderDaemon:
+    """
+    Resident order process behind a Unix domain socket.
+
+    Keeps the client, exchange rules, market-data and user-data streams,
+    the OCO manager and the TWAP scheduler warm, so a request only costs a
+    socket round trip plus the order itself. Each connection is served on
+    its own thread and may carry any number of requests.
+    """
+
+    def __init__(self, path=ORDER_DAEMON_SOCKET):
+        self.path = path
+        self.started = time.time()
+        self.server = None
+        self.ops = {
+            'ping': self.ping,
+            'cli': run_cli,
+            'market': lambda symbol, side, quantity, **kw: place_market_order(symbol, side, quantity, **kw),
+            'limit': lambda symbol, side, quantity, price, **kw: place_limit_order(symbol, side, quantity, price, **kw),
+            'batch': lambda orders, **kw: place_batch_orders(orders, **kw),
+            'oco': lambda symbol, side, quantity, take_profit, stop_loss: place_oco_conditional_orders(
+                symbol, side, quantity, take_profit, stop_loss, manager=get_oco_manager()),
+            'twap': lambda symbol, side, total_quantity, duration_seconds, num_chunks=10, max_slippage_bps=None:
+                get_scheduler().submit(symbol, side, total_quantity, duration_seconds, num_chunks,
+                                       max_slippage_bps=max_slippage_bps),
+            'twap_progress': lambda job_id=None: get_scheduler().progress(job_id),
+            'twap_cancel': lambda job_id: get_scheduler().cancel(job_id),
+            'open_orders': lambda symbol=None: get_user_stream().state.open_orders(symbol),
+            'positions': lambda: get_user_stream().state.positions(),
+            'shutdown': self.shutdown,
+        }
+
+    def warm_up(self):
+        """Everything a first order would otherwise pay for."""
+        client = get_client()
+        for symbol in MARKET_DATA_SYMBOLS:
+            get_symbol_rules(client, symbol)
+        get_market_feed()
+        get_user_stream(client)
+        get_oco_manager(client)
+        get_scheduler()
+
+    def ping(self):
+        return {'pid': os.getpid(), 'uptime': time.time() - self.started}
+
+    def handle(self, message):
+        op = self.ops.get(message.get('op'))
+        if op is None:
+            return {'ok': False, 'error': f"Unknown op '{message.get('op')}'."}
+        try:
+            result = op(**message.get('args', {}))
+        except Exception as e:
+            return {'ok': False, 'error': str(e)}
+        return {'ok': True, 'result': result}
+
+    def serve_forever(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        try:
+            DaemonClient(self.path, timeout=1.0).close()
+        except DaemonUnavailable:
+            if os.path.exists(self.path):
+                os.unlink(self.path)  # Left behind by a daemon that did not shut down cleanly
+        else:
+            raise RuntimeError(f"An order daemon is already listening on {self.path}.")
+
+        daemon = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                while True:
+                    try:
+                        message = recv_message(self.request)
+                    except (OSError, ValueError) as e:
+                        logger.warning(f"ORDER_DAEMON_BAD_REQUEST: {e}")
+                        return
+                    if message is None:
+                        return
+                    send_message(self.request, daemon.handle(message))
+
+        self.server = socketserver.ThreadingUnixStreamServer(self.path, Handler)
+        self.server.daemon_threads = True
+        os.chmod(self.path, 0o600)
+        logger.info(f"ORDER_DAEMON_LISTENING: {self.path}")
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            logger.info("ORDER_DAEMON_STOPPED")
+
+    def shutdown(self):
+        # serve_forever() is blocked in this very handler's server: stop it from another thread
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+        return True
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in ("status", "stop"):
+        try:
+            result = DaemonClient(timeout=5.0).request('ping' if sys.argv[1] == "status" else 'shutdown')
+        except DaemonUnavailable:
+            print(f"❌ No order daemon on {ORDER_DAEMON_SOCKET}.")
+            sys.exit(1)
+        print(f"✅ Order daemon {'running: ' + str(result) if sys.argv[1] == 'status' else 'stopping.'}")
+        sys.exit(0)
+
+    daemon = OrderDaemon()
+    try:
+        daemon.warm_up()
+    except Exception as e:
+        print(f"❌ Order daemon failed to start: {e}")
+        sys.exit(1)
+    print(f"✅ Order daemon ready on {daemon.path} (Ctrl+C to stop).")
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,202 @@
+# src/order_submit.py
+import os
+import re
+import time
+import logging
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait, FIRST_COMPLETED
+from requests.exceptions import RequestException
+from binance.client import BinanceAPIException, BinanceRequestException
+from metrics import METRICS
+from rate_limiter import RequestShed, critical_reads
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Sends of one logical order before giving up on an unknown outcome
+ORDER_SUBMIT_ATTEMPTS = int(os.getenv("ORDER_SUBMIT_ATTEMPTS", "3"))
+# Seconds before the first resend; doubled after each
+ORDER_RETRY_BACKOFF = float(os.getenv("ORDER_RETRY_BACKOFF", "0.25"))
+# Status reads of one order before its outcome is reported unknown
+ORDER_LOOKUP_ATTEMPTS = int(os.getenv("ORDER_LOOKUP_ATTEMPTS", "4"))
+# Seconds without an answer before an identical second send is raced against the first (0 = off)
+ORDER_HEDGE_AFTER = float(os.getenv("ORDER_HEDGE_AFTER", "0"))
+ORDER_HEDGE_WORKERS = 8
+# The exchange frees a client order id once its order is finished, so an
+# order that can finish on arrival is never sent twice at once
+UNHEDGED_TYPES = {'MARKET'}
+UNHEDGED_TIME_IN_FORCE = {'IOC', 'FOK'}
+
+DUPLICATE_CLIENT_ID = -4116
+ORDER_DOES_NOT_EXIST = -2013
+# Internal error / backend timeout: "execution status unknown"
+UNKNOWN_STATUS_CODES = (-1001, -1006, -1007)
+CLIENT_ORDER_ID_PATTERN = re.compile(r"^[.A-Z:/a-z0-9_-]{1,36}$")
+
+_HEDGE_POOL = None
+_HEDGE_LOCK = threading.Lock()
+
+
+def _reseed_client_order_ids():
+    # One urandom read per process instead of one per order (uuid4); a forked
+    # child must not mint the ids its parent is minting
+    global _ID_PREFIX, _ID_COUNTER
+    _ID_PREFIX = os.urandom(6).hex()
+    _ID_COUNTER = itertools.count()
+
+
+_reseed_client_order_ids()
+os.register_at_fork(after_in_child=_reseed_client_order_ids)
+
+
+def new_client_order_id(strategy, *parts):
+    """
+    newClientOrderId of one logical order: built from parts (e.g. job id and
+    chunk index) so every resend, and a resume after a restart, reuses it;
+    otherwise unique (a per-process random prefix and a counter).
+    """
+    if parts:
+        client_order_id = "-".join([strategy, *(str(p) for p in parts)])
+    else:
+        client_order_id = f"{strategy}-{_ID_PREFIX}{next(_ID_COUNTER):x}"
+    if not CLIENT_ORDER_ID_PATTERN.match(client_order_id):
+        raise ValueError(f"Invalid client order id '{client_order_id}' (max 36 of [.A-Za-z0-9:/_-]).")
+    return client_order_id
+
+
+class OrderStatusUnknown(Exception):
+    """The exchange could not say whether an order exists; it must not be sent again blindly."""
+
+
+def _unknown_outcome(error):
+    # The request may or may not have reached the matching engine
+    if isinstance(error, BinanceAPIException):
+        return error.status_code >= 500 or error.code in UNKNOWN_STATUS_CODES
+    return isinstance(error, (BinanceRequestException, RequestException))
+
+
+def find_order(client, symbol, client_order_id, attempts=ORDER_LOOKUP_ATTEMPTS):
+    """
+    The order placed under client_order_id, or None if the exchange has none.
+    A lookup that cannot tell (5xx, timeout, shed) is retried, never
+    answered with None; OrderStatusUnknown once attempts run out.
+    """
+    delay = ORDER_RETRY_BACKOFF
+    for attempt in range(1, attempts + 1):
+        try:
+            # Deciding whether to resend an order: never shed for polls' sake
+            with critical_reads():
+                return client.futures_get_order(symbol=symbol, origClientOrderId=client_order_id)
+        except BinanceAPIException as e:
+            if e.code == ORDER_DOES_NOT_EXIST:
+                return None
+            if not _unknown_outcome(e):
+                raise
+            error = e
+        except (BinanceRequestException, RequestException, RequestShed) as e:
+            error = e
+        logger.warning(f"ORDER_LOOKUP_FAILED: ClientOrderId={client_order_id}, Attempt={attempt}/{attempts}: {error}")
+        if attempt < attempts:
+            METRICS.inc('bot_retries_total', component='order_lookup')
+            time.sleep(delay)
+            delay *= 2
+    raise OrderStatusUnknown(f"Status of order {client_order_id} unknown after {attempts} lookups: {error}") from error
+
+
+def _hedge_pool():
+    global _HEDGE_POOL
+    with _HEDGE_LOCK:
+        if _HEDGE_POOL is None:
+            _HEDGE_POOL = ThreadPoolExecutor(max_workers=ORDER_HEDGE_WORKERS, thread_name_prefix="order-hedge")
+        return _HEDGE_POOL
+
+
+def _hedgeable(params):
+    return params.get('type') not in UNHEDGED_TYPES and params.get('timeInForce') not in UNHEDGED_TIME_IN_FORCE
+
+
+def _send(client, params, hedge_after):
+    if not hedge_after or not _hedgeable(params):
+        return client.futures_create_order(**params)
+    first = _hedge_pool().submit(client.futures_create_order, **params)
+    try:
+        return first.result(timeout=hedge_after)
+    except FutureTimeout:
+        pass
+    # The first send may have landed and only its answer be slow: read before sending again
+    try:
+        existing = find_order(client, params['symbol'], params['newClientOrderId'], attempts=1)
+    except OrderStatusUnknown:
+        return first.result()
+    if existing is not None:
+        return existing
+    # Same client order id: whichever send lands second is rejected as a duplicate
+    METRICS.inc('bot_hedged_orders_total')
+    second = _hedge_pool().submit(client.futures_create_order, **params)
+    pending = {first, second}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            error = future.exception()
+            if error is None:
+                return future.result()
+            if getattr(error, 'code', None) == DUPLICATE_CLIENT_ID:
+                # The other send landed and is just slow to answer: read it instead of waiting
+                try:
+                    existing = find_order(client, params['symbol'], params['newClientOrderId'])
+                except OrderStatusUnknown:
+                    continue
+                if existing is not None:
+                    return existing
+    raise first.exception()
+
+
+def submit_order(client, params, attempts=ORDER_SUBMIT_ATTEMPTS, hedge_after=ORDER_HEDGE_AFTER, lookup_first=False):
+    """
+    futures_create_order that is safe to retry.
+
+    params must carry newClientOrderId. When a send ends without a clear
+    answer (timeout, 5xx, -1007), the order is looked up by that id and only
+    sent again if the exchange has no such order; a duplicate-id reject
+    means an earlier send landed and returns that order. If the lookup
+    itself cannot tell, OrderStatusUnknown is raised rather than resending.
+    So one logical order is placed at most once however often it is sent.
+
+    The exchange frees a client order id once its order is finished, so an
+    id that may already have been sent (e.g. a chunk resumed after a
+    restart) needs lookup_first=True.
+    """
+    client_order_id = params['newClientOrderId']
+    if lookup_first:
+        existing = find_order(client, params['symbol'], client_order_id)
+        if existing is not None:
+            logger.info(f"ORDER_ALREADY_PLACED: ClientOrderId={client_order_id}, OrderId={existing.get('orderId')}")
+            return existing
+    delay = ORDER_RETRY_BACKOFF
+    for attempt in range(1, attempts + 1):
+        try:
+            return _send(client, params, hedge_after)
+        except BinanceAPIException as e:
+            if e.code == DUPLICATE_CLIENT_ID:
+                # An earlier send landed: only reading it back is left
+                existing = find_order(client, params['symbol'], client_order_id)
+                if existing is not None:
+                    logger.info(f"ORDER_DEDUPLICATED: ClientOrderId={client_order_id}, OrderId={existing.get('orderId')}")
+                    return existing
+            elif not _unknown_outcome(e):
+                raise
+            error = e
+        except (BinanceRequestException, RequestException) as e:
+            error = e
+
+        logger.warning(f"ORDER_OUTCOME_UNKNOWN: ClientOrderId={client_order_id}, Attempt={attempt}/{attempts}: {error}")
+        time.sleep(delay)
+        delay *= 2
+        existing = find_order(client, params['symbol'], client_order_id)
+        if existing is not None:
+            logger.info(f"ORDER_FOUND_AFTER_ERROR: ClientOrderId={client_order_id}, OrderId={existing.get('orderId')}")
+            return existing
+        if attempt < attempts:
+            METRICS.inc('bot_retries_total', component='order')
+    raise error
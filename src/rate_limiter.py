@@ -0,0 +1,408 @@
+# src/rate_limiter.py
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from urllib.parse import urlsplit, unquote
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Share of each limit that read-only polls may use; the rest is kept for orders
+READ_BUDGET = float(os.getenv("RATE_LIMIT_READ_BUDGET", "0.7"))
+# Above this share of the budget, repeated polls are answered from the last result
+COALESCE_ABOVE = float(os.getenv("RATE_LIMIT_COALESCE_ABOVE", "0.5"))
+# How old a coalesced poll result may be (seconds)
+POLL_CACHE_TTL = float(os.getenv("RATE_LIMIT_POLL_CACHE_TTL", "2.0"))
+# Cached poll results are swept for expired entries past this many keys
+RECENT_SWEEP_SIZE = 256
+# Longest an order (or critical read) waits for a window to reset before failing (seconds)
+MAX_ORDER_WAIT = float(os.getenv("RATE_LIMIT_MAX_ORDER_WAIT", "10.0"))
+# Longest an ordinary poll waits for orders or headroom before it is shed (seconds)
+MAX_READ_WAIT = float(os.getenv("RATE_LIMIT_MAX_READ_WAIT", "0.25"))
+
+# Futures defaults, replaced by exchangeInfo rateLimits when known
+DEFAULT_RATE_LIMITS = [
+    {'rateLimitType': 'REQUEST_WEIGHT', 'interval': 'MINUTE', 'intervalNum': 1, 'limit': 2400},
+    {'rateLimitType': 'ORDERS', 'interval': 'SECOND', 'intervalNum': 10, 'limit': 300},
+    {'rateLimitType': 'ORDERS', 'interval': 'MINUTE', 'intervalNum': 1, 'limit': 1200},
+]
+INTERVAL_SECONDS = {'SECOND': 1, 'MINUTE': 60, 'HOUR': 3600, 'DAY': 86400}
+INTERVAL_LETTER = {'SECOND': 'S', 'MINUTE': 'M', 'HOUR': 'H', 'DAY': 'D'}
+
+# Endpoints that place, change or cancel orders (or keep the user stream alive)
+PRIORITY_ENDPOINTS = {'order', 'batchOrders', 'allOpenOrders', 'countdownCancelAll', 'listenKey'}
+
+
+_CRITICAL = contextvars.ContextVar('critical_read', default=False)
+
+
+class RequestShed(Exception):
+    """A read-only request was dropped to keep rate-limit headroom for orders."""
+
+
+@contextmanager
+def critical_reads():
+    """
+    Mark the reads made inside this block as needed for correctness
+    (exchange rules, book snapshots, account resyncs, order lookups): they
+    may use the whole limit and wait for it like orders instead of being
+    shed. A context variable, so it follows asyncio.to_thread() too.
+    """
+    token = _CRITICAL.set(True)
+    try:
+        yield
+    finally:
+        _CRITICAL.reset(token)
+
+
+class _WouldBlock(Exception):
+    pass
+
+
+def request_weight(endpoint, params):
+    """Request weight of one futures call, per the API documentation."""
+    has_symbol = bool(params.get('symbol'))
+    if endpoint == 'depth':
+        limit = int(params.get('limit', 500))
+        return 2 if limit <= 50 else 5 if limit <= 100 else 10 if limit <= 500 else 20
+    if endpoint in ('klines', 'continuousKlines', 'indexPriceKlines', 'markPriceKlines'):
+        limit = int(params.get('limit', 500))
+        return 1 if limit < 100 else 2 if limit < 500 else 5 if limit <= 1000 else 10
+    if endpoint == 'openOrders':
+        return 1 if has_symbol else 40
+    if endpoint == 'ticker/price':
+        return 1 if has_symbol else 2
+    if endpoint == 'ticker/bookTicker':
+        return 2 if has_symbol else 5
+    if endpoint == 'premiumIndex':
+        return 1 if has_symbol else 10
+    if endpoint in ('positionRisk', 'balance', 'account', 'batchOrders', 'allOrders', 'userTrades'):
+        return 5
+    return 1
+
+
+def order_count(endpoint, method, params):
+    """Number of orders a call counts against the ORDERS limits."""
+    if method in ('post', 'put') and endpoint == 'order':
+        return 1
+    if method in ('post', 'put') and endpoint == 'batchOrders':
+        batch = params.get('batchOrders', '[]')
+        if not isinstance(batch, str):
+            return len(batch)
+        # python-binance has already url-encoded the list at this point
+        batch = unquote(batch)
+        try:
+            return len(json.loads(batch))
+        except ValueError:
+            return max(1, batch.count('{'))
+    return 0
+
+
+class LimitWindow:
+    """
+    Usage of one exchange limit within its current window.
+
+    Binance counts in fixed windows aligned to the clock, so usage is kept as
+    a counter that resets when the window rolls over. Requests are added as
+    they are sent and the count is replaced by the exchange's own number
+    whenever a response header reports it.
+
+    With share < 1 the window is one process's slice of a limit shared with
+    other processes: its limit is scaled down, and so is the shared usage a
+    header reports, so local sends only ever spend this slice.
+    """
+
+    def __init__(self, kind, interval, interval_num, limit, share=1.0):
+        self.kind = kind
+        self.seconds = INTERVAL_SECONDS[interval] * interval_num
+        self.share = share
+        self.limit = limit * share
+        self.header = f"X-MBX-{'USED-WEIGHT' if kind == 'REQUEST_WEIGHT' else 'ORDER-COUNT'}-{interval_num}{INTERVAL_LETTER[interval]}"
+        self.used = 0
+        self.window = 0
+
+    def _roll(self, now):
+        window = int(now // self.seconds)
+        if window != self.window:
+            self.window = window
+            self.used = 0
+
+    def headroom(self, now, share=1.0):
+        self._roll(now)
+        return self.limit * share - self.used
+
+    def reset_in(self, now):
+        return (self.window + 1) * self.seconds - now
+
+    def add(self, now, amount):
+        self._roll(now)
+        self.used += amount
+
+    def sync(self, now, used):
+        self._roll(now)
+        self.used = used * self.share
+
+
+class RequestScheduler:
+    """
+    Central gate for every REST call made through an attached client.
+
+    Orders (and cancels) have strict priority: they only ever wait for a
+    full window, while read-only polls are held to READ_BUDGET of each limit
+    and yield to any order that is waiting. Under pressure identical polls
+    are coalesced onto one in-flight call or a recent result; a poll that
+    still does not fit within MAX_READ_WAIT is shed with RequestShed. Reads
+    made under critical_reads() are never shed early: they use the whole
+    limit and wait up to MAX_ORDER_WAIT. A 429/418 answer stops all traffic
+    until its Retry-After has passed.
+    """
+
+    def __init__(self, rate_limits=DEFAULT_RATE_LIMITS):
+        self._cond = threading.Condition()
+        self._windows = []
+        self._orders_waiting = 0
+        self._banned_until = 0.0
+        self._inflight = {}
+        self._recent = {}
+        self._shares = {'REQUEST_WEIGHT': 1.0, 'ORDERS': 1.0}
+        self._rate_limits = rate_limits
+        self.set_rate_limits(rate_limits)
+
+    def set_rate_limits(self, rate_limits):
+        """Replace the limits, e.g. with exchangeInfo['rateLimits']."""
+        windows = [
+            LimitWindow(r['rateLimitType'], r['interval'], r['intervalNum'], r['limit'], self._shares[r['rateLimitType']])
+            for r in rate_limits if r['rateLimitType'] in ('REQUEST_WEIGHT', 'ORDERS')
+        ]
+        with self._cond:
+            if windows:
+                self._rate_limits = rate_limits
+                self._windows = windows
+
+    def set_budget_share(self, weight=1.0, orders=1.0):
+        """
+        Limit this process to a share of the IP weight limit and of the
+        account's order limits, for processes that split one budget.
+        """
+        self._shares = {'REQUEST_WEIGHT': weight, 'ORDERS': orders}
+        self.set_rate_limits(self._rate_limits)
+
+    def usage(self):
+        """{header name: (used, limit)} for every tracked window."""
+        now = time.time()
+        with self._cond:
+            for w in self._windows:
+                w._roll(now)
+            return {w.header: (w.used, w.limit) for w in self._windows}
+
+    # --- Admission ---
+
+    def _needs(self, weight, orders):
+        return [(w, weight if w.kind == 'REQUEST_WEIGHT' else orders) for w in self._windows
+                if (w.kind == 'REQUEST_WEIGHT' and weight) or (w.kind == 'ORDERS' and orders)]
+
+    def _wait_time(self, now, needs, priority):
+        # Caller holds self._cond; 0 means admitted
+        if now < self._banned_until:
+            return self._banned_until - now
+        share = 1.0 if priority else READ_BUDGET
+        wait = 0.0
+        for window, amount in needs:
+            if window.headroom(now, share) < amount:
+                wait = max(wait, window.reset_in(now))
+        return wait
+
+    def _pressure(self, now):
+        # Caller holds self._cond: highest share of the read budget in use
+        return max((1 - w.headroom(now, READ_BUDGET) / (w.limit * READ_BUDGET) for w in self._windows), default=0.0)
+
+    def acquire(self, endpoint, method, params, block=True):
+        """Block until the call may be sent, or raise RequestShed once it has waited too long."""
+        priority = endpoint in PRIORITY_ENDPOINTS and method != 'get'
+        critical = priority or _CRITICAL.get()
+        needs = self._needs(request_weight(endpoint, params), order_count(endpoint, method, params))
+
+        with self._cond:
+            if priority:
+                self._orders_waiting += 1
+            try:
+                deadline = None
+                while True:
+                    now = time.time()
+                    wait = self._wait_time(now, needs, critical)
+                    if not priority and self._orders_waiting:
+                        wait = max(wait, 0.05)
+                    if wait <= 0:
+                        for window, amount in needs:
+                            window.add(now, amount)
+                        return
+                    if not block:
+                        raise _WouldBlock()
+                    if deadline is None:
+                        deadline = time.monotonic() + (MAX_ORDER_WAIT if critical else MAX_READ_WAIT)
+                    remaining = deadline - time.monotonic()
+                    if wait > remaining:
+                        if not priority:
+                            METRICS.inc('bot_requests_shed_total', endpoint=endpoint)
+                            raise RequestShed(f"{endpoint} shed: rate limit headroom reserved for orders ({wait:.1f}s)")
+                        raise RequestShed(f"{endpoint} would wait {wait:.1f}s for the rate limit window")
+                    METRICS.inc('bot_rate_limit_waits_total', endpoint=endpoint)
+                    self._cond.wait(wait)
+            finally:
+                if priority:
+                    self._orders_waiting -= 1
+                    self._cond.notify_all()
+
+    def record_response(self, headers):
+        """Sync window usage from the X-MBX-* headers of a response."""
+        if headers is None:
+            return
+        now = time.time()
+        with self._cond:
+            for window in self._windows:
+                value = headers.get(window.header)
+                if value is not None:
+                    window.sync(now, int(value))
+            self._cond.notify_all()
+
+    def record_ban(self, status, headers):
+        """Stop all traffic after a 429 (rate limited) or 418 (IP banned)."""
+        retry_after = float((headers or {}).get('Retry-After', 0) or 0) or (60.0 if status == 418 else 5.0)
+        with self._cond:
+            self._banned_until = max(self._banned_until, time.time() + retry_after)
+        METRICS.inc('bot_rate_limit_bans_total', status=status)
+        logger.error(f"RATE_LIMIT_BAN: HTTP {status}, pausing all requests for {retry_after:.0f}s")
+
+    # --- Poll coalescing ---
+
+    def _poll_key(self, client, uri, params):
+        # Per API key: account polls must never be answered with another account's data
+        return client.API_KEY, uri, tuple(sorted((k, str(v)) for k, v in params.items() if k not in ('timestamp', 'signature', 'recvWindow')))
+
+    def coalesced(self, key):
+        """Return (True, result) if a recent identical poll can answer this one under pressure."""
+        with self._cond:
+            cached = self._recent.get(key)
+            if cached is None or time.monotonic() - cached[0] > POLL_CACHE_TTL:
+                return False, None
+            if self._pressure(time.time()) < COALESCE_ABOVE:
+                return False, None
+        METRICS.inc('bot_requests_coalesced_total')
+        return True, cached[1]
+
+    # --- Client wiring ---
+
+    def attach(self, client):
+        """Route every request of a python-binance Client through this scheduler."""
+        if getattr(client, '_rate_limited', False):
+            return client
+        request = client._request
+
+        def scheduled_request(method, uri, signed, force_params=False, **kwargs):
+            endpoint = urlsplit(uri).path.split('/', 3)[-1]
+            params = kwargs.get('data') or kwargs.get('params') or {}
+            if method != 'get' or not isinstance(params, dict):
+                return self._send(client, request, endpoint, method, params, (method, uri, signed, force_params), kwargs)
+
+            # Identical concurrent polls share one call
+            key = self._poll_key(client, uri, params)
+            hit, result = self.coalesced(key)
+            if hit:
+                return result
+            with self._cond:
+                event = self._inflight.get(key)
+                leader = event is None
+                if leader:
+                    event = self._inflight[key] = threading.Event()
+            if not leader:
+                event.wait(client.REQUEST_TIMEOUT)
+                with self._cond:
+                    cached = self._recent.get(key)
+                if cached is not None:
+                    METRICS.inc('bot_requests_coalesced_total')
+                    return cached[1]
+                return self._send(client, request, endpoint, method, params, (method, uri, signed, force_params), kwargs)
+            try:
+                result = self._send(client, request, endpoint, method, params, (method, uri, signed, force_params), kwargs)
+                with self._cond:
+                    now = time.monotonic()
+                    self._recent[key] = (now, result)
+                    if len(self._recent) > RECENT_SWEEP_SIZE:
+                        # Paged reads (klines, trades) are never asked for twice; drop expired results
+                        self._recent = {k: v for k, v in self._recent.items() if now - v[0] <= POLL_CACHE_TTL}
+                return result
+            finally:
+                with self._cond:
+                    self._inflight.pop(key, None)
+                event.set()
+
+        client._request = scheduled_request
+        client._rate_limited = True
+        return client
+
+    def _send(self, client, request, endpoint, method, params, args, kwargs):
+        self.acquire(endpoint, method, params)
+        try:
+            result = request(*args, **kwargs)
+        except Exception as e:
+            # Only API errors carry a response of their own; client.response may be stale otherwise
+            status = getattr(e, 'status_code', None)
+            if status is not None:
+                headers = client.response.headers
+                if status in (429, 418):
+                    self.record_ban(status, headers)
+                self.record_response(headers)
+            raise
+        self.record_response(client.response.headers)
+        return result
+
+    def attach_async(self, client):
+        """Async variant of attach() for python-binance's AsyncClient (no poll coalescing)."""
+        if getattr(client, '_rate_limited', False):
+            return client
+        request = client._request
+
+        async def scheduled_request(method, uri, signed, force_params=False, **kwargs):
+            endpoint = urlsplit(uri).path.split('/', 3)[-1]
+            params = kwargs.get('data') or kwargs.get('params') or {}
+            params = params if isinstance(params, dict) else {}
+            try:
+                self.acquire(endpoint, method, params, block=False)
+            except _WouldBlock:
+                # Waiting for a window to reset must not stall the event loop
+                await asyncio.to_thread(self.acquire, endpoint, method, params)
+            try:
+                result = await request(method, uri, signed, force_params, **kwargs)
+            except Exception as e:
+                status = getattr(e, 'status_code', None)
+                if status is not None:
+                    headers = client.response.headers
+                    if status in (429, 418):
+                        self.record_ban(status, headers)
+                    self.record_response(headers)
+                raise
+            self.record_response(client.response.headers)
+            return result
+
+        client._request = scheduled_request
+        client._rate_limited = True
+        return client
+
+
+_SCHEDULER = None
+_LOCK = threading.Lock()
+
+
+def get_request_scheduler():
+    """Return the process-wide RequestScheduler (weight limits are per IP, so one is shared)."""
+    global _SCHEDULER
+    with _LOCK:
+        if _SCHEDULER is None:
+            _SCHEDULER = RequestScheduler()
+        return _SCHEDULER
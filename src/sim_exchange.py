@@ -0,0 +1,770 @@
+# src/sim_exchange.py
+"""
+Offline stand-in for the Binance Futures Testnet.
+
+Serves the REST and WebSocket endpoints this project uses (ping, time,
+exchangeInfo, order, batchOrders, openOrders, positionRisk, balance, ticker,
+depth, klines, listenKey and the market/user data streams) on top of a small
+in-memory matching engine driven by a random-walk mark price.
+
+    python src/sim_exchange.py --port 8765 --latency-ms 20 --error-rate 0.01
+
+    TESTNET_FUTURES_URL=http://127.0.0.1:8765/fapi \\
+    TESTNET_FUTURES_WS_URL=ws://127.0.0.1:8765 \\
+    python src/market_orders.py BTCUSDT BUY 0.01
+
+Given the API secret (--api-secret, default $API_SECRET), signed requests
+are verified over the query string and body exactly as received, so signing
+and encoding bugs answer -1022 as on the real exchange. Timestamps are
+checked against recvWindow so clock-skew handling can be exercised with
+--clock-skew-ms.
+"""
+import os
+import sys
+import json
+import hmac
+import hashlib
+import math
+import time
+import zlib
+import random
+import asyncio
+import argparse
+import itertools
+import logging
+import threading
+from collections import deque
+from urllib.parse import parse_qsl
+from aiohttp import web, WSMsgType
+
+logger = logging.getLogger(__name__)
+
+# symbol: (start price, tickSize, stepSize, minQty, price decimals, qty decimals)
+DEFAULT_SYMBOLS = {
+    'BTCUSDT': (60000.0, 0.1, 0.001, 0.001, 1, 3),
+    'ETHUSDT': (3000.0, 0.01, 0.001, 0.001, 2, 3),
+    'BNBUSDT': (550.0, 0.01, 0.01, 0.01, 2, 2),
+    'SOLUSDT': (150.0, 0.01, 1.0, 1.0, 2, 0),
+}
+MIN_NOTIONAL = 5.0
+MAX_NUM_ORDERS = 200
+TAKER_FEE = 0.0004
+BOOK_LEVELS = 20
+
+# Request weight per endpoint (anything else weighs 1)
+ENDPOINT_WEIGHTS = {
+    'exchangeInfo': 1, 'depth': 10, 'klines': 5, 'positionRisk': 5, 'balance': 5,
+    'account': 5, 'openOrders': 1, 'batchOrders': 5,
+}
+ORDER_ENDPOINTS = {'order', 'batchOrders'}
+
+TERMINAL = {'FILLED', 'CANCELED', 'EXPIRED', 'REJECTED'}
+
+
+class ApiError(Exception):
+    def __init__(self, code, msg, status=400):
+        super().__init__(msg)
+        self.code = code
+        self.msg = msg
+        self.status = status
+
+
+def _fmt(value, decimals):
+    return f"{value:.{decimals}f}"
+
+
+def _bool(value):
+    return str(value).lower() == 'true'
+
+
+class SimSymbol:
+    def __init__(self, name, price, tick, step, min_qty, price_dp, qty_dp):
+        self.name = name
+        self.mark = price
+        self.tick = tick
+        self.step = step
+        self.min_qty = min_qty
+        self.price_dp = price_dp
+        self.qty_dp = qty_dp
+        self.update_id = 1
+        self.bids = {}
+        self.asks = {}
+
+    @property
+    def bid(self):
+        return math.floor(self.mark / self.tick) * self.tick
+
+    @property
+    def ask(self):
+        return self.bid + self.tick
+
+    def on_tick(self, value, step):
+        return abs(value / step - round(value / step)) < 1e-6
+
+    def rebuild_book(self, rng):
+        """Regenerate the synthetic book around the touch; returns the changed levels."""
+        old_bids, old_asks = self.bids, self.asks
+        self.bids = {round(self.bid - i * self.tick, self.price_dp): round(rng.uniform(0.1, 5.0), self.qty_dp) or self.step for i in range(BOOK_LEVELS)}
+        self.asks = {round(self.ask + i * self.tick, self.price_dp): round(rng.uniform(0.1, 5.0), self.qty_dp) or self.step for i in range(BOOK_LEVELS)}
+        bid_diff = [[_fmt(p, self.price_dp), _fmt(self.bids.get(p, 0.0), self.qty_dp)] for p in set(old_bids) | set(self.bids)]
+        ask_diff = [[_fmt(p, self.price_dp), _fmt(self.asks.get(p, 0.0), self.qty_dp)] for p in set(old_asks) | set(self.asks)]
+        return bid_diff, ask_diff
+
+
+class SimExchange:
+    """
+    In-memory futures exchange: one account, one-way position mode.
+
+    latency_ms/jitter_ms delay every REST response, error_rate answers a
+    random share of requests with -1001, drop_rate processes a request but
+    holds its response for drop_delay seconds (a client-side timeout), and
+    clock_skew_ms shifts the server clock. With api_secret set, signed
+    requests must carry a valid HMAC-SHA256 signature.
+    """
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, drop_rate=0.0, drop_delay=15.0,
+                 clock_skew_ms=0, volatility=0.0005, tick_interval=0.1, wallet=10000.0, seed=None, api_secret=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.drop_delay = drop_delay
+        self.clock_skew_ms = clock_skew_ms
+        self.volatility = volatility
+        self.tick_interval = tick_interval
+        self.rng = random.Random(seed)
+        self.symbols = {name: SimSymbol(name, *spec) for name, spec in DEFAULT_SYMBOLS.items()}
+        self.wallet = wallet
+        self.positions = {}
+        self.orders = {}
+        self.client_ids = {}
+        self.order_ids = itertools.count(1000000)
+        self.listen_keys = set()
+        self.user_sockets = set()
+        self.market_sockets = {}
+        self.weight_window = deque()
+        self.order_window = deque()
+        self.url = None
+        self.api_secret = api_secret
+        self._last_mark_push = 0.0
+        for symbol in self.symbols.values():
+            symbol.rebuild_book(self.rng)
+
+    # --- Clock and limits ---
+
+    def now_ms(self):
+        return int(time.time() * 1000) + self.clock_skew_ms
+
+    def _count(self, window, amount, horizon):
+        now = time.monotonic()
+        window.append((now, amount))
+        while window and now - window[0][0] > horizon:
+            window.popleft()
+        return sum(a for t, a in window)
+
+    def _recent(self, window, horizon):
+        now = time.monotonic()
+        return sum(a for t, a in window if now - t <= horizon)
+
+    def check_signature(self, query, body):
+        """Verify the signature over the raw query string plus body, as the exchange does."""
+        parts = [part for raw in (query, body) for part in raw.split('&')]
+        signature = next((part[len('signature='):] for part in parts if part.startswith('signature=')), None)
+        if signature is None and not any(part.startswith('timestamp=') for part in parts):
+            return  # Unsigned endpoint
+        payload = ''.join('&'.join(part for part in raw.split('&') if not part.startswith('signature='))
+                          for raw in (query, body))
+        expected = hmac.new(self.api_secret.encode('utf-8'), payload.encode('utf-8'), hashlib.sha256).hexdigest()
+        if signature is None or not hmac.compare_digest(signature, expected):
+            raise ApiError(-1022, "Signature for this request is not valid.")
+
+    # --- Positions and fills ---
+
+    def _position(self, symbol):
+        return self.positions.setdefault(symbol, {'amt': 0.0, 'entry': 0.0})
+
+    def _apply_fill(self, order, price, qty):
+        sym = self.symbols[order['symbol']]
+        signed = qty if order['side'] == 'BUY' else -qty
+        pos = self._position(order['symbol'])
+        amt, entry = pos['amt'], pos['entry']
+        realized = 0.0
+
+        if amt == 0 or (amt > 0) == (signed > 0):
+            new_amt = amt + signed
+            entry = (abs(amt) * entry + qty * price) / abs(new_amt)
+        else:
+            closed = min(abs(signed), abs(amt))
+            realized = closed * (price - entry) * (1 if amt > 0 else -1)
+            new_amt = amt + signed
+            if abs(new_amt) < sym.step / 2:
+                new_amt, entry = 0.0, 0.0
+            elif (new_amt > 0) != (amt > 0):
+                entry = price
+        pos['amt'], pos['entry'] = round(new_amt, sym.qty_dp), entry
+        fee = qty * price * TAKER_FEE
+        self.wallet += realized - fee
+
+        executed = float(order['executedQty']) + qty
+        cum_quote = float(order['cumQuote']) + qty * price
+        order['executedQty'] = _fmt(executed, sym.qty_dp)
+        order['cumQuote'] = _fmt(cum_quote, 5)
+        order['avgPrice'] = _fmt(cum_quote / executed, sym.price_dp)
+        order['status'] = 'FILLED' if executed >= float(order['origQty']) - sym.step / 2 else 'PARTIALLY_FILLED'
+        order['updateTime'] = self.now_ms()
+        self._push_order_update(order, 'TRADE', last_qty=qty, last_price=price)
+        self._push_account_update(order['symbol'], 'ORDER')
+
+    def _reduce_only_qty(self, order):
+        """Quantity a reduce-only order may still execute (0 if it would not reduce)."""
+        amt = self._position(order['symbol'])['amt']
+        reducing = (amt > 0 and order['side'] == 'SELL') or (amt < 0 and order['side'] == 'BUY')
+        if not reducing:
+            return 0.0
+        remaining = float(order['origQty']) - float(order['executedQty'])
+        return min(remaining, abs(amt))
+
+    def _execute_market(self, order):
+        sym = self.symbols[order['symbol']]
+        qty = float(order['origQty']) - float(order['executedQty'])
+        if _bool(order['reduceOnly']) or _bool(order['closePosition']):
+            qty = self._reduce_only_qty(order) if not _bool(order['closePosition']) else abs(self._position(order['symbol'])['amt'])
+            if qty <= 0:
+                self._finish(order, 'EXPIRED')
+                return
+        price = sym.ask if order['side'] == 'BUY' else sym.bid
+        self._apply_fill(order, price, qty)
+
+    def _finish(self, order, status):
+        order['status'] = status
+        order['updateTime'] = self.now_ms()
+        self.client_ids.pop(order['clientOrderId'], None)
+        self._push_order_update(order, 'CANCELED' if status == 'CANCELED' else status)
+
+    # --- Matching engine ---
+
+    def step_market(self):
+        """Advance every mark price one tick, then match resting and stop orders."""
+        for sym in self.symbols.values():
+            sym.mark = max(sym.tick, sym.mark * math.exp(self.rng.gauss(0, self.volatility)))
+            bid_diff, ask_diff = sym.rebuild_book(self.rng)
+            # Each event spans two update ids so a snapshot can land inside one,
+            # as on the real stream (U <= lastUpdateId <= u)
+            prev_id = sym.update_id
+            sym.update_id += 2
+            self._push_market(sym.name, 'depth', {
+                'e': 'depthUpdate', 'E': self.now_ms(), 'T': self.now_ms(), 's': sym.name,
+                'U': prev_id + 1, 'u': sym.update_id, 'pu': prev_id, 'b': bid_diff, 'a': ask_diff,
+            })
+            self._push_market(sym.name, 'bookTicker', {
+                'e': 'bookTicker', 'u': sym.update_id, 'E': self.now_ms(), 'T': self.now_ms(), 's': sym.name,
+                'b': _fmt(sym.bid, sym.price_dp), 'B': _fmt(sym.bids[round(sym.bid, sym.price_dp)], sym.qty_dp),
+                'a': _fmt(sym.ask, sym.price_dp), 'A': _fmt(sym.asks[round(sym.ask, sym.price_dp)], sym.qty_dp),
+            })
+
+        if time.monotonic() - self._last_mark_push >= 1.0:
+            self._last_mark_push = time.monotonic()
+            for sym in self.symbols.values():
+                self._push_market(sym.name, 'markPrice', self._mark_payload(sym, event=True))
+
+        for order in list(self.orders.values()):
+            if order['status'] in TERMINAL:
+                continue
+            sym = self.symbols[order['symbol']]
+            kind = order['origType']
+            if kind == 'LIMIT':
+                price = float(order['price'])
+                if (order['side'] == 'BUY' and sym.ask <= price) or (order['side'] == 'SELL' and sym.bid >= price):
+                    qty = float(order['origQty']) - float(order['executedQty'])
+                    if _bool(order['reduceOnly']):
+                        qty = self._reduce_only_qty(order)
+                        if qty <= 0:
+                            self._finish(order, 'EXPIRED')
+                            continue
+                    self._apply_fill(order, price, qty)
+            elif kind in ('STOP_MARKET', 'TAKE_PROFIT_MARKET'):
+                stop = float(order['stopPrice'])
+                above = sym.mark >= stop
+                below = sym.mark <= stop
+                if kind == 'STOP_MARKET':
+                    triggered = above if order['side'] == 'BUY' else below
+                else:
+                    triggered = below if order['side'] == 'BUY' else above
+                if triggered:
+                    order['type'] = 'MARKET'
+                    self._execute_market(order)
+
+    def _mark_payload(self, sym, event=False):
+        payload = {
+            'symbol': sym.name, 'markPrice': _fmt(sym.mark, sym.price_dp + 1),
+            'indexPrice': _fmt(sym.mark, sym.price_dp + 1), 'lastFundingRate': '0.00010000',
+            'nextFundingTime': 0, 'time': self.now_ms(),
+        }
+        if event:
+            return {'e': 'markPriceUpdate', 'E': self.now_ms(), 's': sym.name, 'p': payload['markPrice'],
+                    'i': payload['indexPrice'], 'r': payload['lastFundingRate'], 'T': 0}
+        return payload
+
+    # --- Order entry ---
+
+    def _symbol(self, params):
+        sym = self.symbols.get(params.get('symbol', ''))
+        if sym is None:
+            raise ApiError(-1121, 'Invalid symbol.')
+        return sym
+
+    def place_order(self, p):
+        sym = self._symbol(p)
+        side = p.get('side')
+        kind = p.get('type')
+        if side not in ('BUY', 'SELL'):
+            raise ApiError(-1102, "Mandatory parameter 'side' was not sent, was empty/null, or malformed.")
+        if kind not in ('MARKET', 'LIMIT', 'STOP_MARKET', 'TAKE_PROFIT_MARKET'):
+            raise ApiError(-1116, 'Invalid orderType.')
+
+        close_position = _bool(p.get('closePosition', 'false'))
+        qty = float(p.get('quantity', 0) or 0)
+        if not close_position:
+            if qty < sym.min_qty:
+                raise ApiError(-4003, 'Quantity less than or equal to zero.' if qty <= 0 else 'Quantity less than min qty.')
+            if not sym.on_tick(qty, sym.step):
+                raise ApiError(-1111, 'Precision is over the maximum defined for this asset.')
+
+        price = float(p.get('price', 0) or 0)
+        stop_price = float(p.get('stopPrice', 0) or 0)
+        if kind == 'LIMIT':
+            if price <= 0 or not sym.on_tick(price, sym.tick):
+                raise ApiError(-4014, 'Price not increased by tick size.')
+            if p.get('timeInForce') not in ('GTC', 'IOC', 'FOK', 'GTX'):
+                raise ApiError(-1102, "Mandatory parameter 'timeInForce' was not sent, was empty/null, or malformed.")
+        if kind in ('STOP_MARKET', 'TAKE_PROFIT_MARKET'):
+            if stop_price <= 0 or not sym.on_tick(stop_price, sym.tick):
+                raise ApiError(-4014, 'Price not increased by tick size.')
+        notional_price = price or stop_price or sym.mark
+        if not close_position and not _bool(p.get('reduceOnly', 'false')) and qty * notional_price < MIN_NOTIONAL:
+            raise ApiError(-4164, f"Order's notional must be no smaller than {MIN_NOTIONAL} (unless you choose reduce only).")
+        open_count = sum(1 for o in self.orders.values() if o['symbol'] == sym.name and o['status'] not in TERMINAL)
+        if kind != 'MARKET' and open_count >= MAX_NUM_ORDERS:
+            raise ApiError(-4044, 'Reach max open order limit.')
+
+        client_id = p.get('newClientOrderId') or f"sim-{next(self.order_ids)}"
+        if client_id in self.client_ids:
+            raise ApiError(-4116, 'ClientOrderId is duplicated.')
+
+        reduce_only = _bool(p.get('reduceOnly', 'false'))
+        order = {
+            'orderId': next(self.order_ids), 'symbol': sym.name, 'status': 'NEW', 'clientOrderId': client_id,
+            'price': _fmt(price, sym.price_dp), 'avgPrice': '0.00', 'origQty': _fmt(qty, sym.qty_dp),
+            'executedQty': _fmt(0, sym.qty_dp), 'cumQty': _fmt(0, sym.qty_dp), 'cumQuote': '0.00000',
+            'timeInForce': p.get('timeInForce', 'GTC'), 'type': kind, 'reduceOnly': reduce_only,
+            'closePosition': close_position, 'side': side, 'positionSide': 'BOTH',
+            'stopPrice': _fmt(stop_price, sym.price_dp), 'workingType': 'CONTRACT_PRICE', 'priceProtect': False,
+            'origType': kind, 'priceMatch': 'NONE', 'selfTradePreventionMode': 'NONE', 'goodTillDate': 0,
+            'updateTime': self.now_ms(),
+        }
+        if (reduce_only or close_position) and kind == 'MARKET' and self._reduce_only_qty(order) <= 0 and not close_position:
+            raise ApiError(-2022, 'ReduceOnly Order is rejected.')
+
+        self.orders[order['orderId']] = order
+        self.client_ids[client_id] = order['orderId']
+        self._push_order_update(order, 'NEW')
+
+        if kind == 'MARKET':
+            self._execute_market(order)
+            # Like the real API, the ack shows the order before the fill settles
+            return dict(order, status='NEW', executedQty=_fmt(0, sym.qty_dp), avgPrice='0.00', cumQuote='0.00000')
+        if kind == 'LIMIT' and p.get('timeInForce') == 'GTX':
+            if (side == 'BUY' and price >= sym.ask) or (side == 'SELL' and price <= sym.bid):
+                self._finish(order, 'EXPIRED')
+        return dict(order)
+
+    def modify_order(self, p):
+        sym = self._symbol(p)
+        order = self._find(p)
+        if order['status'] not in ('NEW', 'PARTIALLY_FILLED'):
+            raise ApiError(-2013, 'Order does not exist.')
+        if order['origType'] != 'LIMIT':
+            raise ApiError(-4200, 'Only limit order is supported.')
+        qty = float(p.get('quantity', order['origQty']))
+        price = float(p.get('price', order['price']))
+        if not sym.on_tick(price, sym.tick):
+            raise ApiError(-4014, 'Price not increased by tick size.')
+        if not sym.on_tick(qty, sym.step) or qty < float(order['executedQty']):
+            raise ApiError(-1111, 'Precision is over the maximum defined for this asset.')
+        if price == float(order['price']) and qty == float(order['origQty']):
+            raise ApiError(-5027, 'No need to modify the order.')
+        order['price'] = _fmt(price, sym.price_dp)
+        order['origQty'] = _fmt(qty, sym.qty_dp)
+        order['updateTime'] = self.now_ms()
+        self._push_order_update(order, 'AMENDMENT')
+        return dict(order)
+
+    def _find(self, p):
+        order_id = p.get('orderId')
+        if order_id is None and p.get('origClientOrderId'):
+            order_id = self.client_ids.get(p['origClientOrderId'])
+            if order_id is None:
+                # Terminal orders are no longer indexed by client id
+                order_id = next((o['orderId'] for o in self.orders.values() if o['clientOrderId'] == p['origClientOrderId']), None)
+        order = self.orders.get(int(order_id)) if order_id is not None else None
+        if order is None or order['symbol'] != p.get('symbol'):
+            raise ApiError(-2013, 'Order does not exist.')
+        return order
+
+    def cancel_order(self, p):
+        order = self._find(p)
+        if order['status'] in TERMINAL:
+            raise ApiError(-2011, 'Unknown order sent.')
+        self._finish(order, 'CANCELED')
+        return dict(order)
+
+    # --- Push streams ---
+
+    def _push_order_update(self, order, execution_type, last_qty=0.0, last_price=0.0):
+        event = {
+            'e': 'ORDER_TRADE_UPDATE', 'E': self.now_ms(), 'T': order['updateTime'],
+            'o': {
+                's': order['symbol'], 'c': order['clientOrderId'], 'S': order['side'], 'o': order['type'],
+                'f': order['timeInForce'], 'q': order['origQty'], 'p': order['price'], 'ap': order['avgPrice'],
+                'sp': order['stopPrice'], 'x': execution_type, 'X': order['status'], 'i': order['orderId'],
+                'l': str(last_qty), 'z': order['executedQty'], 'L': str(last_price), 'T': order['updateTime'],
+                'R': order['reduceOnly'], 'cp': order['closePosition'], 'ot': order['origType'], 'ps': 'BOTH',
+            },
+        }
+        self._push_user(event)
+
+    def _push_account_update(self, symbol, reason):
+        pos = self._position(symbol)
+        sym = self.symbols[symbol]
+        up = (sym.mark - pos['entry']) * pos['amt'] if pos['amt'] else 0.0
+        self._push_user({
+            'e': 'ACCOUNT_UPDATE', 'E': self.now_ms(), 'T': self.now_ms(),
+            'a': {
+                'm': reason,
+                'B': [{'a': 'USDT', 'wb': _fmt(self.wallet, 8), 'cw': _fmt(self.wallet, 8), 'bc': '0'}],
+                'P': [{'s': symbol, 'pa': _fmt(pos['amt'], sym.qty_dp), 'ep': _fmt(pos['entry'], sym.price_dp),
+                       'cr': '0', 'up': _fmt(up, 8), 'mt': 'cross', 'iw': '0', 'ps': 'BOTH'}],
+            },
+        })
+
+    def _push_user(self, event):
+        message = json.dumps(event)
+        for ws in list(self.user_sockets):
+            asyncio.ensure_future(ws.send_str(message))
+
+    def _push_market(self, symbol, kind, data):
+        prefix = symbol.lower()
+        for ws, streams in list(self.market_sockets.items()):
+            for stream in streams:
+                if stream.startswith(f"{prefix}@{kind}"):
+                    asyncio.ensure_future(ws.send_str(json.dumps({'stream': stream, 'data': data})))
+                    break
+
+    # --- REST ---
+
+    def exchange_info(self):
+        symbols = []
+        for sym in self.symbols.values():
+            symbols.append({
+                'symbol': sym.name, 'pair': sym.name, 'contractType': 'PERPETUAL', 'status': 'TRADING',
+                'baseAsset': sym.name[:-4], 'quoteAsset': 'USDT', 'marginAsset': 'USDT',
+                'pricePrecision': sym.price_dp, 'quantityPrecision': sym.qty_dp,
+                'orderTypes': ['LIMIT', 'MARKET', 'STOP_MARKET', 'TAKE_PROFIT_MARKET'],
+                'timeInForce': ['GTC', 'IOC', 'FOK', 'GTX'],
+                'filters': [
+                    {'filterType': 'PRICE_FILTER', 'minPrice': _fmt(sym.tick, sym.price_dp), 'maxPrice': '4529764', 'tickSize': _fmt(sym.tick, sym.price_dp)},
+                    {'filterType': 'LOT_SIZE', 'minQty': _fmt(sym.min_qty, sym.qty_dp), 'maxQty': '1000', 'stepSize': _fmt(sym.step, sym.qty_dp)},
+                    {'filterType': 'MARKET_LOT_SIZE', 'minQty': _fmt(sym.min_qty, sym.qty_dp), 'maxQty': '120', 'stepSize': _fmt(sym.step, sym.qty_dp)},
+                    {'filterType': 'MAX_NUM_ORDERS', 'limit': MAX_NUM_ORDERS},
+                    {'filterType': 'MAX_NUM_ALGO_ORDERS', 'limit': 10},
+                    {'filterType': 'MIN_NOTIONAL', 'notional': str(MIN_NOTIONAL)},
+                    {'filterType': 'PERCENT_PRICE', 'multiplierUp': '1.0500', 'multiplierDown': '0.9500', 'multiplierDecimal': '4'},
+                ],
+            })
+        return {
+            'timezone': 'UTC', 'serverTime': self.now_ms(),
+            'rateLimits': [
+                {'rateLimitType': 'REQUEST_WEIGHT', 'interval': 'MINUTE', 'intervalNum': 1, 'limit': 2400},
+                {'rateLimitType': 'ORDERS', 'interval': 'MINUTE', 'intervalNum': 1, 'limit': 1200},
+                {'rateLimitType': 'ORDERS', 'interval': 'SECOND', 'intervalNum': 10, 'limit': 300},
+            ],
+            'symbols': symbols,
+        }
+
+    def position_risk(self, p):
+        rows = []
+        for name, sym in self.symbols.items():
+            if p.get('symbol') and p['symbol'] != name:
+                continue
+            pos = self._position(name)
+            up = (sym.mark - pos['entry']) * pos['amt'] if pos['amt'] else 0.0
+            rows.append({
+                'symbol': name, 'positionSide': 'BOTH', 'positionAmt': _fmt(pos['amt'], sym.qty_dp),
+                'entryPrice': _fmt(pos['entry'], sym.price_dp), 'markPrice': _fmt(sym.mark, sym.price_dp),
+                'unRealizedProfit': _fmt(up, 8), 'liquidationPrice': '0', 'notional': _fmt(pos['amt'] * sym.mark, 8),
+                'marginAsset': 'USDT', 'updateTime': self.now_ms(),
+            })
+        return rows
+
+    def balance(self):
+        return [{'accountAlias': 'sim', 'asset': 'USDT', 'balance': _fmt(self.wallet, 8),
+                 'crossWalletBalance': _fmt(self.wallet, 8), 'availableBalance': _fmt(self.wallet, 8),
+                 'updateTime': self.now_ms()}]
+
+    def klines(self, p):
+        sym = self._symbol(p)
+        units = {'m': 60000, 'h': 3600000, 'd': 86400000, 'w': 604800000}
+        interval = p.get('interval', '1m')
+        step = int(interval[:-1]) * units[interval[-1]]
+        # Weekly candles open on Mondays (the epoch was a Thursday)
+        offset = 4 * 86400000 if interval[-1] == 'w' else 0
+        limit = min(int(p.get('limit', 500)), 1500)
+        # The candle still open is served too, as on the exchange
+        now = offset + (self.now_ms() - offset) // step * step
+        end = min(int(p['endTime']), now) if p.get('endTime') else now
+        start = offset - (offset - int(p['startTime'])) // step * step if p.get('startTime') else end - (limit - 1) * step
+        rows = []
+        t = start
+        while t <= end and len(rows) < limit:
+            # Deterministic per candle, so re-downloads are byte-identical
+            # (a stable digest: hash() of a str changes with PYTHONHASHSEED)
+            rng = random.Random(zlib.crc32(f"{sym.name}|{interval}|{t}".encode()))
+            base = DEFAULT_SYMBOLS[sym.name][0] * math.exp(0.05 * math.sin(t / 8.64e7) + 0.02 * math.sin(t / 3.6e6))
+            o = base * (1 + rng.gauss(0, 0.001))
+            c = base * (1 + rng.gauss(0, 0.001))
+            h = max(o, c) * (1 + abs(rng.gauss(0, 0.0008)))
+            lo = min(o, c) * (1 - abs(rng.gauss(0, 0.0008)))
+            vol = rng.uniform(10, 500)
+            rows.append([t, _fmt(o, sym.price_dp), _fmt(h, sym.price_dp), _fmt(lo, sym.price_dp), _fmt(c, sym.price_dp),
+                         _fmt(vol, 3), t + step - 1, _fmt(vol * c, 4), rng.randint(100, 5000),
+                         _fmt(vol / 2, 3), _fmt(vol * c / 2, 4), '0'])
+            t += step
+        return rows
+
+    def depth(self, p):
+        sym = self._symbol(p)
+        limit = int(p.get('limit', 500))
+        bids = sorted(sym.bids.items(), reverse=True)[:limit]
+        asks = sorted(sym.asks.items())[:limit]
+        return {
+            # Diffs carry every level, so the next event fully covers this snapshot
+            'lastUpdateId': sym.update_id + 1, 'E': self.now_ms(), 'T': self.now_ms(),
+            'bids': [[_fmt(px, sym.price_dp), _fmt(q, sym.qty_dp)] for px, q in bids],
+            'asks': [[_fmt(px, sym.price_dp), _fmt(q, sym.qty_dp)] for px, q in asks],
+        }
+
+    def dispatch(self, method, path, p):
+        """Route one REST call; returns the JSON-serialisable response."""
+        if 'timestamp' in p:
+            recv_window = int(p.get('recvWindow', 5000))
+            drift = self.now_ms() - int(p['timestamp'])
+            if drift > recv_window or drift < -1000:
+                raise ApiError(-1021, "Timestamp for this request is outside of the recvWindow.")
+
+        route = (method, path)
+        if route == ('GET', 'ping'):
+            return {}
+        if route == ('GET', 'time'):
+            return {'serverTime': self.now_ms()}
+        if route == ('GET', 'exchangeInfo'):
+            return self.exchange_info()
+        if route == ('GET', 'ticker/price'):
+            rows = [{'symbol': s.name, 'price': _fmt(s.mark, s.price_dp), 'time': self.now_ms()} for s in self.symbols.values()]
+            return next(r for r in rows if r['symbol'] == self._symbol(p).name) if p.get('symbol') else rows
+        if route == ('GET', 'ticker/bookTicker'):
+            rows = [{'symbol': s.name, 'bidPrice': _fmt(s.bid, s.price_dp), 'bidQty': '1', 'askPrice': _fmt(s.ask, s.price_dp),
+                     'askQty': '1', 'time': self.now_ms()} for s in self.symbols.values()]
+            return next(r for r in rows if r['symbol'] == self._symbol(p).name) if p.get('symbol') else rows
+        if route == ('GET', 'premiumIndex'):
+            if p.get('symbol'):
+                return self._mark_payload(self._symbol(p))
+            return [self._mark_payload(s) for s in self.symbols.values()]
+        if route == ('GET', 'depth'):
+            return self.depth(p)
+        if route == ('GET', 'klines'):
+            return self.klines(p)
+        if route == ('POST', 'order'):
+            return self.place_order(p)
+        if route == ('PUT', 'order'):
+            return self.modify_order(p)
+        if route == ('GET', 'order'):
+            return dict(self._find(p))
+        if route == ('DELETE', 'order'):
+            return self.cancel_order(p)
+        if route == ('POST', 'batchOrders'):
+            return self._batch(self.place_order, json.loads(p['batchOrders']))
+        if route == ('PUT', 'batchOrders'):
+            return self._batch(self.modify_order, json.loads(p['batchOrders']))
+        if route == ('DELETE', 'batchOrders'):
+            ids = json.loads(p.get('orderIdList') or p.get('orderidlist') or '[]')
+            return self._batch(self.cancel_order, [{'symbol': p.get('symbol'), 'orderId': i} for i in ids])
+        if route == ('GET', 'openOrders'):
+            return [dict(o) for o in self.orders.values()
+                    if o['status'] not in TERMINAL and (not p.get('symbol') or o['symbol'] == p['symbol'])]
+        if route == ('DELETE', 'allOpenOrders'):
+            for o in list(self.orders.values()):
+                if o['symbol'] == p.get('symbol') and o['status'] not in TERMINAL:
+                    self._finish(o, 'CANCELED')
+            return {'code': 200, 'msg': 'The operation of cancel all open order is done.'}
+        if route == ('GET', 'positionRisk'):
+            return self.position_risk(p)
+        if route == ('GET', 'balance'):
+            return self.balance()
+        if route == ('GET', 'account'):
+            return {'totalWalletBalance': _fmt(self.wallet, 8), 'assets': self.balance(), 'positions': self.position_risk({})}
+        if route == ('POST', 'listenKey'):
+            key = f"sim{random.getrandbits(96):024x}"
+            self.listen_keys.add(key)
+            return {'listenKey': key}
+        if route in (('PUT', 'listenKey'), ('DELETE', 'listenKey')):
+            return {}
+        raise ApiError(-1000, f"Unknown endpoint {method} {path}", status=404)
+
+    @staticmethod
+    def _batch(func, items):
+        results = []
+        for item in items:
+            try:
+                results.append(func({k: str(v) for k, v in item.items()}))
+            except ApiError as e:
+                results.append({'code': e.code, 'msg': e.msg})
+        return results
+
+    # --- aiohttp handlers ---
+
+    async def handle_rest(self, request):
+        # The request target as sent (yarl would re-quote characters like '[')
+        query = request.raw_path.partition('?')[2]
+        body = await request.text() if request.can_read_body else ''
+        params = dict(parse_qsl(query))
+        params.update(parse_qsl(body))
+        path = request.match_info['path']
+
+        delay = (self.latency_ms + self.rng.uniform(0, self.jitter_ms)) / 1000
+        if delay:
+            await asyncio.sleep(delay)
+
+        weight = ENDPOINT_WEIGHTS.get(path, 1)
+        headers = {'X-MBX-USED-WEIGHT-1M': str(self._count(self.weight_window, weight, 60))}
+        if path in ORDER_ENDPOINTS and request.method != 'GET':
+            count = len(json.loads(params.get('batchOrders', '[0]'))) if path == 'batchOrders' else 1
+            self._count(self.order_window, count, 60)
+            headers['X-MBX-ORDER-COUNT-10S'] = str(self._recent(self.order_window, 10))
+            headers['X-MBX-ORDER-COUNT-1M'] = str(self._recent(self.order_window, 60))
+
+        if self.rng.random() < self.error_rate:
+            body = {'code': -1001, 'msg': 'Internal error; unable to process your request. Please try again.'}
+            return web.json_response(body, status=503, headers=headers)
+
+        try:
+            if self.api_secret:
+                self.check_signature(query, body)
+            body, status = self.dispatch(request.method, path, params), 200
+        except ApiError as e:
+            body, status = {'code': e.code, 'msg': e.msg}, e.status
+
+        if self.rng.random() < self.drop_rate:
+            # Processed, but the client times out before the answer arrives
+            await asyncio.sleep(self.drop_delay)
+        return web.json_response(body, status=status, headers=headers)
+
+    async def handle_ws(self, request):
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        key = request.match_info.get('key')
+
+        if key in self.listen_keys:
+            self.user_sockets.add(ws)
+        else:
+            streams = set(request.query.get('streams', '').split('/')) - {''}
+            if key:
+                streams.add(key)
+            self.market_sockets[ws] = streams
+
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT or ws not in self.market_sockets:
+                    continue
+                cmd = json.loads(msg.data)
+                if cmd.get('method') == 'SUBSCRIBE':
+                    self.market_sockets[ws].update(cmd.get('params', []))
+                elif cmd.get('method') == 'UNSUBSCRIBE':
+                    self.market_sockets[ws].difference_update(cmd.get('params', []))
+                await ws.send_str(json.dumps({'result': None, 'id': cmd.get('id')}))
+        finally:
+            self.user_sockets.discard(ws)
+            self.market_sockets.pop(ws, None)
+        return ws
+
+    async def _market_loop(self):
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            try:
+                self.step_market()
+            except Exception as e:
+                logger.exception(f"SIM_MARKET_ERROR: {e}")
+
+    def app(self):
+        app = web.Application()
+        app.router.add_route('*', '/fapi/{version}/{path:.+}', self.handle_rest)
+        app.router.add_get('/ws/{key}', self.handle_ws)
+        app.router.add_get('/ws', self.handle_ws)
+        app.router.add_get('/stream', self.handle_ws)
+
+        async def start_market(app):
+            app['market'] = asyncio.ensure_future(self._market_loop())
+
+        async def stop_market(app):
+            app['market'].cancel()
+
+        app.on_startup.append(start_market)
+        app.on_cleanup.append(stop_market)
+        return app
+
+    def run_in_thread(self, host='127.0.0.1', port=0):
+        """Serve on a background thread (port=0 picks a free port); returns the REST base URL."""
+        started = threading.Event()
+
+        def serve():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            runner = web.AppRunner(self.app())
+            loop.run_until_complete(runner.setup())
+            site = web.TCPSite(runner, host, port)
+            loop.run_until_complete(site.start())
+            bound = site._server.sockets[0].getsockname()[1]
+            self.url = f"http://{host}:{bound}/fapi"
+            self.ws_url = f"ws://{host}:{bound}"
+            started.set()
+            loop.run_forever()
+
+        threading.Thread(target=serve, name="sim-exchange", daemon=True).start()
+        started.wait()
+        return self.url
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline Binance Futures stand-in for load testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added to every REST response")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform random extra latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with -1001")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Share of requests processed but answered late")
+    parser.add_argument("--drop-delay", type=float, default=15.0, help="Seconds a dropped response is held")
+    parser.add_argument("--clock-skew-ms", type=int, default=0, help="Server clock offset from local time")
+    parser.add_argument("--volatility", type=float, default=0.0005, help="Per-tick log-return stdev of the mark price")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--api-secret", default=os.getenv("API_SECRET"), help="Verify request signatures with this secret")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+    sim = SimExchange(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        drop_rate=args.drop_rate, drop_delay=args.drop_delay, clock_skew_ms=args.clock_skew_ms,
+        volatility=args.volatility, seed=args.seed, api_secret=args.api_secret,
+    )
+    print(f"Simulated exchange on http://{args.host}:{args.port}/fapi (ws://{args.host}:{args.port})")
+    print(f"Point the bot at it with: TESTNET_FUTURES_URL=http://{args.host}:{args.port}/fapi TESTNET_FUTURES_WS_URL=ws://{args.host}:{args.port}")
+    web.run_app(sim.app(), host=args.host, port=args.port, print=None)
+    sys.exit(0)
@@ -0,0 +1,189 @@
+# src/time_sync.py
+import os
+import time
+import hmac
+import hashlib
+import logging
+import threading
+import weakref
+from binance.client import BinanceAPIException
+from metrics import METRICS
+from rate_limiter import critical_reads
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Seconds between background server-time samples
+TIME_SYNC_INTERVAL = float(os.getenv("TIME_SYNC_INTERVAL", "60"))
+# Back-to-back samples per sync; the one with the shortest round trip wins
+TIME_SYNC_SAMPLES = int(os.getenv("TIME_SYNC_SAMPLES", "3"))
+# Resync sooner when the measured drift would move the offset by this much before the next sync
+TIME_SYNC_MAX_ERROR_MS = float(os.getenv("TIME_SYNC_MAX_ERROR_MS", "100"))
+# Forced resyncs (after a -1021) closer together than this reuse the last one
+MIN_FORCED_SYNC_INTERVAL = 1.0
+# Weight of a new drift measurement in the running estimate
+DRIFT_SMOOTHING = 0.3
+
+TIMESTAMP_REJECT = -1021
+
+
+class HmacSigner:
+    """
+    HMAC-SHA256 signing with the key schedule done once.
+
+    hmac.new() derives the inner and outer padded keys on every call;
+    copying a keyed object skips that. The query string is built exactly
+    the way python-binance sends it (sorted, None values dropped).
+    """
+
+    def __init__(self, secret):
+        self._mac = hmac.new(secret.encode("utf-8"), digestmod=hashlib.sha256)
+
+    def sign_query(self, query_string):
+        mac = self._mac.copy()
+        mac.update(query_string.encode("utf-8"))
+        return mac.hexdigest()
+
+    def sign(self, data, uri_encode=True):
+        # A hex digest needs no URI encoding; uri_encode is accepted for the Client signature
+        params = sorted((key, str(value)) for key, value in data.items() if value is not None and key != 'signature')
+        return self.sign_query("&".join(f"{key}={value}" for key, value in params))
+
+    @classmethod
+    def install(cls, client):
+        """Replace a Client's HMAC signing (RSA/Ed25519 keys keep python-binance's own)."""
+        if client.PRIVATE_KEY or not client.API_SECRET:
+            return client
+        signer = cls(client.API_SECRET)
+        client._hmac_signature = signer.sign_query
+        client._generate_signature = signer.sign
+        return client
+
+
+class TimeSync:
+    """
+    Tracks the offset of the exchange clock from the local one.
+
+    Each sync times a few GET /fapi/v1/time calls and takes the one with the
+    shortest round trip, assuming the server stamped it halfway. Successive
+    syncs give the drift rate, which shortens the interval when the clock
+    walks fast. The offset is written to every attached client's
+    timestamp_offset, which python-binance adds to each signed request; a
+    request rejected with -1021 anyway triggers an immediate resync and is
+    sent once more.
+    """
+
+    def __init__(self, interval=TIME_SYNC_INTERVAL, samples=TIME_SYNC_SAMPLES):
+        self.interval = interval
+        self.samples = max(1, samples)
+        self.offset_ms = 0.0
+        self.drift = 0.0  # ms of offset change per second
+        self.rtt_ms = None
+        self.synced_at = None
+        self._clients = weakref.WeakSet()
+        self._samplers = weakref.WeakSet()
+        self._lock = threading.RLock()
+        self._thread = None
+
+    def attach(self, client):
+        """Keep client's timestamp_offset in sync and retry its -1021 rejects once."""
+        if getattr(client, '_time_synced', False):
+            return client
+        request = client._request
+        sync = self
+
+        def synced_request(method, uri, signed, force_params=False, **kwargs):
+            try:
+                return request(method, uri, signed, force_params, **kwargs)
+            except BinanceAPIException as e:
+                if not signed or e.code != TIMESTAMP_REJECT:
+                    raise
+                logger.warning(f"TIME_SYNC_REJECT: {uri}: {e.message}; resyncing")
+                METRICS.inc('bot_retries_total', component='time_sync')
+                sync.sync(client, force=True)
+                # python-binance stamped and signed the caller's dict in place
+                data = kwargs.get('data')
+                if isinstance(data, dict):
+                    data.pop('timestamp', None)
+                    data.pop('signature', None)
+                return request(method, uri, signed, force_params, **kwargs)
+
+        client._request = synced_request
+        client._time_synced = True
+        self._samplers.add(client)
+        return self.track(client)
+
+    def track(self, client):
+        """Keep client's timestamp_offset in sync (no retry: for AsyncClient)."""
+        client.timestamp_offset = self.offset_ms
+        self._clients.add(client)
+        self._start()
+        return client
+
+    def sync(self, client, force=False, samples=None):
+        """Measure the offset against client's server now; returns it in ms."""
+        with self._lock:
+            if force and self.synced_at is not None and time.monotonic() - self.synced_at < MIN_FORCED_SYNC_INTERVAL:
+                return self.offset_ms  # Another thread just resynced for the same burst of rejects
+            best = None
+            for _ in range(samples or self.samples):
+                with critical_reads():
+                    t0 = time.time()
+                    server_ms = client.futures_time()['serverTime']
+                    t1 = time.time()
+                if best is None or t1 - t0 < best[1] - best[0]:
+                    best = (t0, t1, server_ms)
+            return self.record(*best)
+
+    def record(self, t0, t1, server_ms):
+        """Apply one sample: serverTime read between local times t0 and t1; returns the offset in ms."""
+        rtt_ms = (t1 - t0) * 1000
+        offset_ms = server_ms - (t0 + t1) * 500
+        with self._lock:
+            now = time.monotonic()
+            if self.synced_at is not None and now - self.synced_at >= 1.0:
+                measured = (offset_ms - self.offset_ms) / (now - self.synced_at)
+                self.drift += DRIFT_SMOOTHING * (measured - self.drift)
+            self.offset_ms, self.rtt_ms, self.synced_at = offset_ms, rtt_ms, now
+            for client in list(self._clients):
+                client.timestamp_offset = offset_ms
+        METRICS.set('bot_clock_offset_ms', round(offset_ms, 3))
+        METRICS.set('bot_clock_drift_ppm', round(self.drift * 1000, 3))
+        logger.debug(f"TIME_SYNC: Offset={offset_ms:.1f}ms, RTT={rtt_ms:.1f}ms, Drift={self.drift * 1000:.1f}ppm")
+        return offset_ms
+
+    def next_interval(self):
+        # A fast-walking clock gets resynced before it has moved TIME_SYNC_MAX_ERROR_MS
+        if abs(self.drift) > 0:
+            return max(MIN_FORCED_SYNC_INTERVAL, min(self.interval, TIME_SYNC_MAX_ERROR_MS / abs(self.drift)))
+        return self.interval
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None and self.interval > 0:
+                self._thread = threading.Thread(target=self._run, name="time-sync", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.next_interval())
+            clients = list(self._samplers)
+            if not clients:
+                continue
+            try:
+                self.sync(clients[0])
+            except Exception as e:
+                logger.warning(f"TIME_SYNC_ERROR: {e}")
+
+
+_TIME_SYNC = None
+_LOCK = threading.Lock()
+
+
+def get_time_sync():
+    """Return the process-wide TimeSync (every client talks to the same exchange clock)."""
+    global _TIME_SYNC
+    with _LOCK:
+        if _TIME_SYNC is None:
+            _TIME_SYNC = TimeSync()
+        return _TIME_SYNC
@@ -1,97 +1,300 @@
 import os
+import sys
 import logging
-import math
+import threading
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
 from binance.client import Client, BinanceAPIException, BinanceRequestException
+from exchange_info import get_symbol_rules
+from filters import compile_filters, floor_to_increment, FilterError, BATCH_OK, BATCH_REASONS
+from metrics import instrument_client
+from rate_limiter import get_request_scheduler
+from time_sync import HmacSigner, get_time_sync
+from log_config import setup_logging
 
 load_dotenv()
 
 # --- Configuration ---
+# Orders of one symbol and type checked together before NumPy beats the
+# per-order check (check_batch costs ~50us per call whatever its size)
+VECTORIZE_MIN_ORDERS = int(os.getenv("VECTORIZE_MIN_ORDERS", "8"))
 # Set the Binance Futures Testnet URL based on the documentation
-TESTNET_FUTURES_URL = "https://testnet.binancefuture.com/fapi"
+# (point it at src/sim_exchange.py to run fully offline)
+TESTNET_FUTURES_URL = os.getenv("TESTNET_FUTURES_URL", "https://testnet.binancefuture.com/fapi")
+# Futures Testnet market/user data WebSocket base URL
+TESTNET_FUTURES_WS_URL = os.getenv("TESTNET_FUTURES_WS_URL", "wss://stream.binancefuture.com")
 
-# Cache for exchange rules (to avoid spamming the API)
-EXCHANGE_RULES = {}
-
-# Logging setup
-logging.basicConfig(
-    filename='bot.log',
-    level=logging.INFO,
-    format='%(asctime)s | %(levelname)s | %(message)s'
-)
+# Logging setup: JSON lines to bot.log, written from a background thread
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # --- Client and Setup ---
 
-def get_client():
-    """Return Binance Futures Testnet client."""
-    api_key = os.getenv("API_KEY")
-    api_secret = os.getenv("API_SECRET")
+# Seconds between background health checks of a registered client
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "60"))
+
+# Size of the HTTP connection pool kept open per API key
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+
+
+class ClientRegistry:
+    """
+    Process-wide registry of Binance Futures clients, one per API key.
+
+    Each client owns a single pooled HTTP session, so repeated calls reuse the
+    same keep-alive connections. The connection is verified with a ping when the
+    client is first built; after that, health checks run on a background timer
+    instead of on every call, keeping them off the order hot path.
+    """
+
+    def __init__(self, health_interval=HEALTH_CHECK_INTERVAL, pool_size=HTTP_POOL_SIZE):
+        self.health_interval = health_interval
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._healthy = {}
+        self._timer = None
+
+    def get(self, api_key, api_secret):
+        """Return the shared client for api_key, building and pinging it once."""
+        client = self._clients.get(api_key)
+        if client is not None and self._healthy.get(api_key):
+            return client
+
+        with self._lock:
+            client = self._clients.get(api_key)
+            if client is None:
+                client = self._build(api_key, api_secret)
+            if not self._healthy.get(api_key):
+                self._ping(client)
+                self._clients[api_key] = client
+                self._healthy[api_key] = True
+            self._start_timer()
+        return client
+
+    def clear(self):
+        """Drop all registered clients and close their sessions."""
+        with self._lock:
+            for client in self._clients.values():
+                client.session.close()
+            self._clients.clear()
+            self._healthy.clear()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _build(self, api_key, api_secret):
+        # ping=False: the constructor would otherwise ping the *spot* API,
+        # which is an extra round trip we never need.
+        client = Client(api_key, api_secret, ping=False)
+
+        # This line correctly points all futures API calls to the Testnet URL.
+        client.FUTURES_URL = TESTNET_FUTURES_URL
+
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        client.session.mount("https://", adapter)
+        client.session.mount("http://", adapter)
+        # requests re-reads proxy and CA-bundle settings from os.environ on every
+        # call (a scan of the whole environment); resolve them once instead
+        settings = client.session.merge_environment_settings(TESTNET_FUTURES_URL, {}, None, None, None)
+        client.session.proxies.update(settings['proxies'])
+        client.session.verify = settings['verify']
+        client.session.trust_env = False
+        # Precomputed HMAC key, then signing/network spans, rate-limit headers
+        # and reject counters; the scheduler wraps so shed polls never reach the
+        # network, and the time sync outermost so a -1021 retry is scheduled too
+        HmacSigner.install(client)
+        return get_time_sync().attach(get_request_scheduler().attach(instrument_client(client)))
+
+    @staticmethod
+    def _ping(client):
+        try:
+            # The server time doubles as the connectivity check and the first clock sample
+            get_time_sync().sync(client, samples=1)
+            logger.info("Binance Futures Testnet client connected successfully.")
+        except (BinanceAPIException, BinanceRequestException, RequestException) as e:
+            logger.error(f"Failed to connect to Binance Futures Testnet: {e}")
+            raise ConnectionError(f"API connection failed: {e}")
+
+    def _start_timer(self):
+        # Caller holds self._lock
+        if self._timer is None and self.health_interval > 0:
+            self._timer = threading.Timer(self.health_interval, self._health_check)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _health_check(self):
+        with self._lock:
+            self._timer = None
+            clients = list(self._clients.items())
+
+        for api_key, client in clients:
+            try:
+                client.futures_ping()
+                healthy = True
+            except Exception as e:
+                # The next get() for this key will ping (and raise) inline
+                logger.warning(f"Health check failed, client marked unhealthy: {e}")
+                healthy = False
+            with self._lock:
+                # clear() may have dropped the key while the ping was in flight
+                if api_key in self._clients:
+                    self._healthy[api_key] = healthy
+
+        with self._lock:
+            if self._clients:
+                self._start_timer()
+
+
+CLIENT_REGISTRY = ClientRegistry()
+
+
+def get_client(api_key=None, api_secret=None):
+    """Return the shared Binance Futures Testnet client for the given (or .env) credentials."""
+    api_key = api_key or os.getenv("API_KEY")
+    api_secret = api_secret or os.getenv("API_SECRET")
     
     if not api_key or not api_secret:
         logger.error("API_KEY or API_SECRET not found in .env file.")
         raise EnvironmentError("API credentials not configured.")
 
-    # FIX: Removed the 'base_url' argument from the Client constructor.
-    # We rely on setting client.FUTURES_URL after initialization.
-    client = Client(api_key, api_secret)
-    
-    # This line correctly points all futures API calls to the Testnet URL.
-    client.FUTURES_URL = TESTNET_FUTURES_URL 
-    
-    try:
-        client.futures_ping()
-        logger.info("Binance Futures Testnet client connected successfully.")
-    except (BinanceAPIException, BinanceRequestException) as e:
-        logger.error(f"Failed to connect to Binance Futures Testnet: {e}")
-        raise ConnectionError(f"API connection failed: {e}")
-        
-    return client
+    return CLIENT_REGISTRY.get(api_key, api_secret)
 
 def _load_exchange_rules(client, symbol):
-# ... (rest of the function is unchanged)
-    global EXCHANGE_RULES
-    if symbol in EXCHANGE_RULES:
-        return EXCHANGE_RULES[symbol]
-
+    """Return the exchange rules for symbol from the shared exchange-info cache."""
     try:
-        # Fetch all symbols and filter for the target symbol
-        info = client.futures_exchange_info()
-        symbol_info = next(s for s in info['symbols'] if s['symbol'] == symbol)
-        
-        rules = {}
-        for f in symbol_info['filters']:
-            # Extract key filters: lot size and price filter
-            if f['filterType'] == 'PRICE_FILTER':
-                rules['price_precision'] = int(-math.log10(float(f['tickSize'])))
-                rules['tickSize'] = float(f['tickSize'])
-            elif f['filterType'] == 'LOT_SIZE':
-                rules['quantity_precision'] = int(-math.log10(float(f['stepSize'])))
-                rules['stepSize'] = float(f['stepSize'])
-                rules['minQty'] = float(f['minQty'])
-
-        EXCHANGE_RULES[symbol] = rules
-        logger.info(f"Exchange rules loaded and cached for {symbol}.")
-        return rules
-
+        return get_symbol_rules(client, symbol)
     except Exception as e:
         logger.error(f"Failed to load exchange rules for {symbol}: {e}")
         raise
 
+# --- Price/Quantity Rounding ---
+
+def adjust_price_to_tick(price, tick_size):
+    """Round price down to nearest tick_size (exact integer-tick math)."""
+    return floor_to_increment(price, tick_size)
+
+def adjust_qty_to_step(qty, step_size):
+    return floor_to_increment(qty, step_size)
+
 # --- Validation Logic ---
 
-def validate_order(symbol, side, qty, price=None):
-# ... (rest of the function is unchanged)
+def _live_context(symbol):
+    """
+    Streamed mark price and open-order count for symbol, if this process
+    already runs those streams; validation never starts one itself.
+    """
+    market_data = sys.modules.get('market_data')
+    account_state = sys.modules.get('account_state')
+    mark = market_data.peek_price(symbol) if market_data else None
+    open_orders = account_state.peek_open_order_count(symbol) if account_state else None
+    return mark, open_orders
+
+def get_symbol_filters(symbol, client=None):
+    """Return the precompiled SymbolFilters for symbol."""
+    return compile_filters(_load_exchange_rules(client or get_client(), symbol))
+
+def normalize_order(symbol, qty, price=None, order_type=None, client=None):
+    """Round qty/price down onto the symbol's lot step and tick; returns (qty, price)."""
+    return get_symbol_filters(symbol, client).normalize(qty, price, order_type)
+
+def validate_order(symbol, side, qty, price=None, client=None, order_type=None, stop_price=None, reduce_only=False):
     """
     Robust validation using exchange rules:
-    Checks symbol suffix, quantity/price positivity, and Binance precision rules.
+    Checks symbol suffix, quantity/price positivity, and every symbol filter
+    (PRICE_FILTER, LOT_SIZE/MARKET_LOT_SIZE, MIN_NOTIONAL, PERCENT_PRICE,
+    MAX_NUM_ORDERS) in integer tick/step units. Returns the exact (qty, price).
+    Pass the caller's client to avoid a registry lookup.
     """
-    # NOTE: Calling get_client() here will create a new client object 
-    # for every validation call. In a production system, you'd pass a single client 
-    # instance, but for this structure, it's fine for now.
-    client = get_client() 
-    
+    if client is None:
+        client = get_client()
+    filters = compile_filters(_load_exchange_rules(client, symbol))
+    return check_order(filters, symbol, side, qty, price, order_type, stop_price, reduce_only)
+
+def check_order(filters, symbol, side, qty, price=None, order_type=None, stop_price=None, reduce_only=False):
+    """validate_order against already compiled filters: no client, no I/O."""
     # 1. Basic Sanity Checks (from your original code)
+    _check_fields(symbol, side, qty, price, stop_price)
+
+    # 2. Exchange filters, precompiled per symbol
+    mark, open_orders = _live_context(symbol)
+    result = filters.check(qty, price, order_type, stop_price, reduce_only, mark_price=mark, open_orders=open_orders)
+            
+    # Success
+    logger.info("Validation successful for %s | QTY=%s | PRICE=%s", symbol, qty, price if price else 'N/A')
+    return result
+
+def validate_orders(orders, client=None):
+    """
+    validate_order for a list of futures_create_order parameter dicts. Orders
+    sharing symbol, type and reduceOnly go through SymbolFilters.check_batch
+    together (groups under VECTORIZE_MIN_ORDERS through SymbolFilters.check).
+    Returns one (qty, price, error) per order, in order; error is None and
+    qty/price exact when the order passes.
+    """
+    if client is None:
+        client = get_client()
+    results = [None] * len(orders)
+    groups = {}
+    for i, order in enumerate(orders):
+        try:
+            _check_fields(order.get('symbol') or '', order.get('side'), order.get('quantity'), order.get('price'), order.get('stopPrice'))
+        except (ValueError, TypeError) as e:
+            results[i] = (None, None, e)
+            continue
+        order_type = order.get('type') or ('LIMIT' if order.get('price') is not None else 'MARKET')
+        key = (order['symbol'], order_type, bool(order.get('reduceOnly', False)), order.get('price') is not None, order.get('stopPrice') is not None)
+        groups.setdefault(key, []).append(i)
+
+    for (symbol, order_type, reduce_only, has_price, has_stop), members in groups.items():
+        try:
+            filters = compile_filters(_load_exchange_rules(client, symbol))
+            if filters.status not in (None, 'TRADING'):
+                raise FilterError('STATUS', f"{symbol} is not trading (status {filters.status}).")
+        except Exception as e:
+            for i in members:
+                results[i] = (None, None, e)
+            continue
+        mark, open_orders = _live_context(symbol)
+        if len(members) < VECTORIZE_MIN_ORDERS:
+            for i in members:
+                order = orders[i]
+                try:
+                    qty, price = filters.check(order['quantity'], order.get('price'), order_type, order.get('stopPrice'), reduce_only,
+                                               mark_price=mark, open_orders=open_orders)
+                except FilterError as e:
+                    results[i] = (None, None, e)
+                    continue
+                results[i] = (qty, price, None)
+                if open_orders is not None:
+                    # MAX_NUM_ORDERS counts the batch's own earlier orders too
+                    open_orders += 1
+            continue
+        qty, price, reasons = filters.check_batch(
+            [orders[i]['quantity'] for i in members],
+            [orders[i]['price'] for i in members] if has_price else None,
+            order_type, mark_price=mark, reduce_only=reduce_only,
+            stop_price=[orders[i]['stopPrice'] for i in members] if has_stop else None)
+
+        # MAX_NUM_ORDERS counts the batch's own earlier orders too
+        room = None
+        if filters.max_num_orders is not None and open_orders is not None and order_type != 'MARKET':
+            room = filters.max_num_orders - open_orders
+        for k, i in enumerate(members):
+            if reasons[k] != BATCH_OK:
+                reason = BATCH_REASONS[reasons[k]]
+                results[i] = (None, None, FilterError(reason.split()[0], f"{symbol} order {i}: {reason} check failed (qty {orders[i]['quantity']}, price {orders[i].get('price')}, stop {orders[i].get('stopPrice')})."))
+            elif room is not None and room <= 0:
+                results[i] = (None, None, FilterError('MAX_NUM_ORDERS', f"{symbol} already has {open_orders} open orders (max {filters.max_num_orders})."))
+            else:
+                if room is not None:
+                    room -= 1
+                results[i] = (float(qty[k]), float(price[k]) if has_price else None, None)
+    logger.info("Validation of %d orders: %d passed", len(orders), sum(1 for r in results if r[2] is None))
+    return results
+
+def _check_fields(symbol, side, qty, price=None, stop_price=None):
     if not symbol.endswith("USDT"):
         raise ValueError("Only USDT pairs allowed (e.g., BTCUSDT)")
     if side not in ['BUY', 'SELL']:
@@ -100,29 +303,5 @@ def validate_order(symbol, side, qty, price=None):
         raise ValueError("Quantity must be > 0")
     if price is not None and price <= 0:
         raise ValueError("Price must be > 0 for Limit orders.")
-
-    # 2. Advanced Binance Precision Checks
-    rules = _load_exchange_rules(client, symbol)
-    
-    # Quantity Validation (LOT_SIZE filter)
-    min_qty = rules.get('minQty', 0)
-    step_size = rules.get('stepSize', 0)
-    
-    if qty < min_qty:
-        raise ValueError(f"Quantity {qty} is less than minimum quantity {min_qty}.")
-    
-    # Check if quantity is a multiple of the step size (with tolerance for float)
-    if step_size > 0 and abs((qty / step_size) - round(qty / step_size)) > 1e-6:
-        raise ValueError(f"Quantity {qty} must be a multiple of the step size {step_size}.")
-
-    # Price Validation (PRICE_FILTER) - only for Limit orders
-    if price is not None:
-        tick_size = rules.get('tickSize', 0)
-        
-        # Check if price is a multiple of the tick size (with tolerance)
-        if tick_size > 0 and abs((price / tick_size) - round(price / tick_size)) > 1e-6:
-            raise ValueError(f"Price {price} must be a multiple of the tick size {tick_size}.")
-            
-    # Success
-    logger.info(f"Validation successful for {symbol} | QTY={qty} | PRICE={price if price else 'N/A'}")
-    return True
\ No newline at end of file
+    if stop_price is not None and stop_price <= 0:
+        raise ValueError("Stop price must be > 0.")
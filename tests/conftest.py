@@ -0,0 +1,75 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+from collections import Counter
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.extend([os.path.join(PROJECT_ROOT, 'src'), os.path.join(PROJECT_ROOT, 'src', 'advanced')])
+
+from sim_exchange import SimExchange, ApiError  # noqa: E402
+
+# One simulated exchange for the whole run; the bot's modules read their
+# configuration at import, so everything points at it before any is imported.
+# It verifies signatures, so signing and encoding bugs fail here as they would live
+SIM = SimExchange(seed=1, api_secret='test-secret')
+SIM.run_in_thread()
+RUN_DIR = tempfile.mkdtemp(prefix='bot-tests-')
+os.environ.update({
+    'API_KEY': 'test-key',
+    'API_SECRET': 'test-secret',
+    'TESTNET_FUTURES_URL': SIM.url,
+    'TESTNET_FUTURES_WS_URL': SIM.ws_url,
+    'HEALTH_CHECK_INTERVAL': '0',
+    'ORDER_RETRY_BACKOFF': '0.01',
+    'LOG_FILE': os.path.join(RUN_DIR, 'bot.log'),
+    'EXCHANGE_INFO_SNAPSHOT': os.path.join(RUN_DIR, 'exchange_info.json'),
+    'JOURNAL_DB': os.path.join(RUN_DIR, 'journal.sqlite3'),
+})
+
+
+class ScriptedFaults:
+    """
+    Wraps SimExchange.dispatch: counts calls per route and plays scripted
+    outcomes in order. 'fail' answers 503/-1001 without processing the
+    request; 'lost' processes it, then answers 503/-1001 (the response is lost).
+    """
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.calls = Counter()
+        self._script = {}
+        self._dispatch = sim.dispatch
+
+    def script(self, method, path, *outcomes):
+        self._script.setdefault((method, path), []).extend(outcomes)
+
+    def orders(self, client_order_id):
+        return [o for o in self.sim.orders.values() if o['clientOrderId'] == client_order_id]
+
+    def dispatch(self, method, path, params):
+        self.calls[(method, path)] += 1
+        pending = self._script.get((method, path))
+        outcome = pending.pop(0) if pending else None
+        if outcome == 'fail':
+            raise ApiError(-1001, 'Internal error; unable to process your request. Please try again.', status=503)
+        result = self._dispatch(method, path, params)
+        if outcome == 'lost':
+            raise ApiError(-1001, 'Internal error; unable to process your request. Please try again.', status=503)
+        return result
+
+
+@pytest.fixture
+def sim():
+    faults = ScriptedFaults(SIM)
+    SIM.dispatch = faults.dispatch
+    yield faults
+    del SIM.dispatch
+    SIM.latency_ms = 0.0
+
+
+@pytest.fixture
+def client():
+    from utils import get_client
+    return get_client()
@@ -0,0 +1,49 @@
+# tests/test_account_state.py
+from account_state import AccountState
+
+
+def order_event(status, update_time, order_id=1):
+    return {'e': 'ORDER_TRADE_UPDATE', 'T': update_time,
+            'o': {'i': order_id, 'c': f'test-{order_id}', 's': 'BTCUSDT', 'S': 'BUY', 'o': 'LIMIT', 'q': '0.01',
+                  'p': '30000', 'X': status, 'T': update_time}}
+
+
+def account_event(amount, wallet, update_time):
+    return {'e': 'ACCOUNT_UPDATE', 'T': update_time,
+            'a': {'B': [{'a': 'USDT', 'wb': wallet, 'cw': wallet}],
+                  'P': [{'s': 'BTCUSDT', 'pa': amount, 'ep': '60000', 'up': '0'}]}}
+
+
+def snapshot(amount, wallet, status, update_time):
+    return ([{'asset': 'USDT', 'balance': wallet, 'crossWalletBalance': wallet, 'updateTime': update_time}],
+            [{'symbol': 'BTCUSDT', 'positionAmt': amount, 'entryPrice': '60000', 'unRealizedProfit': '0',
+              'updateTime': update_time}],
+            [{'orderId': 1, 'clientOrderId': 'test-1', 'symbol': 'BTCUSDT', 'status': status, 'updateTime': update_time}])
+
+
+def test_events_during_a_snapshot_are_not_overwritten_by_it():
+    state = AccountState()
+    events = state.start_snapshot()
+    # The order fills and the position opens while the older snapshot is in flight
+    state.apply(order_event('FILLED', 200))
+    state.apply(account_event('0.010', '990', 200))
+    state.load_snapshot(*snapshot('0.000', '1000', 'NEW', 100), events)
+
+    assert state.open_orders() == []
+    assert [p['positionAmt'] for p in state.positions()] == ['0.010']
+    assert state.balances() == {'USDT': '990'}
+
+
+def test_snapshot_newer_than_the_events_is_kept():
+    state = AccountState()
+    events = state.start_snapshot()
+    state.apply(order_event('NEW', 100))
+    state.apply(account_event('0.010', '990', 100))
+    state.load_snapshot(*snapshot('0.020', '980', 'PARTIALLY_FILLED', 200), events)
+
+    assert [o['status'] for o in state.open_orders()] == ['PARTIALLY_FILLED']
+    assert [p['positionAmt'] for p in state.positions()] == ['0.020']
+    assert state.balances() == {'USDT': '980'}
+    # Recording stopped with the snapshot
+    state.apply(order_event('FILLED', 300))
+    assert events == [order_event('NEW', 100), account_event('0.010', '990', 100)]
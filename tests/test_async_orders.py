@@ -0,0 +1,50 @@
+# tests/test_async_orders.py
+import asyncio
+from async_orders import AsyncOrderEngine
+
+SYMBOL = 'BTCUSDT'
+
+
+def run(method, *args):
+    async def go():
+        engine = AsyncOrderEngine()
+        try:
+            return await getattr(engine, method)(*args)
+        finally:
+            await engine.close()
+    return asyncio.run(go())
+
+
+def test_lost_response_is_read_back_not_resent(sim):
+    sim.script('POST', 'order', 'lost')
+    order = run('market_order', SYMBOL, 'BUY', 0.01)
+    assert sim.calls[('POST', 'order')] == 1
+    assert sim.calls[('GET', 'order')] == 1
+    assert len(sim.orders(order['clientOrderId'])) == 1
+
+
+def test_lost_oco_batch_is_read_back_not_resent(sim):
+    sim.script('POST', 'batchOrders', 'lost')
+    tp, sl = run('oco_orders', SYMBOL, 'SELL', 0.01, 90000.0, 30000.0)
+    assert sim.calls[('POST', 'batchOrders')] == 1
+    assert [len(sim.orders(leg['clientOrderId'])) for leg in (tp, sl)] == [1, 1]
+
+
+def test_failed_background_rules_refresh_is_logged(sim, monkeypatch, caplog):
+    from exchange_info import EXCHANGE_INFO
+
+    async def go():
+        engine = AsyncOrderEngine()
+        try:
+            await engine.market_order(SYMBOL, 'BUY', 0.01)
+            await asyncio.wait([engine._rules_refresh])
+            await asyncio.sleep(0)  # Done-callbacks run on the next loop pass
+        finally:
+            await engine.close()
+
+    run('market_order', SYMBOL, 'BUY', 0.01)  # Rules cached
+    monkeypatch.setattr(EXCHANGE_INFO, 'ttl', 0.0)
+    sim.script('GET', 'exchangeInfo', 'fail', 'fail', 'fail')
+    with caplog.at_level('ERROR', logger='async_orders'):
+        asyncio.run(go())
+    assert 'ASYNC_RULES_REFRESH_ERROR' in caplog.text
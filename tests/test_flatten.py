@@ -0,0 +1,34 @@
+# tests/test_flatten.py
+from urllib3.util import parse_url
+from time_sync import HmacSigner
+from flatten import _cancel_group
+
+SYMBOL = 'BTCUSDT'
+
+
+def record_wire(sent):
+    """
+    Response hook appending what the exchange verifies the signature over:
+    the query string as urllib3 sends it (percent-encoding it once more)
+    followed by the body.
+    """
+    def hook(response, *args, **kwargs):
+        request = response.request
+        sent.append((parse_url(request.url).query or '') + (request.body or ''))
+    return hook
+
+
+def test_cancel_batch_is_sent_as_signed(sim, client, monkeypatch):
+    stops = [client.futures_create_order(symbol=SYMBOL, side='SELL', type='STOP_MARKET', stopPrice=price,
+                                         closePosition='true')['orderId'] for price in (1000.0, 1100.0)]
+    signed, sent = [], []
+    sign_query = HmacSigner.sign_query
+    monkeypatch.setattr(HmacSigner, 'sign_query', lambda self, query: signed.append(query) or sign_query(self, query))
+    client.session.hooks['response'].append(record_wire(sent))
+    try:
+        cancelled, errors = _cancel_group(client, SYMBOL, stops)
+    finally:
+        client.session.hooks['response'].pop()
+
+    assert (cancelled, errors) == (stops, [])
+    assert [wire.rsplit('&signature=', 1)[0] for wire in sent] == signed
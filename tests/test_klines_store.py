@@ -0,0 +1,24 @@
+# tests/test_klines_store.py
+import time
+import numpy as np
+import pytest
+from klines_store import KlineStore, KlinesDownloader, interval_ms
+
+MONDAY = 4 * 86_400_000  # 1970-01-05, the first Monday after the epoch
+
+
+@pytest.mark.parametrize('interval', ['1h', '1w'])
+def test_only_closed_candles_are_stored(client, tmp_path, interval):
+    store = KlineStore(root=str(tmp_path))
+    downloader = KlinesDownloader(store, client)
+    now = int(time.time() * 1000)
+    added = downloader.download('BTCUSDT', interval, start_ms=now - 10 * interval_ms(interval))
+
+    klines = store.load('BTCUSDT', interval)
+    assert added == len(klines) > 0
+    # The still-open candle would never be corrected in an append-only file
+    assert int(klines.close_time[-1]) < now
+    assert int(klines.close_time[-1]) + 1 + interval_ms(interval) > now
+    assert np.all(np.diff(klines.open_time) == interval_ms(interval))
+    if interval == '1w':
+        assert np.all((klines.open_time - MONDAY) % interval_ms('1w') == 0)
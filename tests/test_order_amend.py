@@ -0,0 +1,31 @@
+# tests/test_order_amend.py
+import account_state
+from order_amend import amend_order, amend_orders
+
+SYMBOL = 'BTCUSDT'
+
+
+def resting_limit(client, price=30000.0):
+    return client.futures_create_order(symbol=SYMBOL, side='BUY', type='LIMIT', timeInForce='GTC',
+                                       quantity=0.01, price=price)
+
+
+def test_amend_without_a_stream_reads_the_order_once(sim, client, monkeypatch):
+    monkeypatch.setattr(account_state, '_STREAM', None)
+    order = resting_limit(client)
+    amended = amend_order(SYMBOL, order['orderId'], price=30100.0, client=client)
+    assert float(amended['price']) == 30100.0
+    assert float(amended['origQty']) == 0.01
+    # One lookup for the missing side/quantity, no listenKey or resync
+    assert sim.calls[('GET', 'order')] == 1
+    assert sim.calls[('POST', 'listenKey')] == 0
+    assert account_state._STREAM is None
+
+
+def test_batch_amend_is_accepted_as_signed(sim, client):
+    orders = [resting_limit(client, price) for price in (30000.0, 30010.0)]
+    results = amend_orders([{'symbol': SYMBOL, 'order_id': o['orderId'], 'side': 'BUY', 'quantity': 0.01,
+                             'price': float(o['price']) + 50} for o in orders], client=client)
+    assert [r['error'] for r in results] == [None, None]
+    assert [float(r['order']['price']) for r in results] == [30050.0, 30060.0]
+    assert sim.calls[('PUT', 'batchOrders')] == 1
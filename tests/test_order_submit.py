@@ -0,0 +1,106 @@
+# tests/test_order_submit.py
+import pytest
+from order_submit import ORDER_LOOKUP_ATTEMPTS, OrderStatusUnknown, new_client_order_id, submit_order
+
+SYMBOL = 'BTCUSDT'
+POST_ORDER = ('POST', 'order')
+GET_ORDER = ('GET', 'order')
+
+
+def market(client_order_id=None):
+    return dict(symbol=SYMBOL, side='BUY', type='MARKET', quantity=0.01,
+                newClientOrderId=client_order_id or new_client_order_id('test'))
+
+
+def resting_limit(client_order_id=None):
+    # Far below the market: rests on the book
+    return dict(symbol=SYMBOL, side='BUY', type='LIMIT', timeInForce='GTC', quantity=0.01, price=30000.0,
+                newClientOrderId=client_order_id or new_client_order_id('test'))
+
+
+def test_client_order_ids_are_unique_and_valid():
+    ids = {new_client_order_id('twap') for _ in range(1000)}
+    assert len(ids) == 1000
+    assert new_client_order_id('twap', 7, 'abc', 3) == 'twap-7-abc-3'
+    with pytest.raises(ValueError):
+        new_client_order_id('x' * 40)
+
+
+# --- Unknown outcomes ---
+
+def test_lost_response_is_read_back_not_resent(sim, client):
+    params = market()
+    sim.script(*POST_ORDER, 'lost')
+    order = submit_order(client, params)
+    assert order['clientOrderId'] == params['newClientOrderId']
+    assert sim.calls[POST_ORDER] == 1
+    assert len(sim.orders(params['newClientOrderId'])) == 1
+
+
+def test_failed_lookup_is_retried_not_the_send(sim, client):
+    params = market()
+    sim.script(*POST_ORDER, 'lost')
+    sim.script(*GET_ORDER, 'fail', 'fail')
+    order = submit_order(client, params)
+    assert order['clientOrderId'] == params['newClientOrderId']
+    assert sim.calls[POST_ORDER] == 1
+    assert sim.calls[GET_ORDER] == 3
+
+
+def test_unanswerable_lookup_raises_instead_of_resending(sim, client):
+    params = market()
+    sim.script(*POST_ORDER, 'fail')
+    sim.script(*GET_ORDER, *['fail'] * ORDER_LOOKUP_ATTEMPTS)
+    with pytest.raises(OrderStatusUnknown):
+        submit_order(client, params)
+    assert sim.calls[POST_ORDER] == 1
+    assert sim.calls[GET_ORDER] == ORDER_LOOKUP_ATTEMPTS
+
+
+def test_send_is_repeated_once_the_exchange_confirms_no_order(sim, client):
+    params = market()
+    sim.script(*POST_ORDER, 'fail')
+    submit_order(client, params)
+    assert sim.calls[POST_ORDER] == 2
+    assert len(sim.orders(params['newClientOrderId'])) == 1
+
+
+# --- Duplicate client order ids (-4116) ---
+
+def test_duplicate_client_id_returns_the_resting_order(sim, client):
+    params = resting_limit()
+    first = submit_order(client, params)
+    again = submit_order(client, params)
+    assert again['orderId'] == first['orderId']
+    assert sim.calls[POST_ORDER] == 2
+    assert len(sim.orders(params['newClientOrderId'])) == 1
+
+
+def test_finished_order_is_found_when_looked_up_first(sim, client):
+    # A filled order frees its client id, so resending it would not be rejected with -4116
+    params = market()
+    first = submit_order(client, params)
+    again = submit_order(client, params, lookup_first=True)
+    assert again['orderId'] == first['orderId']
+    assert sim.calls[POST_ORDER] == 1
+
+
+# --- Hedged sends ---
+
+def test_market_orders_are_never_hedged(sim, client):
+    sim.sim.latency_ms = 200.0
+    params = market()
+    submit_order(client, params, hedge_after=0.02)
+    assert sim.calls[POST_ORDER] == 1
+    assert sim.calls[GET_ORDER] == 0
+    assert len(sim.orders(params['newClientOrderId'])) == 1
+
+
+def test_hedge_reads_the_order_before_sending_again(sim, client):
+    sim.sim.latency_ms = 200.0
+    params = resting_limit()
+    order = submit_order(client, params, hedge_after=0.02)
+    assert order['clientOrderId'] == params['newClientOrderId']
+    assert sim.calls[POST_ORDER] == 1
+    assert sim.calls[GET_ORDER] == 1
+    assert len(sim.orders(params['newClientOrderId'])) == 1
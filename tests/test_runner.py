@@ -0,0 +1,24 @@
+# tests/test_runner.py
+import pytest
+from order_submit import new_client_order_id
+from runner import _run_job
+
+SYMBOL = 'BTCUSDT'
+
+
+def oco_job(ref):
+    return {'id': 1, 'kind': 'oco', 'ref': ref,
+            'params': {'symbol': SYMBOL, 'side': 'SELL', 'quantity': 0.01, 'take_profit': 90000.0, 'stop_loss': 30000.0}}
+
+
+def test_resent_oco_with_one_leg_placed_is_cancelled_and_failed(sim, client):
+    job = oco_job('lone-leg')
+    # The worker died after the batch, before cancelling the leg the exchange accepted
+    tp_cid = new_client_order_id('job', job['ref'], 'tp')
+    client.futures_create_order(symbol=SYMBOL, side='SELL', type='TAKE_PROFIT_MARKET', quantity=0.01,
+                                stopPrice=90000.0, reduceOnly='true', newClientOrderId=tp_cid)
+
+    with pytest.raises(RuntimeError, match=tp_cid):
+        _run_job(job, client, scheduler=None, resend=True)
+    assert [o['status'] for o in sim.orders(tp_cid)] == ['CANCELED']
+    assert sim.calls[('POST', 'batchOrders')] == 0